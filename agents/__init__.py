@@ -3,20 +3,33 @@ AI Agents Package
 Multi-agent system for intelligent parking management
 """
 
-from .orchestrator import orchestrator_agent
-from .spot_finder import spot_finder_agent
-from .pricing_agent import pricing_agent
-from .route_optimizer import route_optimizer_agent
-from .payment_verifier import payment_verifier_agent
-from .security_guard import security_guard_agent
-from .dispute_resolver import dispute_resolver_agent
+import importlib
+
+# Agents pull in their services (Firebase, Gemini, Masumi) at import time,
+# so each agent is loaded on first access: code that only needs the pricing
+# or route agents doesn't have to initialise the rest.
+#
+# pricing_agent shares its submodule's name, so it is imported from the
+# submodule (`from agents.pricing_agent import pricing_agent`) and
+# `agents.pricing_agent` stays the module.
+_EXPORTS = {
+    'orchestrator_agent': '.orchestrator',
+    'spot_finder_agent': '.spot_finder',
+    'route_optimizer_agent': '.route_optimizer',
+    'payment_verifier_agent': '.payment_verifier',
+    'security_guard_agent': '.security_guard',
+    'dispute_resolver_agent': '.dispute_resolver',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
 
-__all__ = [
-    'orchestrator_agent',
-    'spot_finder_agent',
-    'pricing_agent',
-    'route_optimizer_agent',
-    'payment_verifier_agent',
-    'security_guard_agent',
-    'dispute_resolver_agent'
-]
@@ -6,10 +6,12 @@ Manages bilateral escrow on Masumi Network
 
 import logging
 import hashlib
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Tuple
 from datetime import datetime
 
-from services import firebase_service, gemini_service, masumi_service
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
+from services.masumi_service import masumi_service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -217,15 +219,7 @@ class DisputeResolverAgent:
         
         try:
             # Step 1: Get dispute data from Firebase
-            # (In production, query Firebase for dispute by ID)
-            dispute_data = {
-                'dispute_id': dispute_id,
-                'user_id': 'user_123',
-                'dispute_type': 'incorrect_charge',
-                'description': 'Charged for 3 hours but only parked 2 hours',
-                'evidence': ['parking_receipt.jpg', 'timestamp_photo.jpg'],
-                'disputed_amount_lovelace': masumi_service.ada_to_lovelace(0.5)
-            }
+            dispute_data = self._load_dispute(dispute_id)
             
             # Step 2: Use Gemini AI for final ruling
             ruling = gemini_service.investigate_dispute(
@@ -233,27 +227,8 @@ class DisputeResolverAgent:
                 dispute_data.get('evidence', [])
             )
             
-            # Step 3: Resolve bilateral escrow on Masumi
-            escrow_resolution = self._resolve_escrow(dispute_id, ruling)
-            
-            # Step 4: Update dispute status in Firebase
-            # (In production, update Firebase dispute record)
-            
-            logger.info(
-                f"✅ Dispute resolved: {ruling.get('ruling')} "
-                f"(confidence: {ruling.get('confidence')}%)"
-            )
-            
-            return {
-                'success': True,
-                'dispute_id': dispute_id,
-                'ruling': ruling.get('ruling'),
-                'confidence': ruling.get('confidence'),
-                'payout_distribution': ruling.get('payout_distribution'),
-                'reasoning': ruling.get('reasoning'),
-                'escrow_resolution': escrow_resolution,
-                'resolved_at': datetime.utcnow().isoformat()
-            }
+            # Steps 3-4: Resolve escrow and record the outcome
+            return self._apply_ruling(dispute_id, ruling)
             
         except Exception as e:
             logger.error(f"❌ Dispute resolution failed: {e}")
@@ -265,6 +240,81 @@ class DisputeResolverAgent:
                 'error': str(e)
             }
     
+    def stream_resolution(self, dispute_id: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Resolve a dispute while streaming the arbitration text
+        
+        Yields:
+            ('token', str) for each chunk Gemini generates, then
+            ('ruling', dict) with the same result resolve_dispute() returns
+        """
+        
+        logger.info(f"⚖️  Resolving dispute (streaming): {dispute_id}")
+        
+        try:
+            dispute_data = self._load_dispute(dispute_id)
+            
+            chunks = []
+            try:
+                prompt = gemini_service.build_dispute_prompt(
+                    dispute_data,
+                    dispute_data.get('evidence', [])
+                )
+                for chunk in gemini_service.generate_stream(prompt, purpose='dispute_investigation'):
+                    chunks.append(chunk)
+                    yield 'token', chunk
+                
+                ruling = gemini_service.parse_dispute_ruling(''.join(chunks))
+            except Exception as e:
+                logger.error(f"Dispute investigation error: {e}")
+                ruling = gemini_service.fallback_dispute_ruling()
+            
+            yield 'ruling', self._apply_ruling(dispute_id, ruling)
+            
+        except Exception as e:
+            logger.error(f"❌ Dispute resolution failed: {e}")
+            yield 'ruling', {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _load_dispute(self, dispute_id: str) -> Dict[str, Any]:
+        """Dispute record to arbitrate"""
+        # (In production, query Firebase for dispute by ID)
+        return {
+            'dispute_id': dispute_id,
+            'user_id': 'user_123',
+            'dispute_type': 'incorrect_charge',
+            'description': 'Charged for 3 hours but only parked 2 hours',
+            'evidence': ['parking_receipt.jpg', 'timestamp_photo.jpg'],
+            'disputed_amount_lovelace': masumi_service.ada_to_lovelace(0.5)
+        }
+    
+    def _apply_ruling(self, dispute_id: str, ruling: Dict[str, Any]) -> Dict[str, Any]:
+        """Resolve the escrow for an AI ruling and build the resolution result"""
+        
+        # Step 3: Resolve bilateral escrow on Masumi
+        escrow_resolution = self._resolve_escrow(dispute_id, ruling)
+        
+        # Step 4: Update dispute status in Firebase
+        # (In production, update Firebase dispute record)
+        
+        logger.info(
+            f"✅ Dispute resolved: {ruling.get('ruling')} "
+            f"(confidence: {ruling.get('confidence')}%)"
+        )
+        
+        return {
+            'success': True,
+            'dispute_id': dispute_id,
+            'ruling': ruling.get('ruling'),
+            'confidence': ruling.get('confidence'),
+            'payout_distribution': ruling.get('payout_distribution'),
+            'reasoning': ruling.get('reasoning'),
+            'escrow_resolution': escrow_resolution,
+            'resolved_at': datetime.utcnow().isoformat()
+        }
+    
     def _resolve_escrow(
         self, 
         dispute_id: str, 
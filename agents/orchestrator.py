@@ -8,17 +8,32 @@ import os
 import logging
 import hashlib
 import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
-from services import firebase_service, gemini_service, masumi_service
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
+from services.masumi_service import masumi_service
+from services import spot_ranker
+from services.structured_output import AggregationResult
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sub-agent stages of concurrent parking requests share one pool. Stages are
+# only submitted once their dependencies are done, so no worker ever blocks
+# waiting on another stage.
+_pipeline_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ORCHESTRATOR_MAX_CONCURRENCY', '16')),
+    thread_name_prefix='orchestrator'
+)
+
 
 class OrchestratorAgent:
     """
@@ -26,7 +41,7 @@ class OrchestratorAgent:
     
     Workflow:
     1. Receive parking request from customer
-    2. Create Masumi payment request (1.5 ADA)
+    2. Create Masumi payment request (reservation fee, 1.5 ADA by default)
     3. Delegate to 4 sub-agents (SpotFinder, Pricing, Route, PaymentVerifier)
     4. Aggregate results and return to customer
     5. Distribute payment to sub-agents upon completion
@@ -42,6 +57,13 @@ class OrchestratorAgent:
             'payment_verifier': 0.2  # 20% for payment verification
         }
         
+        # Reservation fee quoted to the customer (and registered with Masumi)
+        self.reservation_fee_ada = float(os.getenv('RESERVATION_FEE_ADA', '1.5'))
+        
+        # One structured Gemini call for ranking + pricing text + directions
+        self.use_reservation_brief = os.getenv('RESERVATION_BRIEF_MODE', 'true').lower() == 'true'
+        self.brief_max_spots = int(os.getenv('RESERVATION_BRIEF_MAX_SPOTS', '8'))
+        
         # Register agent on Masumi Network
         self._register_on_masumi()
         
@@ -60,7 +82,7 @@ class OrchestratorAgent:
                     'result_aggregation'
                 ],
                 'pricing': {
-                    'base_fee': 1.5,
+                    'base_fee': self.reservation_fee_ada,
                     'currency': 'ADA'
                 }
             }
@@ -106,8 +128,9 @@ class OrchestratorAgent:
         logger.info(f"🎯 Received parking request from user: {request_data.get('user_id')}")
         
         try:
-            # Step 1: Create Masumi payment request (1.5 ADA)
+            # Step 1: Create Masumi payment request (reservation fee)
             payment_request = self._create_payment_request(request_data)
+            amount_lovelace = self._requested_lovelace(payment_request)
             
             # Masumi payment is optional for development
             if not payment_request or not payment_request.get('blockchainIdentifier'):
@@ -117,6 +140,14 @@ class OrchestratorAgent:
             else:
                 payment_id = payment_request.get('id')
                 payment_address = payment_request.get('blockchainIdentifier')
+                
+                # Detect the customer's payment incrementally in the background
+                from .payment_verifier import payment_verifier_agent
+                payment_verifier_agent.watch_payment(
+                    payment_id,
+                    payment_address,
+                    amount_lovelace
+                )
             
             logger.info(f"💰 Payment request created: {payment_id}")
             
@@ -146,12 +177,12 @@ class OrchestratorAgent:
                 'reservation_id': reservation['reservation_id'],
                 'payment_id': payment_id,
                 'payment_address': payment_address,
-                'amount_lovelace': masumi_service.ada_to_lovelace(1.5),
+                'amount_lovelace': amount_lovelace,
                 'spot_recommendation': final_recommendation['spot'],
                 'pricing': final_recommendation['pricing'],
                 'route': final_recommendation['route'],
                 'expires_at': int(time.time()) + 600,  # 10 min expiry
-                'instructions': 'Send exactly 1.5 ADA to the payment address to confirm reservation'
+                'instructions': f'Send exactly {amount_lovelace / 1000000:g} ADA to the payment address to confirm reservation'
             }
             
         except Exception as e:
@@ -177,6 +208,7 @@ class OrchestratorAgent:
         payment_data = {
             'agent_identifier': f"{self.agent_id}_parkngo",
             'input_hash': input_hash,
+            'amount_lovelace': masumi_service.ada_to_lovelace(self.reservation_fee_ada),
             'pay_by_time': 60,  # 60 minutes
             'submit_result_time': 24,  # 24 hours
             'unlock_time': 48,  # 48 hours
@@ -185,7 +217,7 @@ class OrchestratorAgent:
                 'user_id': request_data.get('user_id'),
                 'vehicle_type': request_data.get('vehicle_type'),
                 'duration_hours': request_data.get('duration_hours'),
-                'amount_ada': 1.5,
+                'amount_ada': self.reservation_fee_ada,
                 'description': f"Parking reservation for {request_data.get('user_id')}",
                 'timestamp': datetime.utcnow().isoformat()
             }
@@ -193,12 +225,29 @@ class OrchestratorAgent:
         
         return masumi_service.create_payment_request(payment_data)
     
+    def _requested_lovelace(self, payment_request: Optional[Dict[str, Any]]) -> int:
+        """Amount the payment request asks for (Masumi RequestedFunds, else the configured fee)"""
+        
+        for funds in (payment_request or {}).get('RequestedFunds') or []:
+            if funds.get('unit') in ('', 'lovelace'):
+                try:
+                    return int(funds['amount'])
+                except (KeyError, TypeError, ValueError):
+                    break
+        
+        return masumi_service.ada_to_lovelace(self.reservation_fee_ada)
+    
     def _coordinate_sub_agents(self, request_data: Dict[str, Any], payment_id: str) -> Dict[str, Any]:
         """
         Coordinate sub-agents to process the parking request
         
         In production, these would be separate agents on Masumi Network
         For now, we'll simulate their responses using Gemini AI
+        
+        Preferred path: one composite reservation brief (a single Gemini
+        call). Otherwise sub-agents run as a dependency graph: SpotFinder
+        first, then Pricing and RouteOptimizer concurrently, so latency is
+        the longest chain rather than the sum of every Gemini call.
         """
         
         logger.info("🤖 Coordinating sub-agents...")
@@ -212,44 +261,150 @@ class OrchestratorAgent:
         pricing_agent = PricingAgent()
         route_optimizer = RouteOptimizerAgent()
         
-        # Execute sub-agents with error handling
-        try:
-            spot_result = spot_finder.find_best_spot(request_data)
-            if not spot_result or not spot_result.get('recommended_spot'):
-                raise ValueError("SpotFinder returned no recommendation")
-        except Exception as e:
-            logger.error(f"SpotFinder error: {e}")
-            spot_result = {'recommended_spot': None, 'error': str(e)}
+        if self.use_reservation_brief and not gemini_service.is_degraded():
+            brief_results = self._coordinate_with_brief(
+                request_data,
+                spot_finder,
+                pricing_agent,
+                route_optimizer
+            )
+            if brief_results:
+                return brief_results
         
-        try:
-            if spot_result.get('recommended_spot'):
-                pricing_result = pricing_agent.calculate_price(
-                    spot_result['recommended_spot'],
-                    request_data
-                )
-            else:
-                pricing_result = {'error': 'No spot available for pricing'}
-        except Exception as e:
-            logger.error(f"Pricing error: {e}")
-            pricing_result = {'error': str(e)}
+        def find_spot(inputs):
+            try:
+                spot_result = spot_finder.find_best_spot(request_data)
+                if not spot_result or not spot_result.get('recommended_spot'):
+                    raise ValueError("SpotFinder returned no recommendation")
+                return spot_result
+            except Exception as e:
+                logger.error(f"SpotFinder error: {e}")
+                return {'recommended_spot': None, 'error': str(e)}
+        
+        def price_spot(inputs):
+            spot = inputs['spot_finder'].get('recommended_spot')
+            if not spot:
+                return {'error': 'No spot available for pricing'}
+            return pricing_agent.calculate_price(spot, request_data)
+        
+        def route_to_spot(inputs):
+            spot = inputs['spot_finder'].get('recommended_spot')
+            if not spot:
+                return {'error': 'No spot available for routing'}
+            return route_optimizer.optimize_route(request_data.get('user_location', {}), spot)
+        
+        return self._run_stage_graph({
+            'spot_finder': ((), find_spot),
+            'pricing': (('spot_finder',), price_spot),
+            'route': (('spot_finder',), route_to_spot)
+        })
+    
+    def _coordinate_with_brief(
+        self,
+        request_data: Dict[str, Any],
+        spot_finder,
+        pricing_agent,
+        route_optimizer
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Produce all sub-agent results from a single reservation brief
         
+        Prices are rule-based (no model call), so they are computed for the
+        shortlist up front and the model only writes ranking, explanation
+        and (unless the lot graph routes the spot) directions. Returns None
+        if the brief is unavailable.
+        """
         try:
-            if spot_result.get('recommended_spot'):
-                route_result = route_optimizer.optimize_route(
-                    request_data.get('user_location', {}),
-                    spot_result['recommended_spot']
-                )
-            else:
-                route_result = {'error': 'No spot available for routing'}
+            total_available, candidates = spot_finder.find_candidates(request_data)
+            if not candidates:
+                return None
+            
+            # Best geo/feature scores first; bounds prompt size on large lots
+            shortlist = spot_finder.shortlist(candidates, request_data, self.brief_max_spots)
+            
+            pricing_by_spot = {
+                spot['spot_id']: pricing_agent.calculate_price(spot, request_data, explain=False)
+                for spot in shortlist
+            }
+            
+            brief = gemini_service.generate_reservation_brief(
+                shortlist,
+                request_data,
+                pricing_by_spot,
+                include_directions=route_optimizer.brief_needs_directions
+            )
+            if not brief:
+                return None
+            
+            spot_result = spot_finder.recommend_from_rankings(
+                shortlist,
+                brief['rankings'],
+                total_available,
+                top_spot_id=brief['top_spot_id']
+            )
+            top_spot = spot_result['recommended_spot']
+            spot_ranker.log_impression(request_data, [top_spot, *spot_result['alternatives']])
+            
+            logger.info(f"🧾 Reservation brief used for spot {top_spot['spot_id']}")
+            
+            return {
+                'spot_finder': spot_result,
+                'pricing': {
+                    **pricing_by_spot[top_spot['spot_id']],
+                    'ai_reasoning': brief['pricing_explanation']
+                },
+                'route': route_optimizer.route_from_brief(top_spot, brief['directions'], brief['route_tip'])
+            }
+            
         except Exception as e:
-            logger.error(f"Route optimizer error: {e}")
-            route_result = {'error': str(e)}
+            logger.error(f"❌ Reservation brief failed, using per-agent calls: {e}")
+            return None
+    
+    def _run_stage_graph(
+        self,
+        stages: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, Any]], Dict[str, Any]]]]
+    ) -> Dict[str, Any]:
+        """
+        Execute pipeline stages as soon as their dependencies complete
         
-        return {
-            'spot_finder': spot_result,
-            'pricing': pricing_result,
-            'route': route_result
-        }
+        Args:
+            stages: {name: (dependency names, fn(dependency results) -> result)}
+        Returns:
+            {name: result}; a stage that raises yields {'error': str}
+        """
+        outcomes = {name: Future() for name in stages}
+        launched = set()
+        lock = threading.Lock()
+        
+        # Stages run under the caller's context (request deadline included);
+        # each gets its own copy since a context can't be entered twice
+        context = contextvars.copy_context()
+        
+        def launch_ready():
+            with lock:
+                ready = [
+                    name for name, (deps, _) in stages.items()
+                    if name not in launched and all(outcomes[d].done() for d in deps)
+                ]
+                launched.update(ready)
+            
+            for name in ready:
+                deps, fn = stages[name]
+                inputs = {d: outcomes[d].result() for d in deps}
+                task = _pipeline_executor.submit(context.copy().run, fn, inputs)
+                task.add_done_callback(lambda task, name=name: settle(name, task))
+        
+        def settle(name, task):
+            try:
+                outcomes[name].set_result(task.result())
+            except Exception as e:
+                logger.error(f"{name} error: {e}")
+                outcomes[name].set_result({'error': str(e)})
+            launch_ready()
+        
+        launch_ready()
+        
+        return {name: outcome.result() for name, outcome in outcomes.items()}
     
     def _aggregate_results(self, sub_results: Dict[str, Any], request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Use Gemini AI to intelligently aggregate sub-agent results"""
@@ -276,20 +431,15 @@ class OrchestratorAgent:
         - Desired features: {request_data.get('desired_features')}
         
         Provide a confidence score (0-100) for this recommendation and explain why.
+        Respond in JSON: {{"confidence": <0-100>, "reasoning": "<one or two sentences>"}}
         """
         
         try:
-            response = gemini_service._generate_with_retry(context)
-            
-            # Parse Gemini response
-            import json
-            try:
-                ai_analysis = json.loads(response)
-            except:
-                ai_analysis = {
-                    'confidence': 85,
-                    'reasoning': response[:200]
-                }
+            ai_analysis = gemini_service.generate_structured(
+                context,
+                AggregationResult,
+                purpose='aggregation'
+            ).to_dict()
             
             recommended_spot = sub_results.get('spot_finder', {}).get('recommended_spot')
             
@@ -303,6 +453,7 @@ class OrchestratorAgent:
             
         except Exception as e:
             logger.error(f"❌ Gemini aggregation failed: {e}")
+            gemini_service.record_fallback('aggregation', e)
             
             # Fallback: use direct results with null checks
             recommended_spot = sub_results.get('spot_finder', {}).get('recommended_spot')
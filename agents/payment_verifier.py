@@ -6,12 +6,14 @@ Uses Gemini AI for fraud detection
 
 import os
 import logging
-import requests
 from typing import Dict, Any, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
-from services import gemini_service, masumi_service, firebase_service
+from services.gemini_service import gemini_service
+from services.masumi_service import masumi_service
+from services.firebase_service import firebase_service
+from services.payment_watcher import payment_watcher
 
 load_dotenv()
 
@@ -31,8 +33,9 @@ class PaymentVerifierAgent:
         self.agent_id = "payment_verifier_001"
         self.agent_name = "Payment Verifier Agent"
         
-        self.blockfrost_api_key = os.getenv('BLOCKFROST_PROJECT_ID')
-        self.blockfrost_url = "https://cardano-preprod.blockfrost.io/api/v0"
+        # Incremental address watcher (cursor per address, shared cache)
+        self.watcher = payment_watcher
+        self.watch_interval = float(os.getenv('PAYMENT_WATCHER_INTERVAL', '20'))
         
         logger.info(f"✅ {self.agent_name} initialized")
     
@@ -68,8 +71,12 @@ class PaymentVerifierAgent:
                     'message': 'Waiting for payment confirmation'
                 }
             
-            # Step 2: Query Cardano blockchain via Blockfrost
-            blockchain_data = self._query_blockchain(payment_address)
+            # Step 2: Check the address watcher (only new transactions are fetched)
+            blockchain_data = self._query_blockchain(
+                payment_id,
+                payment_address,
+                masumi_status.get('required_amount')
+            )
             
             if not blockchain_data.get('success'):
                 return {
@@ -110,62 +117,61 @@ class PaymentVerifierAgent:
                 'error': str(e)
             }
     
-    def _query_blockchain(self, address: str) -> Dict[str, Any]:
-        """Query Cardano blockchain via Blockfrost API"""
+    def watch_payment(
+        self,
+        payment_id: str,
+        payment_address: str,
+        amount_lovelace: Optional[int] = None,
+        callback=None
+    ) -> bool:
+        """
+        Start watching for a payment in the background
+        
+        The callback (if given) is pushed the detected transaction as soon
+        as the watcher sees it, so callers don't need to re-query.
+        """
+        registered = self.watcher.expect_payment(
+            payment_id,
+            payment_address,
+            amount_lovelace,
+            callback=callback
+        )
+        self.watcher.start(self.watch_interval)
+        return registered
+    
+    def _query_blockchain(
+        self,
+        payment_id: str,
+        address: str,
+        required_amount: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Match the payment against new transactions at the address"""
         
-        logger.info(f"🔗 Querying blockchain for address: {address[:20]}...")
+        logger.info(f"🔗 Checking payment watcher for address: {address[:20]}...")
         
         try:
-            headers = {
-                'project_id': self.blockfrost_api_key
-            }
-            
-            # Get address transactions
-            url = f"{self.blockfrost_url}/addresses/{address}/transactions"
-            response = requests.get(url, headers=headers, timeout=10)
+            # Registering twice is a no-op; amount None matches the first unclaimed output
+            self.watch_payment(payment_id, address, required_amount or None)
             
-            if response.status_code == 200:
-                transactions = response.json()
-                
-                if transactions:
-                    # Get details of most recent transaction
-                    latest_tx = transactions[0]
-                    tx_hash = latest_tx.get('tx_hash')
-                    
-                    # Get transaction details
-                    tx_url = f"{self.blockfrost_url}/txs/{tx_hash}"
-                    tx_response = requests.get(tx_url, headers=headers, timeout=10)
-                    
-                    if tx_response.status_code == 200:
-                        tx_details = tx_response.json()
-                        
-                        return {
-                            'success': True,
-                            'tx_hash': tx_hash,
-                            'amount_lovelace': int(tx_details.get('output_amount', [{}])[0].get('quantity', 0)),
-                            'confirmations': tx_details.get('block_height', 0),
-                            'timestamp': tx_details.get('block_time')
-                        }
-                
-                logger.info("📭 No transactions found for this address")
-                return {
-                    'success': False,
-                    'message': 'No transactions found'
-                }
+            match = self.watcher.get_match(payment_id)
+            if not match:
+                self.watcher.poll_address(address)
+                match = self.watcher.get_match(payment_id)
             
-            elif response.status_code == 404:
-                logger.info("📭 Address not found on blockchain (no activity yet)")
+            if not match:
+                logger.info("📭 No matching payment found for this address")
                 return {
                     'success': False,
-                    'message': 'Address not active'
+                    'message': 'No matching transaction found'
                 }
             
-            else:
-                logger.error(f"❌ Blockfrost API error: {response.status_code}")
-                return {
-                    'success': False,
-                    'error': f"API error: {response.status_code}"
-                }
+            return {
+                'success': True,
+                'tx_hash': match['tx_hash'],
+                'amount_lovelace': match['amount_lovelace'],
+                'confirmations': match['confirmations'],
+                'timestamp': match['block_time']
+            }
                 
         except Exception as e:
             logger.error(f"❌ Blockchain query failed: {e}")
@@ -260,14 +266,15 @@ class PaymentVerifierAgent:
         logger.info("🔍 Monitoring pending payments...")
         
         try:
-            # Get all reservations with pending_payment status
-            # (In production, query Firebase for pending reservations)
+            # One incremental poll per watched address, however many
+            # reservations are waiting on it
+            poll_result = self.watcher.poll_all()
             
-            # For now, return monitoring status
             return {
                 'status': 'monitoring',
                 'checked_at': datetime.utcnow().isoformat(),
-                'message': 'Payment monitoring active'
+                'message': 'Payment monitoring active',
+                **poll_result
             }
             
         except Exception as e:
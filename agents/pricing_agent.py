@@ -1,14 +1,20 @@
 """
 Pricing Agent
-Uses Gemini AI for dynamic pricing based on demand, time, weather, events
+Dynamic pricing from precomputed rate cards (time, Gemini demand forecasts,
+occupancy, features), with Gemini explanations
 """
 
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from datetime import datetime, time as dt_time
 import random
 
-from services import gemini_service
+from services.demand_model import demand_model
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
+from services import demand_forecast_service
+from services.demand_forecast import bucket_for
+from services.rate_cards import BASE_PRICES, fallback_demand, feature_premium, rate_card_engine, time_multiplier
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,19 +34,16 @@ class PricingAgent:
         self.agent_id = "pricing_agent_001"
         self.agent_name = "Pricing Agent"
         
-        # Base prices (in ADA)
-        self.base_prices = {
-            'regular': 0.5,   # 0.5 ADA per hour
-            'premium': 0.75,  # 0.75 ADA per hour
-            'disabled': 0.5   # Same as regular
-        }
+        # Base prices (in ADA per hour)
+        self.base_prices = dict(BASE_PRICES)
         
         logger.info(f"✅ {self.agent_name} initialized")
     
     def calculate_price(
         self, 
         spot_data: Dict[str, Any], 
-        request_data: Dict[str, Any]
+        request_data: Dict[str, Any],
+        explain: bool = True
     ) -> Dict[str, Any]:
         """
         Calculate dynamic price for parking spot
@@ -56,6 +59,8 @@ class PricingAgent:
                 'duration_hours': float,
                 'user_location': {...}
             }
+            explain: Set False to skip the Gemini explanation (e.g. when it
+                is streamed separately with stream_pricing_explanation)
         
         Returns:
             {
@@ -72,53 +77,32 @@ class PricingAgent:
         logger.info(f"💰 Calculating price for spot: {spot_data.get('spot_id')}")
         
         try:
-            # Get base price
-            spot_type = spot_data.get('type', 'regular')
-            base_price = self.base_prices.get(spot_type, 0.5)
             duration = request_data.get('duration_hours', 1.0)
             
-            # Use Gemini AI for demand analysis
-            demand_analysis = self._analyze_demand_with_ai(spot_data, request_data)
-            
-            # Calculate time-based multiplier
-            time_multiplier = self._calculate_time_multiplier()
+            # Historical demand retrains nightly from Firebase
+            demand_model.start(firebase_service)
             
-            # Calculate feature premium
-            feature_premium = self._calculate_feature_premium(spot_data['features'])
+            # Rates per 15-minute slot come from the precomputed rate card
+            # for this zone/type/features (no model call)
+            quote = rate_card_engine.quote(spot_data, duration, request_data)
             
-            # Calculate total price
-            total_price = (
-                base_price * duration * 
-                demand_analysis['demand_multiplier'] * 
-                time_multiplier
-            ) + feature_premium
+            if quote['rate_card']['demand_source'] == 'rules':
+                gemini_service.record_fallback('demand_forecast', 'not_ready')
             
             # Use Gemini AI to explain the pricing
-            pricing_explanation = self._explain_pricing_with_ai(
-                base_price,
-                duration,
-                demand_analysis,
-                time_multiplier,
-                feature_premium,
-                total_price
-            )
+            if explain:
+                pricing_explanation = self._explain_pricing_with_ai(
+                    quote['base_price'],
+                    duration,
+                    {'demand_multiplier': quote['demand_multiplier'], 'reasoning': quote['demand_reasoning']},
+                    quote['time_multiplier'],
+                    quote['feature_premium'],
+                    quote['total_price']
+                )
+            else:
+                pricing_explanation = self._fallback_explanation(quote['total_price'], duration)
             
-            return {
-                'base_price': base_price,
-                'duration_hours': duration,
-                'time_multiplier': time_multiplier,
-                'demand_multiplier': demand_analysis['demand_multiplier'],
-                'feature_premium': feature_premium,
-                'total_price': round(total_price, 2),
-                'breakdown': {
-                    'base': f"{base_price} ADA/hour",
-                    'time_adjustment': f"x{time_multiplier} ({'peak' if time_multiplier > 1 else 'off-peak'})",
-                    'demand_adjustment': f"x{demand_analysis['demand_multiplier']} ({demand_analysis['reasoning']})",
-                    'features': f"+{feature_premium} ADA ({', '.join(spot_data['features']) if spot_data['features'] else 'none'})"
-                },
-                'ai_reasoning': pricing_explanation,
-                'demand_score': demand_analysis.get('demand_score', 50)
-            }
+            return self._pricing_result(quote, spot_data, pricing_explanation)
             
         except Exception as e:
             logger.error(f"❌ Error calculating price: {e}")
@@ -136,115 +120,111 @@ class PricingAgent:
                 'ai_reasoning': 'Fallback pricing (AI unavailable)'
             }
     
-    def _analyze_demand_with_ai(
-        self, 
-        spot_data: Dict[str, Any], 
+    def quote_matrix(
+        self,
+        spots: List[Dict[str, Any]],
+        durations: List[float],
         request_data: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Use Gemini AI to analyze demand and suggest multiplier"""
+        """
+        Price many spots for many durations at once (no explanations)
+        
+        Time and demand factors are shared through the rate cards: each
+        pricing context is computed once per 15-minute slot, whatever the
+        number of spots or durations.
         
-        logger.info("🧠 Analyzing demand with Gemini AI...")
+        Returns:
+            {
+                'spot_ids': [...],
+                'durations': [...],
+                'prices': [[total ADA per duration] per spot]
+            }
+        """
         
-        # Prepare context for Gemini
-        current_hour = datetime.now().hour
-        current_day = datetime.now().strftime('%A')
+        logger.info(f"💰 Bulk pricing {len(spots)} spots x {len(durations)} durations")
         
-        context = {
-            'current_time': {
-                'hour': current_hour,
-                'day': current_day,
-                'is_weekend': datetime.now().weekday() >= 5
-            },
-            'spot_info': {
-                'zone': spot_data.get('zone'),
-                'type': spot_data.get('type'),
-                'features': spot_data.get('features', [])
-            },
-            'duration': request_data.get('duration_hours'),
-            'weather': 'sunny',  # In production, integrate weather API
-            'special_events': []  # In production, check events calendar
-        }
+        spot_ids = [spot.get('spot_id') for spot in spots]
         
         try:
-            demand_result = gemini_service.analyze_demand_forecast(context)
-            
-            logger.info(f"✅ Gemini demand analysis: {demand_result.get('demand_score')}/100")
-            
-            return demand_result
+            demand_model.start(firebase_service)
+            prices = rate_card_engine.quote_matrix(spots, durations, request_data)
             
         except Exception as e:
-            logger.error(f"❌ Gemini demand analysis failed: {e}")
+            logger.error(f"❌ Error in bulk pricing: {e}")
             
-            # Fallback: rule-based demand
-            return self._fallback_demand_analysis(current_hour)
+            # Fallback: simple pricing
+            prices = [
+                [round(self.base_prices.get(spot.get('type', 'regular'), 0.5) * duration, 2) for duration in durations]
+                for spot in spots
+            ]
+            return {'spot_ids': spot_ids, 'durations': durations, 'prices': prices, 'fallback': True}
+        
+        return {'spot_ids': spot_ids, 'durations': durations, 'prices': prices}
     
-    def _fallback_demand_analysis(self, hour: int) -> Dict[str, Any]:
-        """Fallback demand analysis when Gemini is unavailable"""
+    def _pricing_result(self, quote: Dict[str, Any], spot_data: Dict[str, Any], explanation: str) -> Dict[str, Any]:
+        """calculate_price() result from a rate card quote"""
+        features = spot_data.get('features') or []
+        time_mult = quote['time_multiplier']
         
-        # Peak hours: 8-10am, 5-7pm
-        if (8 <= hour <= 10) or (17 <= hour <= 19):
-            return {
-                'demand_score': 80,
-                'demand_multiplier': 1.4,
-                'reasoning': 'Peak hours (high demand)',
-                'peak_expected': True
-            }
-        # Normal hours
-        elif 7 <= hour <= 21:
-            return {
-                'demand_score': 50,
-                'demand_multiplier': 1.0,
-                'reasoning': 'Normal demand',
-                'peak_expected': False
-            }
-        # Off-peak hours
-        else:
-            return {
-                'demand_score': 20,
-                'demand_multiplier': 0.8,
-                'reasoning': 'Off-peak hours (low demand)',
-                'peak_expected': False
-            }
+        return {
+            **quote,
+            'breakdown': {
+                'base': f"{quote['base_price']} ADA/hour",
+                'time_adjustment': f"x{time_mult} ({'peak' if time_mult > 1 else 'off-peak'})",
+                'demand_adjustment': f"x{quote['demand_multiplier']} ({quote['demand_reasoning']})",
+                'features': f"+{quote['feature_premium']} ADA ({', '.join(features) if features else 'none'})"
+            },
+            'ai_reasoning': explanation
+        }
     
-    def _calculate_time_multiplier(self) -> float:
-        """Calculate time-based pricing multiplier"""
+    def _analyze_demand_with_ai(
+        self, 
+        spot_data: Dict[str, Any], 
+        request_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Demand multiplier from the precomputed Gemini forecast for this
+        context bucket (hour-of-week, weather, event, occupancy decile)
+        
+        Never calls the model: buckets that are not computed yet are
+        refreshed in the background and priced from historical occupancy
+        (demand model) or the rule-based fallback.
+        """
         
         now = datetime.now()
-        hour = now.hour
-        is_weekend = now.weekday() >= 5
+        bucket = bucket_for(
+            when=now,
+            weather=request_data.get('weather', 'sunny'),  # In production, integrate weather API
+            has_event=bool(request_data.get('special_events')),  # In production, check events calendar
+            occupancy_rate=request_data.get('occupancy_rate')
+        )
         
-        # Peak hours (8-10am, 5-7pm on weekdays)
-        if not is_weekend and ((8 <= hour <= 10) or (17 <= hour <= 19)):
-            return 1.3
+        demand_result = demand_forecast_service.get_forecast(bucket)
         
-        # Weekend premium
-        if is_weekend and (10 <= hour <= 20):
-            return 1.2
+        if demand_result:
+            logger.info(f"✅ Gemini demand forecast ({demand_result['forecast_bucket']}): {demand_result.get('demand_score')}/100")
+            return demand_result
         
-        # Night discount
-        if hour < 6 or hour > 22:
-            return 0.8
+        historical = demand_model.forecast(now)
+        if historical:
+            logger.info(f"📈 Demand forecast not ready for this bucket, using history: {historical['demand_score']}/100")
+            return historical
         
-        # Normal hours
-        return 1.0
+        logger.info("📭 Demand forecast not ready for this bucket, using rule-based demand")
+        gemini_service.record_fallback('demand_forecast', 'not_ready')
+        return self._fallback_demand_analysis(now.hour)
+    
+    def _fallback_demand_analysis(self, hour: int) -> Dict[str, Any]:
+        """Fallback demand analysis when Gemini is unavailable"""
+        return fallback_demand(hour)
+    
+    def _calculate_time_multiplier(self) -> float:
+        """Calculate time-based pricing multiplier"""
+        return time_multiplier(datetime.now())
     
     def _calculate_feature_premium(self, features: List[str]) -> float:
         """Calculate premium for spot features"""
-        
-        premium = 0.0
-        
-        feature_prices = {
-            'covered': 0.1,
-            'ev_charging': 0.2,
-            'disabled_access': 0.0,  # No premium for accessibility
-            'security_camera': 0.05,
-            'well_lit': 0.05
-        }
-        
-        for feature in features:
-            premium += feature_prices.get(feature, 0.0)
-        
-        return premium
+        return feature_premium(features)
     
     def _explain_pricing_with_ai(
         self,
@@ -257,22 +237,22 @@ class PricingAgent:
     ) -> str:
         """Use Gemini AI to explain the pricing breakdown"""
         
-        context = f"""
-        Explain this parking pricing to the user in one friendly sentence:
-        
-        Base rate: {base_price} ADA/hour
-        Duration: {duration} hours
-        Time multiplier: {time_multiplier}x ({'peak' if time_multiplier > 1 else 'off-peak'})
-        Demand multiplier: {demand_analysis.get('demand_multiplier')}x ({demand_analysis.get('reasoning')})
-        Feature premium: +{feature_premium} ADA
-        
-        TOTAL: {total_price} ADA
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('pricing_explanation', 'degraded')
+            return self._fallback_explanation(total_price, duration)
         
-        Make it sound reasonable and customer-friendly.
-        """
+        context = self._pricing_explanation_prompt(
+            base_price,
+            duration,
+            demand_analysis.get('demand_multiplier'),
+            demand_analysis.get('reasoning'),
+            time_multiplier,
+            feature_premium,
+            total_price
+        )
         
         try:
-            explanation = gemini_service._generate_with_retry(context)
+            explanation = gemini_service._generate_with_retry(context, purpose='pricing_explanation')
             
             # Clean up response (remove quotes, extra formatting)
             explanation = explanation.strip().strip('"\'')
@@ -283,9 +263,70 @@ class PricingAgent:
             
         except Exception as e:
             logger.error(f"❌ Gemini explanation failed: {e}")
+            gemini_service.record_fallback('pricing_explanation', e)
             
             # Fallback explanation
-            return f"Total: {total_price} ADA for {duration}h parking with current demand conditions"
+            return self._fallback_explanation(total_price, duration)
+    
+    def stream_pricing_explanation(self, pricing: Dict[str, Any]) -> Iterator[str]:
+        """
+        Stream the Gemini explanation for a calculate_price() result
+        
+        Yields text chunks as they are generated; falls back to the
+        one-line summary if Gemini fails before producing any text.
+        """
+        context = self._pricing_explanation_prompt(
+            pricing.get('base_price'),
+            pricing.get('duration_hours'),
+            pricing.get('demand_multiplier'),
+            pricing.get('demand_reasoning'),
+            pricing.get('time_multiplier', 1.0),
+            pricing.get('feature_premium', 0.0),
+            pricing.get('total_price')
+        )
+        
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('pricing_explanation', 'degraded')
+            yield self._fallback_explanation(pricing.get('total_price'), pricing.get('duration_hours'))
+            return
+        
+        streamed = False
+        try:
+            for chunk in gemini_service.generate_stream(context, purpose='pricing_explanation'):
+                streamed = True
+                yield chunk
+        except Exception as e:
+            logger.error(f"❌ Gemini explanation stream failed: {e}")
+            if not streamed:
+                gemini_service.record_fallback('pricing_explanation', e)
+                yield self._fallback_explanation(pricing.get('total_price'), pricing.get('duration_hours'))
+    
+    def _pricing_explanation_prompt(
+        self,
+        base_price: float,
+        duration: float,
+        demand_multiplier: float,
+        demand_reasoning: str,
+        time_multiplier: float,
+        feature_premium: float,
+        total_price: float
+    ) -> str:
+        return f"""
+        Explain this parking pricing to the user in one friendly sentence:
+        
+        Base rate: {base_price} ADA/hour
+        Duration: {duration} hours
+        Time multiplier: {time_multiplier}x ({'peak' if time_multiplier > 1 else 'off-peak'})
+        Demand multiplier: {demand_multiplier}x ({demand_reasoning})
+        Feature premium: +{feature_premium} ADA
+        
+        TOTAL: {total_price} ADA
+        
+        Make it sound reasonable and customer-friendly.
+        """
+    
+    def _fallback_explanation(self, total_price: float, duration: float) -> str:
+        return f"Total: {total_price} ADA for {duration}h parking with current demand conditions"
 
 
 # Singleton instance
@@ -1,24 +1,40 @@
 """
 Route Optimizer Agent
-Uses Gemini AI to calculate optimal walking route to parking spot
+Calculates the route to a parking spot over the lot layout graph, with
+Gemini AI directions as an alternative
 """
 
+import os
 import logging
 import math
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-from services import gemini_service
+from services.gemini_service import gemini_service
+from services.directions_store import directions_store
+from services.lot_layout import ENTRANCES, lot_router
+from services.structured_output import StructuredOutputError, extract_json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def layout_version() -> str:
+    """
+    Version of the lot layout that generated directions depend on
+    
+    LOT_LAYOUT_VERSION overrides it (bump it when the physical lot changes);
+    otherwise it is the routing layout's version.
+    """
+    return os.getenv('LOT_LAYOUT_VERSION') or lot_router.version()
+
+
 class RouteOptimizerAgent:
     """
     Calculates optimal route from user location to parking spot using:
-    - Distance calculation (Haversine formula)
+    - Shortest paths over the lot layout graph (walking and driving)
     - Walking time estimation
-    - Gemini AI for route suggestions and alternative paths
+    - Gemini AI for directions and tips when the graph can't route a spot
+      (or ROUTE_DIRECTIONS_SOURCE=ai)
     """
     
     def __init__(self):
@@ -28,6 +44,13 @@ class RouteOptimizerAgent:
         # Average walking speed: 1.4 m/s (5 km/h)
         self.walking_speed_ms = 1.4
         
+        # 'graph' builds directions from the lot layout; 'ai' asks Gemini
+        self.directions_source = os.getenv('ROUTE_DIRECTIONS_SOURCE', 'graph').lower()
+        
+        # Directions only depend on the entrance and the spot, so they are
+        # generated once per pair and reused until the layout changes
+        directions_store.set_layout_version(layout_version())
+        
         logger.info(f"✅ {self.agent_name} initialized")
     
     def optimize_route(
@@ -59,6 +82,11 @@ class RouteOptimizerAgent:
         logger.info(f"🗺️  Calculating route to spot: {spot_data.get('spot_id')}")
         
         try:
+            if self.directions_source == 'graph':
+                lot_route = lot_router.route_to_spot(spot_data)
+                if lot_route:
+                    return self.build_graph_route(spot_data, lot_route)
+            
             # Use pre-calculated distance from spot_data
             distance = spot_data.get('distance_meters', 100)
             
@@ -66,32 +94,41 @@ class RouteOptimizerAgent:
             walking_time_sec = distance / self.walking_speed_ms
             walking_time_min = walking_time_sec / 60
             
-            # Use Gemini AI to generate walking directions
-            directions = self._generate_directions_with_ai(
+            entrance = self._get_entrance_info(spot_data)['name']
+            spot_id = spot_data.get('spot_id')
+            
+            stored = directions_store.get(entrance, spot_id)
+            if stored:
+                logger.info(f"🗺️  Reusing stored directions for {entrance} -> {spot_id}")
+                return self.build_route(spot_data, stored['directions'], stored['tip'])
+            
+            # Directions and the route tip are independent Gemini calls:
+            # run them concurrently
+            directions_call = gemini_service.submit(
+                self._generate_directions_with_ai,
                 user_location,
                 spot_data,
                 distance
             )
-            
-            # Use Gemini AI for route optimization suggestions
-            ai_suggestions = self._get_route_suggestions_with_ai(
+            suggestions_call = gemini_service.submit(
+                self._get_route_suggestions_with_ai,
                 spot_data,
                 distance,
                 walking_time_min
             )
             
-            return {
-                'distance_meters': round(distance, 1),
-                'walking_time_minutes': round(walking_time_min, 1),
-                'walking_time_seconds': round(walking_time_sec, 0),
-                'directions': directions.get('steps', []),
-                'ai_suggestions': ai_suggestions,
-                'entrance': self._get_entrance_info(spot_data),
-                'accessibility': {
-                    'wheelchair_accessible': 'disabled_access' in spot_data.get('features', []),
-                    'elevator_available': spot_data.get('zone') in ['A', 'B']  # Simulate
-                }
-            }
+            directions = directions_call.result()
+            ai_suggestions = suggestions_call.result()
+            
+            # Only model output is worth keeping; fallbacks are regenerated next time
+            if ai_suggestions and not directions.get('fallback'):
+                directions_store.put(entrance, spot_id, directions['steps'], ai_suggestions)
+            
+            return self.build_route(
+                spot_data,
+                directions.get('steps', []),
+                ai_suggestions or self._fallback_tip(spot_data, walking_time_min)
+            )
             
         except Exception as e:
             logger.error(f"❌ Error calculating route: {e}")
@@ -107,6 +144,80 @@ class RouteOptimizerAgent:
                 'ai_suggestions': 'Basic route (AI unavailable)'
             }
     
+    def build_route(
+        self,
+        spot_data: Dict[str, Any],
+        directions: List[str],
+        ai_suggestions: str
+    ) -> Dict[str, Any]:
+        """
+        Assemble the optimize_route() result from directions and a tip
+        (generated here or by the orchestrator's reservation brief)
+        """
+        distance = spot_data.get('distance_meters', 100)
+        walking_time_sec = distance / self.walking_speed_ms
+        
+        return {
+            'distance_meters': round(distance, 1),
+            'walking_time_minutes': round(walking_time_sec / 60, 1),
+            'walking_time_seconds': round(walking_time_sec, 0),
+            'directions': directions,
+            'ai_suggestions': ai_suggestions,
+            'entrance': self._get_entrance_info(spot_data),
+            'accessibility': {
+                'wheelchair_accessible': 'disabled_access' in spot_data.get('features', []),
+                'elevator_available': spot_data.get('zone') in ['A', 'B']  # Simulate
+            }
+        }
+    
+    @property
+    def brief_needs_directions(self) -> bool:
+        """Whether the reservation brief should ask the model for directions"""
+        return self.directions_source != 'graph'
+    
+    def route_from_brief(self, spot_data: Dict[str, Any], directions: List[str], tip: str) -> Dict[str, Any]:
+        """
+        Route for the orchestrator's reservation brief (graph directions when available)
+        
+        Briefs written for the graph source carry no directions; if the graph
+        can't route the spot, stored or rule-based directions are used (no
+        extra model call on the brief path).
+        """
+        if self.directions_source == 'graph':
+            lot_route = lot_router.route_to_spot(spot_data)
+            if lot_route:
+                return self.build_graph_route(spot_data, lot_route)
+        
+        if not directions:
+            stored = directions_store.get(self._get_entrance_info(spot_data)['name'], spot_data.get('spot_id'))
+            if stored:
+                return self.build_route(spot_data, stored['directions'], stored['tip'])
+            walking_time_min = spot_data.get('distance_meters', 100) / self.walking_speed_ms / 60
+            return self.build_route(
+                spot_data,
+                self._fallback_directions(spot_data),
+                self._fallback_tip(spot_data, walking_time_min)
+            )
+        
+        return self.build_route(spot_data, directions, tip)
+    
+    def build_graph_route(self, spot_data: Dict[str, Any], lot_route: Dict[str, Any]) -> Dict[str, Any]:
+        """optimize_route() result from a lot layout route (no model call)"""
+        walking = lot_route['walking']
+        driving = lot_route['driving']
+        
+        route = self.build_route(
+            {**spot_data, 'distance_meters': walking['distance_m']},
+            walking['directions'],
+            f"Your spot is on {lot_route['level']}; the {lot_route['entrance']} is the closest way in."
+        )
+        route['entrance'] = self._get_entrance_by_name(lot_route['entrance']) or route['entrance']
+        route['level'] = lot_route['level']
+        route['driving_distance_meters'] = driving['distance_m'] if driving else None
+        route['driving_directions'] = driving['directions'] if driving else []
+        
+        return route
+    
     def _generate_directions_with_ai(
         self,
         user_location: Dict[str, float],
@@ -115,6 +226,10 @@ class RouteOptimizerAgent:
     ) -> Dict[str, Any]:
         """Use Gemini AI to generate step-by-step walking directions"""
         
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('route_directions', 'degraded')
+            return {'steps': self._fallback_directions(spot_data), 'fallback': True}
+        
         logger.info("🧠 Generating directions with Gemini AI...")
         
         context = f"""
@@ -135,28 +250,93 @@ class RouteOptimizerAgent:
         """
         
         try:
-            response = gemini_service._generate_with_retry(context)
+            response = gemini_service._generate_with_retry(
+                context,
+                purpose='route_directions',
+                json_mode=True
+            )
             
-            # Parse Gemini response
-            import json
+            # Parse Gemini response (tolerates code fences and preamble)
             try:
-                steps = json.loads(response)
-                if isinstance(steps, list):
-                    return {'steps': steps}
+                steps = extract_json(response)
+                if isinstance(steps, dict):
+                    steps = steps.get('directions') or steps.get('steps')
+                if isinstance(steps, list) and steps:
+                    return {'steps': [str(step) for step in steps]}
                 else:
-                    raise ValueError("Invalid format")
-            except:
+                    raise StructuredOutputError("Invalid format")
+            except StructuredOutputError as e:
                 # Try to extract list from response
                 import re
                 matches = re.findall(r'"(.*?)"', response)
                 if matches:
                     return {'steps': matches[:5]}
                 else:
-                    return {'steps': self._fallback_directions(spot_data)}
+                    gemini_service.record_fallback('route_directions', e)
+                    return {'steps': self._fallback_directions(spot_data), 'fallback': True}
             
         except Exception as e:
             logger.error(f"❌ Gemini directions failed: {e}")
-            return {'steps': self._fallback_directions(spot_data)}
+            gemini_service.record_fallback('route_directions', e)
+            return {'steps': self._fallback_directions(spot_data), 'fallback': True}
+    
+    def stream_directions(
+        self,
+        user_location: Dict[str, float],
+        spot_data: Dict[str, Any]
+    ) -> Iterator[str]:
+        """
+        Stream walking directions as Gemini generates them
+        
+        The prompt asks for one step per line (rather than a JSON array) so
+        each chunk is readable as soon as it arrives.
+        
+        Yields:
+            Text chunks; the rule-based directions if Gemini fails before
+            producing any text
+        """
+        
+        distance = spot_data.get('distance_meters', 100)
+        
+        if self.directions_source == 'graph':
+            lot_route = lot_router.route_to_spot(spot_data)
+            if lot_route:
+                yield '\n'.join(lot_route['walking']['directions'])
+                return
+        
+        stored = directions_store.get(self._get_entrance_info(spot_data)['name'], spot_data.get('spot_id'))
+        if stored:
+            yield '\n'.join(stored['directions'])
+            return
+        
+        context = f"""
+        Generate step-by-step walking directions to a parking spot.
+        
+        USER LOCATION: Entrance area (simulated coordinates: {user_location})
+        DESTINATION: Parking Zone {spot_data.get('zone')}, Spot {spot_data.get('spot_id')}
+        DISTANCE: {distance} meters
+        
+        Write 3-5 simple walking directions, one per line, each starting
+        with "Step N:". No other text.
+        
+        Keep it practical and clear for someone walking to their car.
+        """
+        
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('route_directions', 'degraded')
+            yield '\n'.join(self._fallback_directions(spot_data))
+            return
+        
+        streamed = False
+        try:
+            for chunk in gemini_service.generate_stream(context, purpose='route_directions'):
+                streamed = True
+                yield chunk
+        except Exception as e:
+            logger.error(f"❌ Gemini directions stream failed: {e}")
+            if not streamed:
+                gemini_service.record_fallback('route_directions', e)
+                yield '\n'.join(self._fallback_directions(spot_data))
     
     def _fallback_directions(self, spot_data: Dict[str, Any]) -> List[str]:
         """Fallback directions when Gemini is unavailable"""
@@ -176,8 +356,8 @@ class RouteOptimizerAgent:
         spot_data: Dict[str, Any],
         distance: float,
         walking_time: float
-    ) -> str:
-        """Use Gemini AI to provide helpful route suggestions"""
+    ) -> Optional[str]:
+        """Use Gemini AI to provide helpful route suggestions (None on failure)"""
         
         context = f"""
         Give one helpful tip for someone walking to parking spot {spot_data.get('spot_id')} 
@@ -195,7 +375,7 @@ class RouteOptimizerAgent:
         """
         
         try:
-            suggestion = gemini_service._generate_with_retry(context)
+            suggestion = gemini_service._generate_with_retry(context, purpose='route_tips')
             
             # Clean up response
             suggestion = suggestion.strip().strip('"\'')
@@ -206,35 +386,22 @@ class RouteOptimizerAgent:
             
         except Exception as e:
             logger.error(f"❌ Gemini suggestion failed: {e}")
-            
-            # Fallback suggestion
-            return f"Follow the signs to Zone {spot_data.get('zone')} - it's a {walking_time:.0f} minute walk."
+            gemini_service.record_fallback('route_tips', e)
+            return None
+    
+    def _fallback_tip(self, spot_data: Dict[str, Any], walking_time: float) -> str:
+        """Fallback suggestion when Gemini is unavailable"""
+        return f"Follow the signs to Zone {spot_data.get('zone')} - it's a {walking_time:.0f} minute walk."
     
     def _get_entrance_info(self, spot_data: Dict[str, Any]) -> Dict[str, str]:
         """Get entrance information for the parking zone"""
         
         zone = spot_data.get('zone', 'A')
         
-        # Simulate entrance info
-        entrance_map = {
-            'A': {
-                'name': 'Main Entrance',
-                'description': 'Ground floor, near the security booth',
-                'coordinates': 'N1, Ground Level'
-            },
-            'B': {
-                'name': 'West Entrance',
-                'description': 'Second floor, elevator available',
-                'coordinates': 'W2, Level 2'
-            },
-            'C': {
-                'name': 'East Entrance',
-                'description': 'Third floor, stairs and elevator',
-                'coordinates': 'E3, Level 3'
-            }
-        }
-        
-        return entrance_map.get(zone, entrance_map['A'])
+        return dict(ENTRANCES.get(zone, ENTRANCES['A']))
+    
+    def _get_entrance_by_name(self, name: Optional[str]) -> Optional[Dict[str, str]]:
+        return next((dict(entrance) for entrance in ENTRANCES.values() if entrance['name'] == name), None)
     
     def calculate_distance(
         self, 
@@ -9,7 +9,8 @@ import time
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 
-from services import firebase_service, gemini_service
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -252,7 +253,7 @@ class SecurityGuardAgent:
         # Fine structure: 0.1 ADA per 30 minutes overstay
         fine_ada = (overstay_minutes / 30) * 0.1
         
-        from services import masumi_service
+        from services.masumi_service import masumi_service
         return masumi_service.ada_to_lovelace(fine_ada)
     
     def start_monitoring(self):
@@ -3,15 +3,23 @@ Spot Finder Agent
 Uses Gemini AI to find the best parking spot based on user preferences
 """
 
+import os
+import heapq
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime
 
-from services import firebase_service, gemini_service
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
+from services import spot_allocator, spot_geometry_store, spot_index, spot_ranker
+from services.structured_output import SpotRanking, StructuredOutputError
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Spots returned per request: the recommendation plus two alternatives
+RECOMMENDATION_SIZE = 3
+
 
 class SpotFinderAgent:
     """
@@ -24,6 +32,21 @@ class SpotFinderAgent:
     def __init__(self):
         self.agent_id = "spot_finder_001"
         self.agent_name = "SpotFinder Agent"
+        
+        # Only the best geo-scored spots are sent to Gemini for ranking
+        self.ai_max_candidates = int(os.getenv('SPOT_FINDER_AI_CANDIDATES', '10'))
+        
+        # Nearest available spots considered per request once the spatial
+        # index is live (instead of every available spot in the database)
+        self.max_candidates = int(os.getenv('SPOT_FINDER_MAX_CANDIDATES', '50'))
+        self.use_spatial_index = os.getenv('SPOT_INDEX_ENABLED', 'true').lower() == 'true'
+        
+        # 'learned' scores spots locally with the trained ranker; 'ai' asks
+        # Gemini to rank every request. SPOT_RANKER_EXPLAIN adds one Gemini
+        # call to explain the learned top pick.
+        self.ranking_mode = os.getenv('SPOT_RANKING_MODE', 'learned').lower()
+        self.explain_top_pick = os.getenv('SPOT_RANKER_EXPLAIN', 'false').lower() == 'true'
+        
         logger.info(f"✅ {self.agent_name} initialized")
     
     def find_best_spot(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -32,6 +55,7 @@ class SpotFinderAgent:
         
         Args:
             request_data: {
+                'user_id': str (optional, for ranker training events),
                 'user_location': {'lat': float, 'lng': float},
                 'vehicle_type': str,
                 'desired_features': List[str],
@@ -50,14 +74,10 @@ class SpotFinderAgent:
         logger.info(f"🔍 Finding best spot for vehicle: {request_data.get('vehicle_type')}")
         
         try:
-            # Step 1: Get available spots from Firebase
-            filters = {
-                'features': request_data.get('desired_features', [])
-            }
-            
-            available_spots = firebase_service.get_available_spots(filters)
+            # Steps 1-2: Available spots with distances
+            available_count, spots_with_distance = self.find_candidates(request_data)
             
-            if not available_spots:
+            if not spots_with_distance:
                 return {
                     'success': False,
                     'error': 'No available spots found',
@@ -65,29 +85,17 @@ class SpotFinderAgent:
                     'alternatives': []
                 }
             
-            logger.info(f"📍 Found {len(available_spots)} available spots")
-            
-            # Step 2: Calculate distances for each spot
-            spots_with_distance = self._calculate_distances(
-                available_spots,
-                request_data['user_location']
-            )
-            
-            # Step 3: Use Gemini AI to rank spots intelligently
-            ranked_spots = self._rank_spots_with_ai(
-                spots_with_distance,
-                request_data
-            )
+            # Step 3: Rank spots (learned model, or Gemini)
+            if self.ranking_mode == 'ai':
+                ranked_spots = self._rank_spots_with_ai(spots_with_distance, request_data)
+            else:
+                ranked_spots = self._rank_spots_learned(spots_with_distance, request_data)
             
             # Step 4: Return top recommendation + alternatives
-            return {
-                'success': True,
-                'recommended_spot': ranked_spots[0] if ranked_spots else None,
-                'alternatives': ranked_spots[1:3] if len(ranked_spots) > 1 else [],
-                'total_available': len(available_spots),
-                'reasoning': ranked_spots[0].get('ai_reasoning') if ranked_spots else '',
-                'confidence': ranked_spots[0].get('ai_score', 0) if ranked_spots else 0
-            }
+            recommendation = self._build_recommendation(ranked_spots, available_count)
+            spot_ranker.log_impression(request_data, ranked_spots[:RECOMMENDATION_SIZE])
+            
+            return recommendation
             
         except Exception as e:
             logger.error(f"❌ Error finding spot: {e}")
@@ -101,6 +109,167 @@ class SpotFinderAgent:
                 'alternatives': []
             }
     
+    def find_candidates(
+        self,
+        request_data: Dict[str, Any],
+        holder: Optional[str] = None
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Available spots matching the request, with distances (no AI)
+        
+        Spots held for other booking attempts are skipped.
+        
+        Args:
+            request_data: See find_best_spot()
+            holder: Booking attempt whose own holds still count as available
+        Returns:
+            (number of available spots, spots with distance_meters)
+        """
+        held = spot_allocator.held_spots(exclude_holder=holder)
+        
+        if self.use_spatial_index:
+            # Index follows spot changes via a Firebase listener; until its
+            # first full sync arrives, fall through to the database scan
+            spot_index.start(firebase_service)
+            
+            if spot_index.ready:
+                return self._find_candidates_indexed(request_data, held)
+        
+        filters = {
+            'features': request_data.get('desired_features', [])
+        }
+        
+        available_spots = [
+            spot for spot in firebase_service.get_available_spots(filters)
+            if spot.get('spot_id') not in held
+        ]
+        
+        if not available_spots:
+            return 0, []
+        
+        logger.info(f"📍 Found {len(available_spots)} available spots")
+        
+        return len(available_spots), self._calculate_distances(
+            available_spots,
+            request_data['user_location']
+        )
+    
+    def _find_candidates_indexed(
+        self,
+        request_data: Dict[str, Any],
+        held: Set[str]
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """k nearest available, unheld spots with the desired features, from the spatial index"""
+        desired_features = request_data.get('desired_features', [])
+        
+        # Over-fetch by the number of holds so held spots don't shrink the candidate set
+        nearest = spot_index.nearest(
+            request_data.get('user_location'),
+            self.max_candidates + len(held),
+            required_features=desired_features
+        )
+        nearest = [(spot_id, distance) for spot_id, distance in nearest if spot_id not in held][:self.max_candidates]
+        
+        if not nearest:
+            return 0, []
+        
+        available_count = max(spot_index.count_available(desired_features) - len(held), len(nearest))
+        records = [record for record in (spot_index.get_record(spot_id) for spot_id, _ in nearest) if record]
+        
+        logger.info(f"📍 Found {available_count} available spots ({len(records)} nearest considered)")
+        
+        return available_count, self._calculate_distances(
+            records,
+            request_data['user_location']
+        )
+    
+    def allocate_spot(self, request_data: Dict[str, Any], holder: str) -> Dict[str, Any]:
+        """
+        Find the best spot for a booking attempt and hold it
+        
+        Candidates are ranked locally (learned ranker, no Gemini call) and
+        handed to the allocator, which holds the best one nobody else holds
+        (batching concurrent requests if a batch window is configured).
+        The hold stops concurrent requests being given the same spot until
+        the booking claims it or the hold expires.
+        
+        Args:
+            request_data: See find_best_spot()
+            holder: Booking attempt identifier (unique per attempt)
+        Returns:
+            find_best_spot() result for the held spot, plus 'hold'
+        """
+        
+        try:
+            available_count, spots = self.find_candidates(request_data, holder=holder)
+            
+            if not spots:
+                return {
+                    'success': False,
+                    'error': 'No available spots found',
+                    'recommended_spot': None,
+                    'alternatives': []
+                }
+            
+            ranked_spots = self._learned_ranking(spots, request_data.get('desired_features', []))
+            
+            spot_id = spot_allocator.allocate(
+                holder,
+                [(spot['spot_id'], spot['ranker_probability']) for spot in ranked_spots]
+            )
+            
+            if spot_id is None:
+                return {
+                    'success': False,
+                    'error': 'All matching spots are being booked, please retry',
+                    'recommended_spot': None,
+                    'alternatives': []
+                }
+            
+            ranked_spots.sort(key=lambda spot: spot['spot_id'] != spot_id)
+            
+            recommendation = self._build_recommendation(ranked_spots, available_count)
+            spot_ranker.log_impression(request_data, ranked_spots[:RECOMMENDATION_SIZE])
+            recommendation['hold'] = {'holder': holder, 'expires_in_seconds': spot_allocator.hold_seconds}
+            
+            logger.info(f"🔒 Holding spot {spot_id} for {holder}")
+            
+            return recommendation
+            
+        except Exception as e:
+            logger.error(f"❌ Error allocating spot: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'recommended_spot': None,
+                'alternatives': []
+            }
+    
+    def recommend_from_rankings(
+        self,
+        spots: List[Dict[str, Any]],
+        ai_rankings: List[Dict[str, Any]],
+        total_available: int,
+        top_spot_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Build a find_best_spot() result from rankings produced elsewhere
+        (e.g. the orchestrator's composite reservation brief)
+        """
+        ranked_spots = self._merge_rankings(spots, ai_rankings, top_spot_id=top_spot_id)
+        
+        return self._build_recommendation(ranked_spots, total_available)
+    
+    def _build_recommendation(self, ranked_spots: List[Dict[str, Any]], total_available: int) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'recommended_spot': ranked_spots[0] if ranked_spots else None,
+            'alternatives': ranked_spots[1:RECOMMENDATION_SIZE],
+            'total_available': total_available,
+            'reasoning': ranked_spots[0].get('ai_reasoning') if ranked_spots else '',
+            'confidence': ranked_spots[0].get('ai_score', 0) if ranked_spots else 0
+        }
+    
     def _calculate_distances(
         self, 
         spots: List[Dict[str, Any]],  # Changed from Dict to List
@@ -108,32 +277,26 @@ class SpotFinderAgent:
     ) -> List[Dict[str, Any]]:
         """Calculate distance from user to each parking spot"""
         
-        spots_list = []
-        
         # Handle both list and dict formats
         if isinstance(spots, list):
             spots_items = [(spot.get('spot_id'), spot) for spot in spots]
         else:
-            spots_items = spots.items()
+            spots_items = list(spots.items())
+        
+        # Spot coordinates live in the geometry store (spots without stored
+        # coordinates are placed by zone); Haversine runs over all of them at once
+        spot_geometry_store.upsert_many({**spot_data, 'spot_id': spot_id} for spot_id, spot_data in spots_items)
+        distances = spot_geometry_store.distances(user_location, [spot_id for spot_id, _ in spots_items])
+        
+        spots_list = []
         
         for spot_id, spot_data in spots_items:
-            # In production, spots would have coordinates
-            # For testing, we'll simulate distances based on zone
-            zone = spot_data.get('zone', 'A')
-            
-            # Simulate distance (zone A closer, zone B farther)
-            simulated_distance = {
-                'A': 50,   # 50 meters
-                'B': 120,  # 120 meters
-                'C': 200,  # 200 meters
-            }.get(zone, 100)
-            
             spot_with_distance = {
                 'spot_id': spot_id,
                 'zone': spot_data.get('zone'),
                 'type': spot_data.get('type'),
                 'features': spot_data.get('features', []),
-                'distance_meters': simulated_distance,
+                'distance_meters': round(distances[spot_id], 1),
                 'gpio_pin': spot_data.get('gpio_pin')
             }
             
@@ -141,6 +304,88 @@ class SpotFinderAgent:
         
         return spots_list
     
+    def shortlist(
+        self,
+        spots: List[Dict[str, Any]],
+        request_data: Dict[str, Any],
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Score spots by distance and feature match in one vectorised pass
+        (no AI) and return the best `limit`, each with a 'geo_score'
+        """
+        by_id = {spot['spot_id']: spot for spot in spots}
+        spot_geometry_store.upsert_many(spot for spot in spots if spot['spot_id'] not in spot_geometry_store)
+        
+        ranked = spot_geometry_store.rank(
+            request_data.get('user_location'),
+            request_data.get('desired_features', []),
+            spot_ids=list(by_id),
+            k=limit
+        )
+        
+        return [{**by_id[spot_id], 'geo_score': round(score, 1)} for spot_id, _, score in ranked]
+    
+    def _rank_spots_learned(
+        self,
+        spots: List[Dict[str, Any]],
+        request_data: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Rank spots with the local learned model (no Gemini call per spot)"""
+        
+        ranked_spots = self._learned_ranking(spots, request_data.get('desired_features', []), RECOMMENDATION_SIZE)
+        
+        if ranked_spots and self.explain_top_pick:
+            ranked_spots[0]['ai_reasoning'] = self._explain_top_pick(ranked_spots, request_data)
+        
+        logger.info(f"✅ Learned ranker ranked {len(ranked_spots)} spots")
+        
+        return ranked_spots
+    
+    def _learned_ranking(
+        self,
+        spots: List[Dict[str, Any]],
+        desired_features: List[str],
+        k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Spots scored by the learned ranker, best first (copies, with ai_score/ai_reasoning)"""
+        return [
+            {
+                **spot,
+                'ai_score': int(round(probability * 100)),
+                'ai_reasoning': f"Learned ranking: {spot_ranker.describe(spot, desired_features)}",
+                'ranker_probability': round(probability, 4)
+            }
+            for spot, probability in spot_ranker.rank(spots, desired_features, k=k)
+        ]
+    
+    def _explain_top_pick(self, ranked_spots: List[Dict[str, Any]], request_data: Dict[str, Any]) -> str:
+        """One short Gemini explanation for the top spot (template text on failure)"""
+        
+        top = ranked_spots[0]
+        fallback = top['ai_reasoning']
+        
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('spot_explanation', 'degraded')
+            return fallback
+        
+        prompt = f"""
+        In one sentence, explain to a driver why this parking spot was recommended.
+        
+        Spot {top['spot_id']}: {top['type']} spot, {top['distance_meters']}m away,
+        features: {', '.join(top['features']) if top['features'] else 'none'}
+        Driver wants: {request_data.get('desired_features', []) or 'no specific features'}
+        Other options: {', '.join(f"{s['spot_id']} ({s['distance_meters']}m)" for s in ranked_spots[1:3]) or 'none'}
+        """
+        
+        try:
+            explanation = gemini_service._generate_with_retry(prompt, purpose='spot_explanation').strip()
+            return explanation or fallback
+        except Exception as e:
+            logger.warning(f"⚠️  Top pick explanation failed: {e}")
+            gemini_service.record_fallback('spot_explanation', e)
+            return fallback
+    
     def _rank_spots_with_ai(
         self, 
         spots: List[Dict[str, Any]], 
@@ -148,8 +393,15 @@ class SpotFinderAgent:
     ) -> List[Dict[str, Any]]:
         """Use Gemini AI to intelligently rank parking spots"""
         
+        if gemini_service.is_degraded():
+            gemini_service.record_fallback('spot_ranking', 'degraded')
+            return self._fallback_ranking(spots, request_data)
+        
         logger.info("🧠 Using Gemini AI to rank spots...")
         
+        # Keep the prompt bounded on large lots
+        spots = self.shortlist(spots, request_data, self.ai_max_candidates)
+        
         # Prepare context for Gemini
         context = f"""
         You are an AI parking assistant. Rank these parking spots for the user.
@@ -179,30 +431,23 @@ class SpotFinderAgent:
         """
         
         try:
-            response = gemini_service._generate_with_retry(context)
-            
-            # Parse Gemini response
-            import json
             try:
-                ai_rankings = json.loads(response)
-            except:
-                # Fallback: parse as best as possible
-                logger.warning("⚠️  Failed to parse Gemini JSON, using fallback ranking")
-                ai_rankings = self._fallback_ranking(spots)
+                ai_rankings = [
+                    ranking.to_dict()
+                    for ranking in gemini_service.generate_structured_list(
+                        context,
+                        SpotRanking,
+                        purpose='spot_ranking',
+                        wrapper_keys=('rankings', 'spots')
+                    )
+                ]
+            except StructuredOutputError as e:
+                logger.warning(f"⚠️  Invalid Gemini rankings ({e}), using fallback ranking")
+                gemini_service.record_fallback('spot_ranking', e)
+                return self._fallback_ranking(spots, request_data)
             
             # Merge AI rankings with spot data
-            ranked_spots = []
-            for ranking in ai_rankings:
-                spot_id = ranking.get('spot_id')
-                spot_data = next((s for s in spots if s['spot_id'] == spot_id), None)
-                
-                if spot_data:
-                    spot_data['ai_score'] = ranking.get('score', 50)
-                    spot_data['ai_reasoning'] = ranking.get('reasoning', 'AI analysis')
-                    ranked_spots.append(spot_data)
-            
-            # Sort by AI score
-            ranked_spots.sort(key=lambda x: x.get('ai_score', 0), reverse=True)
+            ranked_spots = self._merge_rankings(spots, ai_rankings)
             
             logger.info(f"✅ Gemini ranked {len(ranked_spots)} spots")
             
@@ -210,9 +455,46 @@ class SpotFinderAgent:
             
         except Exception as e:
             logger.error(f"❌ Gemini ranking failed: {e}")
+            gemini_service.record_fallback('spot_ranking', e)
             
             # Fallback: simple distance-based ranking
-            return self._fallback_ranking(spots)
+            return self._fallback_ranking(spots, request_data)
+    
+    def _merge_rankings(
+        self,
+        spots: List[Dict[str, Any]],
+        ai_rankings: List[Dict[str, Any]],
+        k: int = RECOMMENDATION_SIZE,
+        top_spot_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Attach AI scores/reasoning to spot data and return the best k
+        
+        Spots are looked up by id and copied, so the caller's spot dicts
+        are left untouched. `top_spot_id` (if ranked) is always placed first.
+        """
+        
+        spots_by_id = {spot['spot_id']: spot for spot in spots}
+        
+        merged = {}
+        for ranking in ai_rankings:
+            spot_id = ranking.get('spot_id')
+            spot_data = spots_by_id.get(spot_id)
+            
+            # First ranking wins if the model repeats a spot
+            if spot_data and spot_id not in merged:
+                merged[spot_id] = {
+                    **spot_data,
+                    'ai_score': ranking.get('score', 50),
+                    'ai_reasoning': ranking.get('reasoning', 'AI analysis')
+                }
+        
+        # Only the top k are returned, so select them instead of sorting everything
+        return heapq.nlargest(
+            k,
+            merged.values(),
+            key=lambda spot: (spot['spot_id'] == top_spot_id, spot.get('ai_score', 0))
+        )
     
     def _format_spots_for_ai(self, spots: List[Dict[str, Any]]) -> str:
         """Format spots data for Gemini prompt"""
@@ -227,30 +509,24 @@ class SpotFinderAgent:
         
         return '\n'.join(formatted)
     
-    def _fallback_ranking(self, spots: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _fallback_ranking(
+        self,
+        spots: List[Dict[str, Any]],
+        request_data: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """Fallback ranking algorithm when Gemini is unavailable"""
         
         logger.info("⚙️  Using fallback ranking algorithm")
         
-        for spot in spots:
-            # Simple score: prioritize distance and premium type
-            score = 100 - (spot['distance_meters'] / 10)  # Closer = higher score
-            
-            if spot['type'] == 'premium':
-                score += 10
-            
-            if 'covered' in spot['features']:
-                score += 5
-            
-            if 'ev_charging' in spot['features']:
-                score += 5
-            
-            spot['ai_score'] = min(100, max(0, int(score)))
-            spot['ai_reasoning'] = 'Rule-based ranking (Gemini unavailable)'
-        
-        spots.sort(key=lambda x: x['ai_score'], reverse=True)
-        
-        return spots
+        # Simple score: prioritize distance, premium type, covered/EV features
+        return [
+            {
+                **spot,
+                'ai_score': int(spot['geo_score']),
+                'ai_reasoning': 'Rule-based ranking (Gemini unavailable)'
+            }
+            for spot in self.shortlist(spots, request_data or {}, RECOMMENDATION_SIZE)
+        ]
 
 
 # Singleton instance
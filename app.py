@@ -18,9 +18,10 @@ import sys
 # Fix for Python 3.14 protobuf compatibility
 os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
 
+import json
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -28,15 +29,19 @@ from dotenv import load_dotenv
 from agents import (
     orchestrator_agent,
     spot_finder_agent,
-    pricing_agent,
     route_optimizer_agent,
     payment_verifier_agent,
     security_guard_agent,
     dispute_resolver_agent
 )
+from agents.pricing_agent import pricing_agent
 
 # Import services
-from services import firebase_service, gemini_service, masumi_service
+from services.firebase_service import firebase_service
+from services.gemini_service import gemini_service
+from services.masumi_service import masumi_service
+from services import spot_allocator, spot_index, spot_ranker
+from services.deadline import request_deadline
 from firebase_admin import db
 
 # Load environment variables
@@ -53,6 +58,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Latency budget for a reservation; Gemini calls that don't fit fall back
+# to rule-based results
+RESERVE_DEADLINE_SECONDS = float(os.getenv('RESERVE_DEADLINE_SECONDS', '8'))
+
+# A booked spot's claim lapses if the sensor has not seen the vehicle by then
+SPOT_CLAIM_TTL_SECONDS = float(os.getenv('SPOT_CLAIM_TTL_SECONDS', '900'))
+
+# Bulk quote limits (spots x durations per request)
+BULK_QUOTE_MAX_SPOTS = int(os.getenv('BULK_QUOTE_MAX_SPOTS', '500'))
+BULK_QUOTE_MAX_DURATIONS = int(os.getenv('BULK_QUOTE_MAX_DURATIONS', '12'))
+BULK_QUOTE_MAX_HOURS = float(os.getenv('BULK_QUOTE_MAX_HOURS', '168'))
+
 
 # ============================================================================
 # HEALTH CHECK ENDPOINT
@@ -124,8 +141,9 @@ def reserve_parking():
         
         logger.info(f"📥 Parking reservation request from user: {data.get('user_id')}")
         
-        # Delegate to Orchestrator Agent
-        result = orchestrator_agent.handle_parking_request(data)
+        # Delegate to Orchestrator Agent (bounded by the reservation SLO)
+        with request_deadline(RESERVE_DEADLINE_SECONDS):
+            result = orchestrator_agent.handle_parking_request(data)
         
         if result.get('success'):
             logger.info(f"✅ Reservation created: {result.get('reservation_id')}")
@@ -257,6 +275,114 @@ def calculate_price():
         }), 500
 
 
+@app.route('/api/parking/price/bulk', methods=['POST'])
+def calculate_bulk_prices():
+    """
+    Price many spots for many durations in one call (no AI explanations)
+    
+    Request body:
+    {
+        "spot_ids": ["A-01", "A-02", "B-07"],   // optional, default all spots (first 500)
+        "durations": [1, 2, 4],                 // hours, each in (0, 168]
+        "weather": "rain",                      // optional
+        "special_events": false                 // optional
+    }
+    
+    Response:
+    {
+        "success": true,
+        "spot_ids": ["A-01", "A-02", "B-07"],
+        "durations": [1, 2, 4],
+        "prices": [[0.65, 1.3, 2.4], ...],      // ADA, one row per spot
+        "not_found": [],
+        "truncated": false,                     // true if the default spot list was cut to the limit
+        "total_spots": 3
+    }
+    """
+    
+    try:
+        data = request.get_json() or {}
+        
+        durations = data.get('durations', [1.0])
+        spot_ids = data.get('spot_ids')
+        
+        # bool is an int subclass; true/false are not durations
+        if not isinstance(durations, list) or not durations or not all(
+            isinstance(duration, (int, float)) and not isinstance(duration, bool)
+            and 0 < duration <= BULK_QUOTE_MAX_HOURS
+            for duration in durations
+        ):
+            return jsonify({
+                'success': False,
+                'error': f'durations must be a non-empty list of hours in (0, {BULK_QUOTE_MAX_HOURS:g}]'
+            }), 400
+        
+        if spot_ids is not None and (
+            not isinstance(spot_ids, list) or not all(isinstance(spot_id, str) for spot_id in spot_ids)
+        ):
+            return jsonify({
+                'success': False,
+                'error': 'spot_ids must be a list of spot id strings'
+            }), 400
+        
+        if len(durations) > BULK_QUOTE_MAX_DURATIONS or (spot_ids and len(spot_ids) > BULK_QUOTE_MAX_SPOTS):
+            return jsonify({
+                'success': False,
+                'error': f'At most {BULK_QUOTE_MAX_SPOTS} spots and {BULK_QUOTE_MAX_DURATIONS} durations per request'
+            }), 400
+        
+        # One read for every spot: the spatial index once synced, otherwise
+        # a single Firebase fetch
+        if spot_index.ready:
+            lookup = spot_index.get_record
+        else:
+            all_spots = firebase_service.get_all_parking_spots()
+            lookup = lambda spot_id: {**all_spots[spot_id], 'spot_id': spot_id} if spot_id in all_spots else None
+            if spot_ids is None:
+                spot_ids = list(all_spots)
+        
+        if spot_ids is None:
+            spot_ids = list(spot_index.spot_ids())
+        
+        # Only the default (all spots) list can exceed the limit
+        total_spots = len(spot_ids)
+        truncated = total_spots > BULK_QUOTE_MAX_SPOTS
+        
+        spots = []
+        not_found = []
+        for spot_id in spot_ids[:BULK_QUOTE_MAX_SPOTS]:
+            spot_data = lookup(spot_id)
+            if spot_data:
+                spots.append(spot_data)
+            else:
+                not_found.append(spot_id)
+        
+        matrix = pricing_agent.quote_matrix(
+            spots,
+            durations,
+            {
+                'weather': data.get('weather', 'sunny'),
+                'special_events': data.get('special_events', False)
+            }
+        )
+        
+        return jsonify({
+            'success': True,
+            **matrix,
+            'not_found': not_found,
+            'truncated': truncated,
+            'total_spots': total_spots,
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error calculating bulk prices: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 # ============================================================================
 # PAYMENT ENDPOINTS
 # ============================================================================
@@ -713,6 +839,181 @@ def get_session_transactions(session_id):
         }), 500
 
 
+@app.route('/api/blockchain/tx-status/<ref>', methods=['GET'])
+def get_tracked_transaction_status(ref):
+    """
+    Get confirmation status for a tracked agent payment
+    
+    Accepts either a ticket id (queued payment) or a tx hash.
+    
+    Response:
+    {
+        "ticket_id": "txq_...",
+        "tx_hash": "69e7196...",
+        "status": "queued|pending|confirmed|failed",
+        "confirmation": {...}
+    }
+    """
+    
+    try:
+        from services.cardano_payment_service import cardano_payment_service
+        
+        if cardano_payment_service is None:
+            return jsonify({
+                'success': False,
+                'error': 'Cardano payment service unavailable'
+            }), 503
+        
+        record = cardano_payment_service.get_transaction_status(ref)
+        
+        if not record:
+            return jsonify({
+                'success': False,
+                'error': f'Transaction {ref} is not being tracked'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            **record
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting transaction status: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+# ============================================================================
+# STREAMING ENDPOINTS (Server-Sent Events)
+# ============================================================================
+
+def _sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events) -> Response:
+    """Stream a generator of SSE messages without proxy buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@app.route('/api/parking/price/stream', methods=['POST'])
+def stream_price_explanation():
+    """
+    Price a spot and stream the AI explanation as it is generated
+    
+    Request body:
+    {
+        "spot_id": "A-01",
+        "duration_hours": 2.0
+    }
+    
+    Events:
+        pricing  - full pricing breakdown (sent immediately)
+        token    - {"text": "..."} explanation chunks
+        done     - {"ai_reasoning": "<full explanation>"}
+    """
+    
+    data = request.get_json() or {}
+    spot_id = data.get('spot_id')
+    duration_hours = data.get('duration_hours', 1.0)
+    
+    if not spot_id:
+        return jsonify({'success': False, 'error': 'Missing spot_id'}), 400
+    
+    spot_data = firebase_service.get_spot_by_id(spot_id)
+    
+    if not spot_data:
+        return jsonify({'success': False, 'error': f'Spot {spot_id} not found'}), 404
+    
+    def events():
+        pricing = pricing_agent.calculate_price(
+            spot_data,
+            {'duration_hours': duration_hours},
+            explain=False
+        )
+        yield _sse_event('pricing', {'spot_id': spot_id, 'pricing': pricing})
+        
+        chunks = []
+        for chunk in pricing_agent.stream_pricing_explanation(pricing):
+            chunks.append(chunk)
+            yield _sse_event('token', {'text': chunk})
+        
+        yield _sse_event('done', {'ai_reasoning': ''.join(chunks).strip().strip('"\'')})
+    
+    return _sse_response(events())
+
+
+@app.route('/api/route/directions/stream', methods=['POST'])
+def stream_route_directions():
+    """
+    Stream walking directions to a spot as they are generated
+    
+    Request body:
+    {
+        "spot_id": "A-01",
+        "user_location": {"lat": -1.28, "lng": 36.82}
+    }
+    
+    Events:
+        token - {"text": "..."} direction chunks
+        done  - {"directions": ["Step 1: ...", ...]}
+    """
+    
+    data = request.get_json() or {}
+    spot_id = data.get('spot_id')
+    
+    if not spot_id:
+        return jsonify({'success': False, 'error': 'Missing spot_id'}), 400
+    
+    spot_data = firebase_service.get_spot_by_id(spot_id)
+    
+    if not spot_data:
+        return jsonify({'success': False, 'error': f'Spot {spot_id} not found'}), 404
+    
+    def events():
+        chunks = []
+        for chunk in route_optimizer_agent.stream_directions(data.get('user_location', {}), spot_data):
+            chunks.append(chunk)
+            yield _sse_event('token', {'text': chunk})
+        
+        steps = [line.strip() for line in ''.join(chunks).splitlines() if line.strip()]
+        yield _sse_event('done', {'directions': steps})
+    
+    return _sse_response(events())
+
+
+@app.route('/api/disputes/<dispute_id>/resolve/stream', methods=['POST'])
+def stream_dispute_resolution(dispute_id):
+    """
+    Resolve a dispute while streaming the AI arbitration
+    
+    Events:
+        token  - {"text": "..."} arbitration chunks
+        ruling - same body as POST /api/disputes/<dispute_id>/resolve
+    """
+    
+    logger.info(f"📥 Dispute resolution stream request: {dispute_id}")
+    
+    def events():
+        for kind, payload in dispute_resolver_agent.stream_resolution(dispute_id):
+            if kind == 'token':
+                yield _sse_event('token', {'text': payload})
+            else:
+                yield _sse_event('ruling', payload)
+    
+    return _sse_response(events())
+
+
 # ============================================================================
 # HEALTH & STATUS ENDPOINTS
 # ============================================================================
@@ -741,7 +1042,7 @@ def api_health_check():
         # Check service health
         services_status = {
             'firebase': 'connected',  # Firebase initialized successfully
-            'gemini': 'available',  # Gemini doesn't have a health endpoint
+            'gemini': 'degraded' if gemini_service.is_degraded() else 'available',  # Circuit breaker state
             'masumi': 'checking...'
         }
         
@@ -769,6 +1070,7 @@ def api_health_check():
             'status': 'healthy' if all_healthy else 'degraded',
             'services': services_status,
             'agents': agents_status,
+            'ai': gemini_service.get_health(),
             'timestamp': datetime.utcnow().isoformat()
         }), 200
         
@@ -818,6 +1120,48 @@ def get_stats():
         }), 500
 
 
+@app.route('/api/metrics/llm', methods=['GET'])
+def get_llm_metrics():
+    """
+    Gemini usage per calling method
+    
+    Response:
+    {
+        "success": true,
+        "model": "gemini-1.5-flash",
+        "totals": {"calls": 42, "prompt_tokens": 18000, "fallbacks": 3, ...},
+        "methods": {
+            "spot_ranking": {
+                "calls": 10,
+                "retries": 1,
+                "cache_hits": 25,
+                "fallbacks": 0,
+                "prompt_tokens": 6200,
+                "response_tokens": 1400,
+                "latency": {"p50_ms": 1000.0, "p95_ms": 2500.0, "buckets": {...}},
+                ...
+            },
+            ...
+        },
+        "cache": {...}
+    }
+    """
+    
+    try:
+        return jsonify({
+            'success': True,
+            **gemini_service.get_metrics(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting LLM metrics: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 # ============================================================================
 # WEB INTERFACE ENDPOINTS
 # ============================================================================
@@ -1181,6 +1525,9 @@ def book_parking_from_balance():
         # Distribute payment to agents + owner
         distribute_payment_to_agents(total_cost, session_id)
         
+        # Booking outcome for the learned spot ranker
+        spot_ranker.log_booking(user_id, spot_id)
+        
         # Record transaction
         tx_ref = db.reference('transactions').push()
         tx_ref.set({
@@ -1283,7 +1630,8 @@ def end_parking_session():
         spot_ref.update({
             'occupied': False,
             'current_user': None,
-            'current_session': None
+            'current_session': None,
+            'claim_expires_at': None
         })
         
         # Record transaction
@@ -1648,6 +1996,66 @@ def get_wallet_balance(address):
         logger.error(f"Error fetching wallet balance: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/wallet/balances', methods=['POST'])
+def get_wallet_balances():
+    """
+    Get balances of several wallets concurrently
+    
+    Request body:
+    {
+        "addresses": ["addr_test1...", "addr_test1..."]
+    }
+    
+    Response:
+    {
+        "balances": {"addr_test1...": {"balance_lovelace": 1500000, "balance_ada": 1.5}}
+    }
+    """
+    try:
+        from services.cardano_payment_service import cardano_payment_service
+        
+        if cardano_payment_service is None:
+            return jsonify({'success': False, 'error': 'Cardano payment service unavailable'}), 503
+        
+        addresses = (request.json or {}).get('addresses') or []
+        if not isinstance(addresses, list) or not addresses:
+            return jsonify({'success': False, 'error': 'addresses must be a non-empty list'}), 400
+        
+        balances = cardano_payment_service.get_wallet_balances(addresses)
+        
+        return jsonify({
+            'success': True,
+            'balances': {
+                address: {
+                    'balance_lovelace': lovelace,
+                    'balance_ada': lovelace / 1_000_000 if lovelace is not None else None
+                }
+                for address, lovelace in balances.items()
+            },
+            'network': cardano_payment_service.network_name
+        }), 200
+    except Exception as e:
+        logger.error(f"Error fetching wallet balances: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/wallet/agents/balances', methods=['GET'])
+def get_agent_wallet_balances():
+    """Balances of all seven agent wallets and the customer wallet"""
+    try:
+        from services.cardano_payment_service import cardano_payment_service
+        
+        if cardano_payment_service is None:
+            return jsonify({'success': False, 'error': 'Cardano payment service unavailable'}), 503
+        
+        return jsonify({
+            'success': True,
+            'wallets': cardano_payment_service.get_agent_wallet_balances(),
+            'network': cardano_payment_service.network_name
+        }), 200
+    except Exception as e:
+        logger.error(f"Error fetching agent wallet balances: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/wallet/transactions/<address>', methods=['GET'])
 def get_wallet_transactions(address):
     """Get wallet transaction history using Blockfrost (optimized - minimal API calls)"""
@@ -1770,19 +2178,24 @@ def book_slot_orchestration():
         logger.info("🔍 STEP 1: Executing Spot Finder Agent (0.3 ADA)...")
         
         spot_finder_request = {
+            'user_id': user_id,
             'user_location': user_location,
             'vehicle_type': data.get('vehicle_type', 'sedan'),
             'desired_features': data.get('desired_features', []),
             'duration_hours': duration_hours
         }
         
+        # Hold the chosen spot so concurrent bookings are given other spots
+        import uuid
+        holder = f"{user_id}:{uuid.uuid4().hex[:8]}"
+        
         try:
-            spot_result = spot_finder_agent.find_best_spot(spot_finder_request)
+            spot_result = spot_finder_agent.allocate_spot(spot_finder_request, holder)
             
             if not spot_result or not spot_result.get('recommended_spot'):
                 return jsonify({
                     'success': False,
-                    'error': 'Spot Finder Agent could not find available spot',
+                    'error': spot_result.get('error') or 'Spot Finder Agent could not find available spot',
                     'step': 'spot_finder'
                 }), 404
             
@@ -1868,6 +2281,7 @@ def book_slot_orchestration():
             # ==================================================================
             if not (vehicle_detected and correct_vehicle):
                 logger.warning(f"⛔ GATE CHECK FAILED: Cannot proceed to payment. vehicle_detected={vehicle_detected}, correct_vehicle={correct_vehicle}")
+                spot_allocator.release(spot_id, holder)
                 
                 # Return partial refund? No - user pays for agents that executed
                 return jsonify({
@@ -1884,6 +2298,7 @@ def book_slot_orchestration():
             
         except Exception as e:
             logger.error(f"❌ Vehicle Detector Agent failed: {e}")
+            spot_allocator.release(spot_id, holder)
             return jsonify({
                 'success': False,
                 'error': f'Vehicle Detector error: {str(e)}',
@@ -1896,13 +2311,32 @@ def book_slot_orchestration():
         # ==================================================================
         logger.info("💳 STEP 3: Executing Real-time Payment Agent (0.4 ADA)...")
         
+        claimed = False
+        
         try:
-            import uuid
             import time
             
             booking_id = f"booking_{uuid.uuid4().hex[:12]}"
             session_id = f"session_{uuid.uuid4().hex[:12]}"
             
+            # Claim the held spot atomically; another process may have won it.
+            # The claim lapses unless the sensor confirms the vehicle in time.
+            claimed = firebase_service.claim_spot(
+                spot_id,
+                {'current_user': user_id, 'current_session': session_id},
+                ttl_seconds=SPOT_CLAIM_TTL_SECONDS
+            )
+            if not claimed:
+                spot_allocator.release(spot_id, holder)
+                return jsonify({
+                    'success': False,
+                    'error': f'Spot {spot_id} was just taken, please retry',
+                    'step': 'payment_agent',
+                    'orchestration_result': orchestration_result
+                }), 409
+            
+            spot_ranker.log_booking(user_id, spot_id)
+            
             # Record transaction (no balance deduction from Cardano - just track for demo)
             # In production, this would trigger actual Cardano tx via Masumi payment distribution
             
@@ -1965,6 +2399,9 @@ def book_slot_orchestration():
             
         except Exception as e:
             logger.error(f"❌ Payment Agent failed: {e}")
+            if claimed:
+                firebase_service.release_claim(spot_id, session_id)
+            spot_allocator.release(spot_id, holder)
             return jsonify({
                 'success': False,
                 'error': f'Payment Agent error: {str(e)}',
@@ -2314,12 +2751,18 @@ def hardware_sensor_update():
         # Update Firebase with sensor data
         try:
             spot_ref = db.reference(f'/parking_spots/{spot_id}')
-            spot_ref.update({
+            sensor_update = {
                 'occupied': bool(occupied),
                 'median_cm': float(distance_cm) if distance_cm is not None and distance_cm > 0 else -1.0,
                 'last_seen': timestamp,
                 'sensor_id': sensor_id or 'unknown'
-            })
+            }
+            if occupied:
+                # Vehicle arrived: a pending booking claim no longer expires
+                sensor_update['claim_expires_at'] = None
+            else:
+                sensor_update.update({'current_user': None, 'current_session': None, 'claim_expires_at': None})
+            spot_ref.update(sensor_update)
             logger.info(f"✅ Firebase updated for {spot_id}")
         except Exception as fb_error:
             logger.error(f"⚠️  Firebase update failed: {fb_error}")
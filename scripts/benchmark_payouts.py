@@ -0,0 +1,90 @@
+"""
+Payout Benchmark
+Runs simulated agent payouts against the offline devnet ledger to compare
+batching and UTxO-selection strategies without touching the network
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the payment service singleton offline when importing the payout split
+os.environ.setdefault('CARDANO_CHAIN_BACKEND', 'devnet')
+
+from services.cardano_payment_service import AGENT_EARNINGS
+from services.chain_context import DevnetChainContext, LedgerError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CUSTOMER = 'addr_devnet_customer'
+
+
+def run_benchmark(strategy: str, batched: bool, sessions: int, funding_utxos: int, block_every: int) -> dict:
+    """Distribute payouts for `sessions` parking sessions and report throughput/fees"""
+    # Blocks are produced by the loop below, not the background ticker
+    ledger = DevnetChainContext(selection_strategy=strategy, block_time_seconds=0)
+    ledger.fund(CUSTOMER, 10_000_000 * 1000000, utxo_count=funding_utxos)
+
+    outputs = [(f"addr_devnet_{agent}", amount) for agent, amount in AGENT_EARNINGS.items()]
+    failed = 0
+    txs = 0
+
+    started = time.perf_counter()
+
+    for session in range(sessions):
+        payouts = [outputs] if batched else [[output] for output in outputs]
+
+        for payout in payouts:
+            try:
+                ledger.send_payment(CUSTOMER, None, payout)
+                txs += 1
+            except LedgerError:
+                failed += 1
+
+        if block_every and (session + 1) % block_every == 0:
+            ledger.advance_slots(20)
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        'strategy': strategy,
+        'batched': batched,
+        'transactions': txs,
+        'failed': failed,
+        'payouts_per_sec': round(sessions * len(outputs) / elapsed),
+        'avg_fee_per_payout': round(ledger.stats['total_fees'] / max(sessions * len(outputs), 1)),
+        'avg_inputs_per_tx': round(ledger.stats['total_inputs'] / max(txs, 1), 2),
+        'customer_utxos_left': len(ledger.utxos(CUSTOMER))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark agent payouts on the devnet ledger')
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--funding-utxos', type=int, default=50)
+    parser.add_argument('--block-every', type=int, default=10, help='Sessions per simulated block')
+    args = parser.parse_args()
+
+    logger.info(f"🧪 Benchmarking {args.sessions} sessions x {len(AGENT_EARNINGS)} agent payouts")
+
+    for strategy in DevnetChainContext.STRATEGIES:
+        for batched in (False, True):
+            result = run_benchmark(strategy, batched, args.sessions, args.funding_utxos, args.block_every)
+            logger.info(
+                f"   {result['strategy']:<15} batched={str(result['batched']):<5} "
+                f"{result['payouts_per_sec']:>8} payouts/s  "
+                f"fee/payout={result['avg_fee_per_payout']:>7}  "
+                f"inputs/tx={result['avg_inputs_per_tx']:<5} "
+                f"failed={result['failed']}  utxos_left={result['customer_utxos_left']}"
+            )
+
+
+if __name__ == '__main__':
+    main()
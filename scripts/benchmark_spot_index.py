@@ -0,0 +1,103 @@
+"""
+Spot Index Benchmark
+Times nearest-available-spot queries from users near and far from the lot,
+and checks every answer against a brute-force scan of all spots. Exits
+non-zero on a wrong answer or a query slower than --max-ms, so it doubles
+as a regression check for the grid search.
+"""
+
+import sys
+import time
+import random
+import argparse
+import logging
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.spatial_index import SpotSpatialIndex
+from services.spot_geometry import SpotGeometryStore, offset_position
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ENTRANCE = (40.7128, -74.0060)
+
+# (label, user location); the last is the frontend's default location
+USERS = [
+    ('entrance', {'lat': ENTRANCE[0], 'lng': ENTRANCE[1]}),
+    ('2 km', dict(zip(('lat', 'lng'), offset_position(*ENTRANCE, north_m=2000, east_m=0)))),
+    ('110 km', dict(zip(('lat', 'lng'), offset_position(*ENTRANCE, north_m=110000, east_m=0)))),
+    ('555 km', dict(zip(('lat', 'lng'), offset_position(*ENTRANCE, north_m=0, east_m=555000)))),
+    ('frontend default', {'lat': 17.42, 'lng': 78.47}),
+]
+
+
+def build_index(spots: int, seed: int) -> SpotSpatialIndex:
+    """Index of `spots` spots: half placed by zone, half scattered within 1 km"""
+    rng = random.Random(seed)
+    store = SpotGeometryStore(entrance=ENTRANCE)
+    index = SpotSpatialIndex(store)
+
+    records = {}
+    for number in range(spots):
+        spot_id = f"S-{number:05d}"
+        record = {
+            'zone': 'ABCDE'[number % 5],
+            'type': 'premium' if number % 7 == 0 else 'regular',
+            'features': (['covered'] if number % 3 == 0 else []) + (['ev_charging'] if number % 500 == 0 else []),
+            'occupied': rng.random() < 0.3
+        }
+        if number % 2:
+            record['lat'], record['lng'] = offset_position(
+                *ENTRANCE, north_m=rng.uniform(-1000, 1000), east_m=rng.uniform(-1000, 1000)
+            )
+        records[spot_id] = record
+
+    index.sync_all(records)
+    return index
+
+
+def check(index: SpotSpatialIndex, user_location: dict, k: int, features: list) -> tuple:
+    """(query ms, answer matches the brute-force scan)"""
+    started = time.perf_counter()
+    result = index.nearest(user_location, k, required_features=features)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    expected = index.store.nearest(user_location, index.spot_ids(), k, features)
+    matches = [spot_id for spot_id, _ in result] == [spot_id for spot_id, _ in expected]
+    return elapsed_ms, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and check nearest-spot queries on the spatial index')
+    parser.add_argument('--spots', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=100.0, help='Fail if a query takes longer')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    index = build_index(args.spots, args.seed)
+    logger.info(f"🧪 {args.spots} spots in {index.get_stats()['cells']} occupied cells")
+
+    failures = 0
+    for label, user_location in USERS:
+        # Fewer than k spots have EV charging, so the search can't stop early
+        for features in ([], ['covered'], ['ev_charging']):
+            elapsed_ms, matches = check(index, user_location, args.k, features)
+            ok = matches and elapsed_ms <= args.max_ms
+            failures += not ok
+            logger.info(
+                f"   {'✅' if ok else '❌'} {label:<17} features={features!s:<17} "
+                f"{elapsed_ms:8.2f} ms  matches_brute_force={matches}"
+            )
+
+    if failures:
+        logger.error(f"❌ {failures} spot index checks failed")
+        sys.exit(1)
+    logger.info("✅ All spot index checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Demand Model Training
+Aggregates historical occupancy from Firebase into the hour-of-week demand
+model and writes its .npz file. Incremental by default (only hours since
+the last run); the API also retrains nightly on its own
+"""
+
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.demand_model import DAYS, demand_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the hour-of-week demand model from booking history')
+    parser.add_argument('--output', default=str(demand_model.path), help='Model .npz to write')
+    parser.add_argument('--full', action='store_true', help='Rebuild from all history instead of the last run')
+    args = parser.parse_args()
+
+    from services.firebase_service import firebase_service
+
+    demand_model.path = Path(args.output)
+    summary = demand_model.retrain_from_firebase(firebase_service, full=args.full)
+
+    if not demand_model.trained:
+        logger.error(f"❌ Not enough history yet ({summary['hours']}h, {summary['intervals']} sessions)")
+        sys.exit(1)
+
+    logger.info(f"✅ Model written to {args.output}")
+    for day_index, day in enumerate(DAYS):
+        row = [demand_model.expected_occupancy(day_index * 24 + hour) for hour in range(24)]
+        logger.info(f"   {day[:3]} " + ' '.join(f"{rate * 100:3.0f}" if rate is not None else '  -' for rate in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Spot Ranker Training
+Fits the learned spot ranker from logged impressions (spots shown to a
+user) and bookings (the spot they took), and writes the model file the
+SpotFinder agent loads at startup
+"""
+
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.spot_ranker import (
+    FEATURE_NAMES,
+    SpotRanker,
+    build_training_set,
+    spot_ranker,
+    train_logistic_regression
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_events(path: Path) -> list:
+    events = []
+    with path.open() as lines:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"⚠️ Skipping malformed event line: {line[:80]}")
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the learned spot ranker from booking outcomes')
+    parser.add_argument('--events', default=str(spot_ranker.events_path), help='Impression/booking JSONL log')
+    parser.add_argument('--output', default=str(spot_ranker.model_path), help='Model JSON to write')
+    parser.add_argument('--window', type=float, default=1800, help='Max seconds from impression to booking')
+    parser.add_argument('--l2', type=float, default=0.01)
+    parser.add_argument('--learning-rate', type=float, default=0.1)
+    parser.add_argument('--epochs', type=int, default=500)
+    parser.add_argument('--min-bookings', type=int, default=50, help='Refuse to train on fewer bookings')
+    args = parser.parse_args()
+
+    events_path = Path(args.events)
+    if not events_path.exists():
+        logger.error(f"❌ No event log at {events_path}")
+        sys.exit(1)
+
+    X, y = build_training_set(load_events(events_path), window_seconds=args.window)
+    bookings = int(y.sum())
+
+    logger.info(f"🧪 {len(y)} candidate rows from {bookings} matched bookings")
+
+    if bookings < args.min_bookings:
+        logger.error(f"❌ Need at least {args.min_bookings} bookings to train (have {bookings})")
+        sys.exit(1)
+
+    weights, bias, loss = train_logistic_regression(X, y, args.l2, args.learning_rate, args.epochs)
+
+    ranker = SpotRanker()
+    ranker.weights = weights
+    ranker.bias = bias
+    ranker.save(Path(args.output), samples=len(y), bookings=bookings, log_loss=round(loss, 4))
+
+    logger.info(f"✅ Model written to {args.output} (log loss {loss:.4f})")
+    for name, weight in zip(FEATURE_NAMES, weights):
+        logger.info(f"   {name:<16} {weight:+.3f}")
+    logger.info(f"   {'bias':<16} {bias:+.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,49 @@
 """Services package initialization"""
 
-from .firebase_service import firebase_service, FirebaseService
-from .gemini_service import gemini_service, GeminiService
-from .masumi_service import masumi_service, MasumiService
-
-__all__ = [
-    'firebase_service',
-    'FirebaseService',
-    'gemini_service',
-    'GeminiService',
-    'masumi_service',
-    'MasumiService',
-]
+import importlib
+
+# Service singletons connect to external systems when their module is
+# imported, so they are loaded on first access. Importing one service
+# (e.g. the offline devnet chain context) doesn't initialise the others.
+#
+# Singletons named like their submodule (firebase_service, gemini_service,
+# masumi_service, blockfrost_service, payment_watcher, demand_model) are
+# imported from the submodule, e.g.
+# `from services.gemini_service import gemini_service`, so
+# `services.<name>` is always the module.
+_EXPORTS = {
+    'FirebaseService': '.firebase_service',
+    'GeminiService': '.gemini_service',
+    'MasumiService': '.masumi_service',
+    'BlockfrostService': '.blockfrost_service',
+    'PaymentWatcher': '.payment_watcher',
+    'demand_forecast_service': '.demand_forecast',
+    'DemandForecastService': '.demand_forecast',
+    'spot_geometry_store': '.spot_geometry',
+    'SpotGeometryStore': '.spot_geometry',
+    'spot_index': '.spatial_index',
+    'SpotSpatialIndex': '.spatial_index',
+    'spot_ranker': '.spot_ranker',
+    'SpotRanker': '.spot_ranker',
+    'spot_allocator': '.spot_allocator',
+    'SpotAllocator': '.spot_allocator',
+    'directions_store': '.directions_store',
+    'DirectionsStore': '.directions_store',
+    'lot_router': '.lot_layout',
+    'LotRouter': '.lot_layout',
+    'rate_card_engine': '.rate_cards',
+    'RateCardEngine': '.rate_cards',
+    'DemandModel': '.demand_model',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,283 @@
+"""
+ParknGo - Blockfrost Service Module
+Shared chain-data access layer: pooled HTTP connections, per-endpoint TTL
+cache and coalescing of identical concurrent lookups
+"""
+
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Cache TTLs (seconds). None = cache forever.
+TTL_FOREVER = None
+BALANCE_TTL = float(os.getenv('BLOCKFROST_BALANCE_TTL', '5'))
+ADDRESS_TXS_TTL = float(os.getenv('BLOCKFROST_ADDRESS_TXS_TTL', '5'))
+TIP_TTL = float(os.getenv('BLOCKFROST_TIP_TTL', '10'))
+
+
+class BlockfrostError(Exception):
+    """Non-404 error returned by the Blockfrost API"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Blockfrost API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class BlockfrostService:
+    """Pooled, cached Blockfrost client shared by payment services and agents"""
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        base_url: Optional[str] = None,
+        pool_size: int = 16,
+        timeout: float = 10.0,
+        max_cache_entries: int = 10000
+    ):
+        self.project_id = project_id or os.getenv('BLOCKFROST_PROJECT_ID')
+        self.base_url = base_url or os.getenv(
+            'BLOCKFROST_URL', 'https://cardano-preprod.blockfrost.io/api/v0'
+        )
+        self.timeout = timeout
+        self.max_cache_entries = max_cache_entries
+        self.pool_size = pool_size
+
+        # One keep-alive session for every caller in the process
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'project_id': self.project_id or ''})
+
+        self._cache: "OrderedDict[Tuple, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'requests': 0}
+
+        logger.info(f"✅ Blockfrost Service initialized ({self.base_url})")
+
+    # ============================================
+    # CORE REQUEST PATH
+    # ============================================
+
+    def get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        ttl: Optional[float] = TTL_FOREVER,
+        cache: bool = True
+    ) -> Optional[Any]:
+        """
+        GET a Blockfrost endpoint through the cache
+
+        Args:
+            path: Endpoint path, e.g. '/txs/<hash>'
+            params: Query parameters
+            ttl: Seconds to keep the response (None = forever)
+            cache: Set False to bypass the cache (still coalesced)
+        Returns:
+            Decoded JSON, or None if Blockfrost returned 404
+        Raises:
+            BlockfrostError: any other non-200 response
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+
+        with self._lock:
+            if cache:
+                found, value = self._lookup(key)
+                if found:
+                    self.stats['hits'] += 1
+                    return value
+
+            # Coalesce identical concurrent lookups onto one HTTP request
+            pending = self._inflight.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = Future()
+                self._inflight[key] = pending
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not is_owner:
+            return pending.result()
+
+        try:
+            value = self._fetch(path, params)
+
+            # 404s are not cached: the tx/address may appear in the next block
+            if cache and value is not None:
+                self._store(key, value, ttl)
+
+            pending.set_result(value)
+            return value
+
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _fetch(self, path: str, params: Optional[Dict[str, Any]]) -> Optional[Any]:
+        self.stats['requests'] += 1
+        response = self.session.get(
+            f"{self.base_url}{path}",
+            params=params,
+            timeout=self.timeout
+        )
+
+        if response.status_code == 200:
+            return response.json()
+
+        if response.status_code == 404:
+            return None
+
+        raise BlockfrostError(response.status_code, response.text[:200])
+
+    def _lookup(self, key: Tuple) -> Tuple[bool, Any]:
+        """Fresh cache entry for key (caller holds the lock)"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._cache[key]
+            return False, None
+
+        self._cache.move_to_end(key)
+        return True, value
+
+    def _store(self, key: Tuple, value: Any, ttl: Optional[float]):
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._cache[key] = (expires_at, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cache_entries:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, path_prefix: str = ''):
+        """Drop cached responses whose path starts with path_prefix"""
+        with self._lock:
+            for key in [k for k in self._cache if k[0].startswith(path_prefix)]:
+                del self._cache[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache hit/miss counters"""
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['coalesced']
+            return {
+                **self.stats,
+                'cached_entries': len(self._cache),
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0
+            }
+
+    # ============================================
+    # ENDPOINT HELPERS
+    # ============================================
+
+    def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Transaction details (None until it is in a block; cached forever once found)"""
+        return self.get(f"/txs/{tx_hash}", ttl=TTL_FOREVER)
+
+    def get_transaction_utxos(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Inputs/outputs of a confirmed transaction (immutable, cached forever)"""
+        return self.get(f"/txs/{tx_hash}/utxos", ttl=TTL_FOREVER)
+
+    def get_latest_block(self) -> Optional[Dict[str, Any]]:
+        """Chain tip (short TTL; used to compute confirmation depth)"""
+        return self.get("/blocks/latest", ttl=TIP_TTL)
+
+    def get_address(self, address: str) -> Optional[Dict[str, Any]]:
+        """Address summary including amounts (short TTL)"""
+        return self.get(f"/addresses/{address}", ttl=BALANCE_TTL)
+
+    def get_balance(self, address: str) -> int:
+        """Lovelace balance of an address (0 for an address with no activity)"""
+        return self._lovelace_from_address(self.get_address(address))
+
+    @staticmethod
+    def _lovelace_from_address(info: Optional[Dict[str, Any]]) -> int:
+        if not info:
+            return 0
+
+        for amount in info.get('amount', []):
+            if amount.get('unit') == 'lovelace':
+                return int(amount.get('quantity', 0))
+
+        return 0
+
+    def get_balances(self, addresses: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Lovelace balances for many addresses in one round trip's worth of latency
+
+        Cached balances are returned directly; the rest are fetched
+        concurrently over a bounded pool (pool_size) and land in the cache.
+
+        Returns:
+            {address: lovelace} with None for addresses that failed to load
+        """
+        balances: Dict[str, Optional[int]] = {}
+        misses = []
+
+        with self._lock:
+            for address in dict.fromkeys(addresses):
+                found, info = self._lookup((f"/addresses/{address}", ()))
+                if found:
+                    self.stats['hits'] += 1
+                    balances[address] = self._lovelace_from_address(info)
+                else:
+                    misses.append(address)
+
+            if misses and self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size,
+                    thread_name_prefix='blockfrost'
+                )
+
+        futures = {address: self._executor.submit(self.get_balance, address) for address in misses}
+
+        for address, future in futures.items():
+            try:
+                balances[address] = future.result()
+            except Exception as e:
+                logger.error(f"❌ Failed to get balance for {address[:20]}...: {e}")
+                balances[address] = None
+
+        return balances
+
+    def get_address_transactions(
+        self,
+        address: str,
+        page: int = 1,
+        count: int = 100,
+        order: str = 'desc'
+    ) -> List[Dict[str, Any]]:
+        """One page of an address's transaction list (short TTL)"""
+        result = self.get(
+            f"/addresses/{address}/transactions",
+            params={'page': page, 'count': count, 'order': order},
+            ttl=ADDRESS_TXS_TTL
+        )
+        return result or []
+
+
+# Singleton instance
+blockfrost_service = BlockfrostService()
@@ -6,20 +6,22 @@ Handles real on-chain transactions for agent payments on Cardano Preprod
 import os
 import logging
 import json
-from typing import Dict, Optional, List
+import requests
+from typing import Dict, Optional, List, Tuple
 from pycardano import (
     PaymentSigningKey,
     PaymentVerificationKey,
     Address,
-    Network,
-    TransactionBuilder,
-    TransactionOutput,
-    Value,
-    BlockFrostChainContext,
-    Transaction,
-    UTxO
+    Network
 )
-from blockfrost import BlockFrostApi, ApiError
+
+from services.blockfrost_service import BlockfrostError
+from services.chain_context import (
+    PayoutChainContext,
+    DevnetChainContext,
+    create_chain_context
+)
+from services.transaction_tracker import TransactionTracker
 
 logger = logging.getLogger(__name__)
 
@@ -50,27 +52,38 @@ AGENT_EARNINGS = {
 class CardanoPaymentService:
     """Service for executing real Cardano blockchain payments"""
     
-    def __init__(self):
+    def __init__(self, chain_context: Optional[PayoutChainContext] = None):
+        """
+        Args:
+            chain_context: Chain backend to pay through. Defaults to the one
+                selected by CARDANO_CHAIN_BACKEND ('blockfrost' or 'devnet').
+        """
         self.network = Network.TESTNET
-        self.blockfrost_project_id = os.getenv('BLOCKFROST_PROJECT_ID')
         
-        # Load customer wallet credentials
-        self._load_customer_wallet()
-        
-        # Initialize BlockFrost API
+        # Initialize chain context (UTxO selection, tx submission, chain reads)
         try:
-            self.blockfrost_api = BlockFrostApi(
-                project_id=self.blockfrost_project_id,
-                base_url='https://cardano-preprod.blockfrost.io/api/v0'
-            )
-            self.chain_context = BlockFrostChainContext(
-                project_id=self.blockfrost_project_id,
-                network=self.network
-            )
-            logger.info("✅ Cardano Payment Service initialized (Preprod)")
+            self.chain_context = chain_context or create_chain_context()
+            self.network_name = self.chain_context.network_name
         except Exception as e:
             logger.error(f"❌ Failed to initialize Cardano Payment Service: {e}")
             raise
+        
+        # Load customer wallet credentials
+        self._load_customer_wallet()
+        
+        # Background submission queue + confirmation watcher
+        self.tx_tracker = TransactionTracker(
+            fetch_confirmation=self._fetch_confirmation,
+            poll_interval=float(os.getenv('TX_CONFIRM_POLL_SECONDS', '5')),
+            batch_size=int(os.getenv('TX_CONFIRM_BATCH_SIZE', '10')),
+            retention_seconds=float(os.getenv('TX_RECORD_RETENTION_SECONDS', '3600'))
+        )
+        
+        logger.info(f"✅ Cardano Payment Service initialized ({self.network_name})")
+    
+    @property
+    def is_devnet(self) -> bool:
+        return isinstance(self.chain_context, DevnetChainContext)
     
     def _load_customer_wallet(self):
         """Load customer wallet signing key from JSON file"""
@@ -78,6 +91,9 @@ class CardanoPaymentService:
             wallet_file = 'CARDANO_WALLETS_PREPROD.json'
             
             if not os.path.exists(wallet_file):
+                if self.is_devnet:
+                    self._create_devnet_customer_wallet()
+                    return
                 logger.error(f"❌ Wallet file not found: {wallet_file}")
                 raise FileNotFoundError(f"Wallet file not found: {wallet_file}")
             
@@ -100,6 +116,41 @@ class CardanoPaymentService:
             logger.error(f"❌ Failed to load customer wallet: {e}")
             raise
     
+    def _create_devnet_customer_wallet(self):
+        """Generate a throwaway customer wallet and fund it on the devnet ledger"""
+        self.payment_skey = PaymentSigningKey.generate()
+        self.payment_vkey = PaymentVerificationKey.from_signing_key(self.payment_skey)
+        self.customer_address = Address(payment_part=self.payment_vkey.hash(), network=self.network)
+        
+        funds_ada = int(os.getenv('DEVNET_CUSTOMER_FUNDS_ADA', '10000'))
+        utxo_count = int(os.getenv('DEVNET_CUSTOMER_UTXOS', '20'))
+        self.chain_context.fund(str(self.customer_address), funds_ada * 1000000, utxo_count)
+        
+        logger.info(f"🧪 Devnet customer wallet funded with {funds_ada} ADA: {self.customer_address}")
+    
+    def _resolve_agent_address(self, agent_name: str) -> Optional[str]:
+        """Map an agent name to its wallet address (None if not configured)"""
+        agent_key = agent_name.lower().replace(' ', '_')
+        recipient_address = AGENT_WALLETS.get(agent_key)
+        
+        if not recipient_address and self.is_devnet:
+            # Devnet addresses are opaque ledger keys
+            return f"addr_devnet_{agent_key}"
+        
+        if not recipient_address:
+            logger.error(f"❌ No wallet address for agent: {agent_name}")
+            return None
+        
+        return recipient_address
+    
+    def _build_and_submit(self, outputs: List[Tuple[str, int]]) -> str:
+        """Build, sign and submit a payment through the chain context; returns the tx hash"""
+        return self.chain_context.send_payment(
+            str(self.customer_address),
+            self.payment_skey,
+            outputs
+        )
+    
     def send_agent_payment(
         self,
         agent_name: str,
@@ -109,6 +160,9 @@ class CardanoPaymentService:
         """
         Send real payment to an agent wallet on Cardano blockchain
         
+        Blocks until the transaction is submitted. Use submit_agent_payment()
+        to queue it in the background instead.
+        
         Args:
             agent_name: Name of the agent (orchestrator, spot_finder, etc.)
             amount_lovelace: Amount in Lovelace (1 ADA = 1,000,000 Lovelace)
@@ -118,48 +172,33 @@ class CardanoPaymentService:
             Dictionary with transaction details including tx_hash
         """
         try:
-            agent_key = agent_name.lower().replace(' ', '_')
-            recipient_address = AGENT_WALLETS.get(agent_key)
-            
-            if not recipient_address:
-                logger.error(f"❌ No wallet address for agent: {agent_name}")
+            recipient = self._resolve_agent_address(agent_name)
+            if recipient is None:
                 return None
             
-            # Convert string address to Address object
-            recipient = Address.from_primitive(recipient_address)
-            
-            # Build transaction
             logger.info(f"💸 Sending {amount_lovelace / 1000000:.2f} ADA to {agent_name}...")
             
-            builder = TransactionBuilder(self.chain_context)
-            builder.add_input_address(self.customer_address)
-            builder.add_output(
-                TransactionOutput(
-                    address=recipient,
-                    amount=Value(coin=amount_lovelace)
-                )
-            )
-            
-            # Sign transaction
-            signed_tx = builder.build_and_sign(
-                signing_keys=[self.payment_skey],
-                change_address=self.customer_address
-            )
-            
-            # Submit transaction
-            tx_hash = self.chain_context.submit_tx(signed_tx.to_cbor())
+            tx_hash = self._build_and_submit([(recipient, amount_lovelace)])
             
             logger.info(f"✅ Payment sent! TX Hash: {tx_hash}")
             
+            # Track finality in the background
+            self.tx_tracker.track(tx_hash, {
+                'agent_name': agent_name,
+                'amount_lovelace': amount_lovelace,
+                'session_id': session_id
+            })
+            
             return {
                 'success': True,
                 'tx_hash': tx_hash,
+                'status': 'pending',
                 'agent_name': agent_name,
                 'amount_lovelace': amount_lovelace,
                 'amount_ada': amount_lovelace / 1000000,
-                'recipient_address': str(recipient),
+                'recipient_address': recipient,
                 'session_id': session_id,
-                'network': 'preprod'
+                'network': self.network_name
             }
             
         except Exception as e:
@@ -170,16 +209,150 @@ class CardanoPaymentService:
                 'agent_name': agent_name
             }
     
-    def distribute_parking_payment(self, session_id: str) -> Dict[str, any]:
+    def submit_agent_payment(
+        self,
+        agent_name: str,
+        amount_lovelace: int,
+        session_id: str
+    ) -> Optional[Dict]:
+        """
+        Queue a payment to an agent wallet for background submission
+        
+        Returns immediately with a ticket; the tx hash and confirmation state
+        are available later via get_transaction_status().
+        
+        Returns:
+            Dictionary with ticket_id and status 'queued'
+        """
+        recipient = self._resolve_agent_address(agent_name)
+        if recipient is None:
+            return None
+        
+        metadata = {
+            'agent_name': agent_name,
+            'amount_lovelace': amount_lovelace,
+            'session_id': session_id,
+            'recipient_address': recipient
+        }
+        
+        record = self.tx_tracker.enqueue(
+            lambda: self._build_and_submit([(recipient, amount_lovelace)]),
+            metadata
+        )
+        
+        logger.info(f"📨 Queued {amount_lovelace / 1000000:.2f} ADA to {agent_name} (ticket {record['ticket_id']})")
+        
+        return {
+            'success': True,
+            'ticket_id': record['ticket_id'],
+            'status': record['status'],
+            'agent_name': agent_name,
+            'amount_lovelace': amount_lovelace,
+            'amount_ada': amount_lovelace / 1000000,
+            'recipient_address': recipient,
+            'session_id': session_id,
+            'network': self.network_name
+        }
+    
+    def send_batch_payment(
+        self,
+        payments: Dict[str, int],
+        session_id: str
+    ) -> Dict:
+        """
+        Pay several agents in a single multi-output transaction
+        
+        One fee and one set of inputs instead of one transaction per agent.
+        
+        Args:
+            payments: {agent_name: amount_lovelace}
+            session_id: Parking session ID for reference
+        
+        Returns:
+            Dictionary with the shared tx_hash and per-agent outputs
+        """
+        outputs = []
+        paid_agents = []
+        
+        for agent_name, amount_lovelace in payments.items():
+            recipient = self._resolve_agent_address(agent_name)
+            if recipient is None:
+                continue
+            outputs.append((recipient, amount_lovelace))
+            paid_agents.append(agent_name)
+        
+        if not outputs:
+            return {'success': False, 'error': 'No agent wallets configured'}
+        
+        try:
+            total_lovelace = sum(amount for _, amount in outputs)
+            logger.info(f"💸 Sending {total_lovelace / 1000000:.2f} ADA to {len(outputs)} agents in one transaction...")
+            
+            tx_hash = self._build_and_submit(outputs)
+            
+            self.tx_tracker.track(tx_hash, {
+                'agents': paid_agents,
+                'amount_lovelace': total_lovelace,
+                'session_id': session_id
+            })
+            
+            logger.info(f"✅ Batch payment sent! TX Hash: {tx_hash}")
+            
+            return {
+                'success': True,
+                'tx_hash': tx_hash,
+                'status': 'pending',
+                'outputs': [
+                    {
+                        'agent_name': agent_name,
+                        'amount_lovelace': amount,
+                        'amount_ada': amount / 1000000,
+                        'recipient_address': recipient
+                    }
+                    for agent_name, (recipient, amount) in zip(paid_agents, outputs)
+                ],
+                'total_lovelace': total_lovelace,
+                'session_id': session_id,
+                'network': self.network_name
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Batch payment failed: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'agents': paid_agents
+            }
+    
+    def distribute_parking_payment(
+        self,
+        session_id: str,
+        background: bool = False,
+        batched: bool = False
+    ) -> Dict[str, any]:
         """
         Distribute parking payment to all agents with real blockchain transactions
         
         Args:
             session_id: Parking session ID
+            background: Queue payments instead of waiting for each submission
+            batched: Pay all agents in one multi-output transaction
         
         Returns:
             Dictionary with all transaction hashes and results
         """
+        if batched:
+            batch_result = self.send_batch_payment(AGENT_EARNINGS, session_id)
+            sent = batch_result.get('total_lovelace', 0) if batch_result.get('success') else 0
+            outputs = batch_result.get('outputs', [])
+            return {
+                'session_id': session_id,
+                'transactions': [batch_result],
+                'total_sent_lovelace': sent,
+                'successful_payments': len(outputs),
+                'failed_payments': len(AGENT_EARNINGS) - len(outputs)
+            }
+        
         results = {
             'session_id': session_id,
             'transactions': [],
@@ -190,8 +363,10 @@ class CardanoPaymentService:
         
         logger.info(f"🚀 Starting payment distribution for session: {session_id}")
         
+        send = self.submit_agent_payment if background else self.send_agent_payment
+        
         for agent_name, amount_lovelace in AGENT_EARNINGS.items():
-            payment_result = self.send_agent_payment(
+            payment_result = send(
                 agent_name=agent_name,
                 amount_lovelace=amount_lovelace,
                 session_id=session_id
@@ -207,6 +382,10 @@ class CardanoPaymentService:
                     results['failed_payments'] += 1
         
         total_ada = results['total_sent_lovelace'] / 1000000
+        if background:
+            logger.info(f"📨 Payment distribution queued: {total_ada:.2f} ADA in {results['successful_payments']} transactions")
+            return results
+        
         logger.info(f"✅ Payment distribution complete: {total_ada:.2f} ADA sent in {results['successful_payments']} transactions")
         
         return results
@@ -222,24 +401,58 @@ class CardanoPaymentService:
             Transaction details from blockchain
         """
         try:
-            tx_info = self.blockfrost_api.transaction(tx_hash)
+            tx_info = self.chain_context.get_transaction(tx_hash)
             
-            return {
-                'tx_hash': tx_hash,
-                'block': tx_info.block,
-                'block_height': tx_info.block_height,
-                'slot': tx_info.slot,
-                'index': tx_info.index,
-                'fees': tx_info.fees,
-                'size': tx_info.size,
-                'valid': tx_info.valid_contract,
-                'explorer_url': f'https://preprod.cardanoscan.io/transaction/{tx_hash}'
-            }
+            if tx_info is None:
+                logger.warning(f"⚠️ Transaction {tx_hash} not found on-chain (yet)")
+                return None
+            
+            return self._tx_info_to_dict(tx_hash, tx_info)
             
-        except ApiError as e:
+        except (BlockfrostError, requests.RequestException) as e:
             logger.error(f"❌ Failed to verify transaction {tx_hash}: {e}")
             return None
     
+    def _fetch_confirmation(self, tx_hash: str) -> Optional[Dict]:
+        """
+        Confirmation lookup for the transaction tracker
+        
+        Returns None while the transaction is not yet in a block (404);
+        other API errors propagate so the tracker backs off and retries.
+        """
+        tx_info = self.chain_context.get_transaction(tx_hash)
+        
+        if tx_info is None:
+            return None
+        
+        return self._tx_info_to_dict(tx_hash, tx_info)
+    
+    def _tx_info_to_dict(self, tx_hash: str, tx_info: Dict) -> Dict:
+        """Convert a Blockfrost-shaped /txs response to our response format"""
+        return {
+            'tx_hash': tx_hash,
+            'block': tx_info.get('block'),
+            'block_height': tx_info.get('block_height'),
+            'slot': tx_info.get('slot'),
+            'index': tx_info.get('index'),
+            'fees': tx_info.get('fees'),
+            'size': tx_info.get('size'),
+            'valid': tx_info.get('valid_contract'),
+            'explorer_url': (
+                f'https://preprod.cardanoscan.io/transaction/{tx_hash}'
+                if self.network_name == 'preprod' else None
+            )
+        }
+    
+    def get_transaction_status(self, ref: str) -> Optional[Dict]:
+        """
+        Get tracked status (queued/pending/confirmed/failed) for a transaction
+        
+        Args:
+            ref: Ticket id from submit_agent_payment() or a tx hash
+        """
+        return self.tx_tracker.get_status(ref)
+    
     def get_wallet_balance(self, address: str) -> Optional[int]:
         """
         Get balance of a wallet address in Lovelace
@@ -251,21 +464,49 @@ class CardanoPaymentService:
             Balance in Lovelace
         """
         try:
-            address_info = self.blockfrost_api.address(address)
-            
-            # Sum all amounts (ADA is the first element)
-            total_lovelace = 0
-            for amount in address_info.amount:
-                if amount.unit == 'lovelace':
-                    total_lovelace = int(amount.quantity)
-                    break
+            # Blockfrost balances are served from a short-TTL cache
+            return self.chain_context.get_balance(address)
             
-            return total_lovelace
-            
-        except ApiError as e:
+        except (BlockfrostError, requests.RequestException) as e:
             logger.error(f"❌ Failed to get balance for {address}: {e}")
             return None
     
+    def get_wallet_balances(self, addresses: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Get balances of several wallet addresses concurrently
+        
+        Args:
+            addresses: Cardano addresses
+        
+        Returns:
+            {address: balance in Lovelace}, None where the lookup failed
+        """
+        try:
+            return self.chain_context.get_balances(addresses)
+        except Exception as e:
+            logger.error(f"❌ Failed to get wallet balances: {e}")
+            return {address: None for address in addresses}
+    
+    def get_agent_wallet_balances(self) -> Dict[str, Dict]:
+        """Balances of all agent wallets plus the customer wallet, in one fan-out"""
+        wallets = {
+            agent_name: self._resolve_agent_address(agent_name)
+            for agent_name in AGENT_WALLETS
+        }
+        wallets['customer'] = str(self.customer_address)
+        wallets = {name: address for name, address in wallets.items() if address}
+        
+        balances = self.get_wallet_balances(list(wallets.values()))
+        
+        return {
+            name: {
+                'address': address,
+                'balance_lovelace': balances.get(address),
+                'balance_ada': balances[address] / 1000000 if balances.get(address) is not None else None
+            }
+            for name, address in wallets.items()
+        }
+    
     def get_customer_balance(self) -> float:
         """Get customer wallet balance in ADA"""
         balance_lovelace = self.get_wallet_balance(str(self.customer_address))
@@ -0,0 +1,429 @@
+"""
+ParknGo - Chain Context Module
+Pluggable payout chain contexts: Blockfrost (Cardano Preprod) and an offline
+in-memory devnet ledger for exercising and benchmarking payout logic
+"""
+
+import os
+import hashlib
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (recipient address, amount in lovelace)
+PaymentOutput = Tuple[str, int]
+
+
+class LedgerError(Exception):
+    """Transaction rejected by the ledger (fees, min-UTxO, balance, inputs)"""
+
+
+class PayoutChainContext:
+    """
+    Interface used by CardanoPaymentService for everything chain-related
+
+    Implementations must be safe to call from the transaction tracker's
+    background threads.
+    """
+
+    network_name = 'unknown'
+
+    def send_payment(
+        self,
+        sender_address: str,
+        signing_key: Any,
+        outputs: List[PaymentOutput]
+    ) -> str:
+        """Build, sign and submit a payment with one or more outputs; returns tx hash"""
+        raise NotImplementedError
+
+    def get_balance(self, address: str) -> int:
+        """Lovelace balance of an address"""
+        raise NotImplementedError
+
+    def get_balances(self, addresses: List[str]) -> Dict[str, Optional[int]]:
+        """Lovelace balances for several addresses (None where a lookup failed)"""
+        return {address: self.get_balance(address) for address in addresses}
+
+    def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """Blockfrost-shaped /txs details, or None while not in a block"""
+        raise NotImplementedError
+
+
+# ============================================
+# BLOCKFROST (CARDANO PREPROD)
+# ============================================
+
+class BlockfrostPayoutContext(PayoutChainContext):
+    """Real network context: pycardano TransactionBuilder + Blockfrost"""
+
+    network_name = 'preprod'
+
+    def __init__(self, project_id: Optional[str] = None):
+        from pycardano import BlockFrostChainContext, Network
+        from services.blockfrost_service import blockfrost_service
+
+        self.chain_data = blockfrost_service
+        self.context = BlockFrostChainContext(
+            project_id=project_id or os.getenv('BLOCKFROST_PROJECT_ID'),
+            network=Network.TESTNET
+        )
+
+    def send_payment(self, sender_address, signing_key, outputs):
+        from pycardano import Address, TransactionBuilder, TransactionOutput, Value
+
+        sender = Address.from_primitive(sender_address)
+
+        builder = TransactionBuilder(self.context)
+        builder.add_input_address(sender)
+        for recipient, amount_lovelace in outputs:
+            builder.add_output(
+                TransactionOutput(
+                    address=Address.from_primitive(recipient),
+                    amount=Value(coin=amount_lovelace)
+                )
+            )
+
+        signed_tx = builder.build_and_sign(
+            signing_keys=[signing_key],
+            change_address=sender
+        )
+
+        return str(self.context.submit_tx(signed_tx.to_cbor()))
+
+    def get_balance(self, address):
+        return self.chain_data.get_balance(address)
+
+    def get_balances(self, addresses):
+        return self.chain_data.get_balances(addresses)
+
+    def get_transaction(self, tx_hash):
+        return self.chain_data.get_transaction(tx_hash)
+
+
+# ============================================
+# OFFLINE DEVNET
+# ============================================
+
+class DevnetChainContext(PayoutChainContext):
+    """
+    In-memory Cardano-like ledger
+
+    Tracks a UTxO set, selects inputs with a configurable strategy, enforces
+    the linear fee rule (min_fee_a * size + min_fee_b) and the min-UTxO rule,
+    and advances slots to move mempool transactions into blocks. Signatures
+    are not checked. Sizes are estimated from input/output counts, which is
+    close enough to compare batching and coin-selection strategies.
+
+    With a block time, a background ticker produces a block every
+    block_time_seconds once the first transaction is submitted (one slot
+    per second), so submitted payouts confirm without anyone calling
+    advance_slots(). Benchmarks pass 0 and advance slots themselves.
+    """
+
+    network_name = 'devnet'
+
+    # Coin-selection strategies
+    LARGEST_FIRST = 'largest_first'
+    SMALLEST_FIRST = 'smallest_first'
+    RANDOM_ORDER = 'random_order'   # Accumulate inputs in shuffled order
+    STRATEGIES = (LARGEST_FIRST, SMALLEST_FIRST, RANDOM_ORDER)
+
+    # Approximate CBOR sizes in bytes
+    TX_BASE_SIZE = 160
+    INPUT_SIZE = 40
+    OUTPUT_SIZE = 65
+    WITNESS_SIZE = 100
+
+    def __init__(
+        self,
+        selection_strategy: str = LARGEST_FIRST,
+        min_fee_a: int = 44,
+        min_fee_b: int = 155381,
+        min_utxo_lovelace: int = 1000000,
+        max_tx_size: int = 16384,
+        seed: int = 0,
+        block_time_seconds: float = 0.0
+    ):
+        if selection_strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown coin selection strategy: {selection_strategy}")
+
+        self.selection_strategy = selection_strategy
+        self.min_fee_a = min_fee_a
+        self.min_fee_b = min_fee_b
+        self.min_utxo_lovelace = min_utxo_lovelace
+        self.max_tx_size = max_tx_size
+        self.block_time_seconds = block_time_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+
+        self.slot = 0
+        self.block_height = 0
+
+        # (tx_hash, index) -> (address, lovelace)
+        self._utxos: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        # address -> {utxo ref, ...}
+        self._by_address: Dict[str, set] = {}
+        self._balances: Dict[str, int] = {}
+
+        self._mempool: List[str] = []
+        self._transactions: Dict[str, Dict[str, Any]] = {}
+        self._tx_counter = 0
+        self._ticker: Optional[threading.Thread] = None
+
+        self.stats = {'submitted': 0, 'rejected': 0, 'total_fees': 0, 'total_inputs': 0}
+
+    # ---------- ledger state ----------
+
+    def fund(self, address: str, lovelace: int, utxo_count: int = 1) -> List[Tuple[str, int]]:
+        """Create genesis UTxOs for an address (split evenly across utxo_count)"""
+        with self._lock:
+            tx_hash = self._next_hash()
+            share, remainder = divmod(lovelace, utxo_count)
+            refs = []
+            for index in range(utxo_count):
+                amount = share + (remainder if index == 0 else 0)
+                self._add_utxo((tx_hash, index), address, amount)
+                refs.append((tx_hash, index))
+            return refs
+
+    def utxos(self, address: str) -> List[Tuple[Tuple[str, int], int]]:
+        """UTxOs at an address as (ref, lovelace)"""
+        with self._lock:
+            return [(ref, self._utxos[ref][1]) for ref in self._by_address.get(address, ())]
+
+    def get_balance(self, address):
+        return self._balances.get(address, 0)
+
+    def get_transaction(self, tx_hash):
+        tx = self._transactions.get(tx_hash)
+        if tx is None or tx['block_height'] is None:
+            return None
+        return {
+            'hash': tx_hash,
+            'block': f"devnet_block_{tx['block_height']}",
+            'block_height': tx['block_height'],
+            'slot': tx['slot'],
+            'index': tx['index'],
+            'fees': str(tx['fee']),
+            'size': tx['size'],
+            'valid_contract': True,
+            'output_amount': [{'unit': 'lovelace', 'quantity': str(sum(a for _, a in tx['outputs']))}]
+        }
+
+    def advance_slots(self, count: int = 1) -> int:
+        """Advance the slot counter; mempool transactions land in the next block"""
+        with self._lock:
+            self.slot += count
+
+            if self._mempool:
+                self.block_height += 1
+                for index, tx_hash in enumerate(self._mempool):
+                    tx = self._transactions[tx_hash]
+                    tx['block_height'] = self.block_height
+                    tx['slot'] = self.slot
+                    tx['index'] = index
+                self._mempool = []
+
+            return self.slot
+
+    def _ensure_ticker(self):
+        """Start block production (caller holds the lock)"""
+        if self.block_time_seconds <= 0 or self._ticker is not None:
+            return
+        self._ticker = threading.Thread(target=self._produce_blocks, name='devnet-blocks', daemon=True)
+        self._ticker.start()
+        logger.info(f"🧪 Devnet producing a block every {self.block_time_seconds}s")
+
+    def _produce_blocks(self):
+        slots_per_block = max(1, round(self.block_time_seconds))
+        while True:
+            time.sleep(self.block_time_seconds)
+            self.advance_slots(slots_per_block)
+
+    # ---------- transactions ----------
+
+    def min_fee(self, size: int) -> int:
+        return self.min_fee_a * size + self.min_fee_b
+
+    def estimate_size(self, input_count: int, output_count: int) -> int:
+        return (
+            self.TX_BASE_SIZE
+            + self.INPUT_SIZE * input_count
+            + self.OUTPUT_SIZE * output_count
+            + self.WITNESS_SIZE
+        )
+
+    def build_payment(
+        self,
+        sender_address: str,
+        outputs: List[PaymentOutput],
+        strategy: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Select inputs and compute fee/change for a payment (does not submit)
+
+        Returns:
+            Unsigned transaction dict: inputs, outputs, fee, size
+        """
+        strategy = strategy or self.selection_strategy
+        target = sum(amount for _, amount in outputs)
+
+        for recipient, amount in outputs:
+            if amount < self.min_utxo_lovelace:
+                raise LedgerError(
+                    f"Output to {recipient[:20]} below min UTxO "
+                    f"({amount} < {self.min_utxo_lovelace} lovelace)"
+                )
+
+        candidates = self.utxos(sender_address)
+        if strategy == self.LARGEST_FIRST:
+            candidates.sort(key=lambda u: u[1], reverse=True)
+        elif strategy == self.SMALLEST_FIRST:
+            candidates.sort(key=lambda u: u[1])
+        else:
+            self._rng.shuffle(candidates)
+
+        selected: List[Tuple[str, int]] = []
+        selected_total = 0
+
+        for ref, amount in candidates:
+            selected.append(ref)
+            selected_total += amount
+
+            # Fee assuming a change output is needed
+            size = self.estimate_size(len(selected), len(outputs) + 1)
+            fee = self.min_fee(size)
+            if selected_total >= target + fee:
+                change = selected_total - target - fee
+                tx_outputs = list(outputs)
+
+                if change >= self.min_utxo_lovelace:
+                    tx_outputs.append((sender_address, change))
+                else:
+                    # Change too small for its own UTxO: it goes to the fee
+                    size = self.estimate_size(len(selected), len(outputs))
+                    fee = selected_total - target
+
+                return {
+                    'inputs': selected,
+                    'outputs': tx_outputs,
+                    'fee': fee,
+                    'size': size
+                }
+
+        raise LedgerError(
+            f"Insufficient funds at {sender_address[:20]}: "
+            f"have {selected_total}, need {target} + fee"
+        )
+
+    def submit(self, tx: Dict[str, Any]) -> str:
+        """Validate and apply a transaction to the mempool ledger state"""
+        with self._lock:
+            try:
+                self._validate(tx)
+            except LedgerError:
+                self.stats['rejected'] += 1
+                raise
+
+            tx_hash = self._next_hash()
+
+            for ref in tx['inputs']:
+                self._spend_utxo(ref)
+            for index, (address, amount) in enumerate(tx['outputs']):
+                self._add_utxo((tx_hash, index), address, amount)
+
+            self._transactions[tx_hash] = {
+                'outputs': tx['outputs'],
+                'fee': tx['fee'],
+                'size': tx['size'],
+                'submitted_slot': self.slot,
+                'block_height': None,
+                'slot': None,
+                'index': None
+            }
+            self._mempool.append(tx_hash)
+            self._ensure_ticker()
+
+            self.stats['submitted'] += 1
+            self.stats['total_fees'] += tx['fee']
+            self.stats['total_inputs'] += len(tx['inputs'])
+
+            return tx_hash
+
+    def send_payment(self, sender_address, signing_key, outputs):
+        # Build and submit atomically so concurrent payouts never pick the same inputs
+        with self._lock:
+            return self.submit(self.build_payment(sender_address, outputs))
+
+    def _validate(self, tx: Dict[str, Any]):
+        if tx['size'] > self.max_tx_size:
+            raise LedgerError(f"Transaction too large ({tx['size']} > {self.max_tx_size} bytes)")
+
+        if tx['fee'] < self.min_fee(tx['size']):
+            raise LedgerError(f"Fee {tx['fee']} below minimum {self.min_fee(tx['size'])}")
+
+        if len(set(tx['inputs'])) != len(tx['inputs']):
+            raise LedgerError("Duplicate transaction input")
+
+        consumed = 0
+        for ref in tx['inputs']:
+            utxo = self._utxos.get(ref)
+            if utxo is None:
+                raise LedgerError(f"Input {ref[0][:16]}#{ref[1]} is spent or unknown")
+            consumed += utxo[1]
+
+        produced = 0
+        for address, amount in tx['outputs']:
+            if amount < self.min_utxo_lovelace:
+                raise LedgerError(f"Output below min UTxO ({amount} lovelace)")
+            produced += amount
+
+        if consumed != produced + tx['fee']:
+            raise LedgerError(
+                f"Transaction not balanced: inputs {consumed} != outputs {produced} + fee {tx['fee']}"
+            )
+
+    def _next_hash(self) -> str:
+        self._tx_counter += 1
+        return hashlib.blake2b(
+            self._tx_counter.to_bytes(8, 'big'),
+            digest_size=32
+        ).hexdigest()
+
+    def _add_utxo(self, ref: Tuple[str, int], address: str, amount: int):
+        self._utxos[ref] = (address, amount)
+        self._by_address.setdefault(address, set()).add(ref)
+        self._balances[address] = self._balances.get(address, 0) + amount
+
+    def _spend_utxo(self, ref: Tuple[str, int]):
+        address, amount = self._utxos.pop(ref)
+        self._by_address[address].discard(ref)
+        self._balances[address] -= amount
+
+
+def create_chain_context(backend: Optional[str] = None) -> PayoutChainContext:
+    """
+    Build the chain context selected by CARDANO_CHAIN_BACKEND
+
+    Args:
+        backend: 'blockfrost' (default) or 'devnet'
+    """
+    backend = (backend or os.getenv('CARDANO_CHAIN_BACKEND', 'blockfrost')).lower()
+
+    if backend == 'devnet':
+        strategy = os.getenv('DEVNET_COIN_SELECTION', DevnetChainContext.LARGEST_FIRST)
+        logger.info(f"🧪 Using offline devnet chain context ({strategy})")
+        return DevnetChainContext(
+            selection_strategy=strategy,
+            block_time_seconds=float(os.getenv('DEVNET_BLOCK_SECONDS', '1'))
+        )
+
+    if backend == 'blockfrost':
+        return BlockfrostPayoutContext()
+
+    raise ValueError(f"Unknown CARDANO_CHAIN_BACKEND: {backend}")
@@ -0,0 +1,142 @@
+"""
+ParknGo - Circuit Breaker Module
+Fail-fast guard for external dependencies: after repeated failures calls
+are rejected immediately, then a limited number of half-open probes decide
+whether the dependency has recovered
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Breaker states
+CLOSED = 'closed'         # Normal operation
+OPEN = 'open'             # Failing fast until recovery_timeout elapses
+HALF_OPEN = 'half_open'   # Letting probe calls through to test recovery
+
+
+class CircuitOpenError(Exception):
+    """Call rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Thread-safe consecutive-failure circuit breaker with half-open probing"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        """
+        Args:
+            name: Dependency name used in logs
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to stay open before probing
+            half_open_max_calls: Concurrent probes allowed while half-open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'abandoned': 0, 'times_opened': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        """State with the open -> half-open timeout applied (caller holds the lock)"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"🔄 Circuit '{self.name}' half-open: probing")
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Whether a call may proceed; every allowed call must be followed by
+        record_success(), record_failure() or record_abandoned()
+        """
+        with self._lock:
+            state = self._current_state()
+
+            if state == CLOSED:
+                return True
+
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.stats['successes'] += 1
+            self._consecutive_failures = 0
+
+            if self._state != CLOSED:
+                logger.info(f"✅ Circuit '{self.name}' closed: dependency recovered")
+            self._state = CLOSED
+            self._probes_in_flight = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+
+            if state == HALF_OPEN or (state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+                self.stats['times_opened'] += 1
+                logger.warning(
+                    f"⚠️ Circuit '{self.name}' open after {self._consecutive_failures} failures "
+                    f"(retry in {self.recovery_timeout}s)"
+                )
+
+    def record_abandoned(self):
+        """
+        A call ended for reasons that say nothing about the dependency (e.g.
+        the caller's own deadline ran out): free its probe slot, count nothing
+        """
+        with self._lock:
+            self.stats['abandoned'] += 1
+            if self._state == HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def reset(self):
+        """Force the circuit closed"""
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probes_in_flight = 0
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == OPEN:
+                retry_in = round(max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0.0), 1)
+
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'retry_in_seconds': retry_in,
+                **self.stats
+            }
@@ -0,0 +1,58 @@
+"""
+ParknGo - Request Deadline Module
+Per-request time budget carried in a context variable, so every Gemini call
+made on behalf of a request can tell how much time is left and skip to the
+rule-based fallbacks instead of blowing the latency SLO
+"""
+
+import contextvars
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Absolute time.monotonic() deadline of the current request (None = unbounded)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Not enough request budget left for the operation"""
+
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[None]:
+    """
+    Bound everything run inside the block (and work it hands to executors
+    via submit_with_deadline) to `seconds` from now. Nested deadlines can
+    only tighten the budget.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget (None = no deadline)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def ensure_budget(needed: float, operation: str = 'operation'):
+    """Raise DeadlineExceeded if less than `needed` seconds remain"""
+    left = remaining()
+    if left is not None and left < needed:
+        raise DeadlineExceeded(f"{operation} skipped: {left:.2f}s left, needs {needed:.2f}s")
+
+
+def submit_with_deadline(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    """executor.submit() that carries the caller's deadline into the worker"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,295 @@
+"""
+ParknGo - Demand Forecast Service Module
+Quantised demand forecasts: one cached Gemini forecast per context bucket
+(hour-of-week, weather class, event flag, occupancy decile), refreshed in
+the background so pricing never waits on the model
+"""
+
+import os
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+WEATHER_CLASSES = {
+    'clear': ('clear', 'sunny', 'fair', 'hot'),
+    'cloudy': ('cloudy', 'overcast', 'fog', 'mist', 'haze', 'windy'),
+    'wet': ('rain', 'drizzle', 'shower', 'storm', 'thunder'),
+    'snow': ('snow', 'sleet', 'hail', 'ice')
+}
+
+# (hour_of_week 0-167, weather class, event nearby, occupancy decile 0-9 or None)
+BucketKey = Tuple[int, str, bool, Optional[int]]
+
+
+def classify_weather(weather: Optional[str]) -> str:
+    """Map free-text weather to one of clear/cloudy/wet/snow"""
+    text = (weather or 'clear').lower()
+    for weather_class, keywords in WEATHER_CLASSES.items():
+        if any(word in text for word in keywords):
+            return weather_class
+    return 'clear'
+
+
+def bucket_for(
+    when: Optional[datetime] = None,
+    weather: Optional[str] = None,
+    has_event: bool = False,
+    occupancy_rate: Optional[float] = None
+) -> BucketKey:
+    """
+    Quantise a pricing context into its forecast bucket
+
+    Args:
+        when: Time of the request (default now)
+        weather: Free-text weather description
+        has_event: Whether a special event is nearby
+        occupancy_rate: Current lot occupancy 0-1 (None = unknown)
+    """
+    when = when or datetime.now()
+    decile = None
+    if occupancy_rate is not None:
+        decile = min(int(max(occupancy_rate, 0.0) * 10), 9)
+
+    return (when.weekday() * 24 + when.hour, classify_weather(weather), bool(has_event), decile)
+
+
+class DemandForecastService:
+    """
+    Serves demand forecasts from a per-bucket table
+
+    get_forecast() only reads the table. Missing or stale buckets are queued
+    for the background refresher, which calls the model off the request path
+    and also pre-warms the next hour for every bucket that is in use.
+    """
+
+    def __init__(
+        self,
+        forecaster: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        stale_after: float = 1800.0,
+        refresh_interval: float = 30.0,
+        idle_after: float = 86400.0
+    ):
+        """
+        Args:
+            forecaster: Context dict -> forecast dict (default Gemini)
+            stale_after: Seconds before a bucket's forecast is recomputed
+            refresh_interval: Seconds between refresher sweeps
+            idle_after: Buckets not requested for this long stop refreshing
+        """
+        self._forecaster = forecaster
+        self.stale_after = stale_after
+        self.refresh_interval = refresh_interval
+        self.idle_after = idle_after
+
+        # bucket -> {'forecast': dict, 'computed_at': float}
+        self._table: Dict[BucketKey, Dict[str, Any]] = {}
+        self._last_requested: Dict[BucketKey, float] = {}
+        self._queued: Dict[BucketKey, None] = {}
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    # ============================================
+    # HOT PATH
+    # ============================================
+
+    def get_forecast(self, bucket: BucketKey) -> Optional[Dict[str, Any]]:
+        """
+        Cached forecast for a bucket, without ever calling the model
+
+        Returns:
+            Forecast dict (stale forecasts included), or None if the bucket
+            has not been computed yet - callers use their rule-based fallback
+        """
+        now = time.time()
+
+        with self._lock:
+            self._last_requested[bucket] = now
+            entry = self._table.get(bucket)
+
+            if entry is None:
+                self.stats['misses'] += 1
+                self._queue(bucket)
+            elif now - entry['computed_at'] > self.stale_after:
+                self.stats['stale_hits'] += 1
+                self._queue(bucket)
+            else:
+                self.stats['hits'] += 1
+
+        self._ensure_refresher()
+
+        if entry is None:
+            return None
+
+        return {**entry['forecast'], 'forecast_bucket': self.describe_bucket(bucket)}
+
+    def peek(self, bucket: BucketKey) -> Optional[Dict[str, Any]]:
+        """
+        Cached forecast for a bucket without marking it in use
+
+        For look-ahead reads (e.g. rate cards for later hours) that should
+        not make the refresher keep every future bucket warm.
+        """
+        with self._lock:
+            entry = self._table.get(bucket)
+
+        if entry is None:
+            return None
+
+        return {**entry['forecast'], 'forecast_bucket': self.describe_bucket(bucket)}
+
+    # ============================================
+    # BACKGROUND REFRESH
+    # ============================================
+
+    def refresh_bucket(self, bucket: BucketKey) -> Optional[Dict[str, Any]]:
+        """Compute one bucket's forecast now (called by the refresher)"""
+        try:
+            forecast = self._get_forecaster()(self._bucket_context(bucket))
+        except Exception as e:
+            self.stats['refresh_errors'] += 1
+            logger.warning(f"⚠️ Demand forecast refresh failed for {self.describe_bucket(bucket)}: {e}")
+            return None
+
+        # The model's own error fallback is not worth caching: retry next sweep
+        if not forecast or forecast.get('fallback') or 'demand_multiplier' not in forecast:
+            self.stats['refresh_errors'] += 1
+            return None
+
+        with self._lock:
+            self._table[bucket] = {'forecast': forecast, 'computed_at': time.time()}
+            self.stats['refreshes'] += 1
+
+        return forecast
+
+    def start(self):
+        """Start the background refresher (idempotent)"""
+        self._ensure_refresher()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _ensure_refresher(self):
+        if not (self._thread and self._thread.is_alive()):
+            with self._lock:
+                if not (self._thread and self._thread.is_alive()):
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._refresh_loop, name='demand-forecast', daemon=True)
+                    self._thread.start()
+                    logger.info("✅ Demand forecast refresher started")
+
+        # Newly missed buckets are computed right away, not at the next sweep
+        if self._queued:
+            self._wake.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.refresh_interval)
+            self._wake.clear()
+
+            try:
+                self._sweep()
+            except Exception as e:
+                logger.error(f"❌ Demand forecast sweep failed: {e}")
+
+    def _sweep(self):
+        """Refresh queued buckets, stale active buckets and next-hour buckets"""
+        now = time.time()
+
+        with self._lock:
+            for bucket, requested_at in list(self._last_requested.items()):
+                if now - requested_at > self.idle_after:
+                    del self._last_requested[bucket]
+                    continue
+
+                entry = self._table.get(bucket)
+                if entry is None or now - entry['computed_at'] > self.stale_after:
+                    self._queue(bucket)
+
+                # Pre-warm the upcoming hour so the hour boundary is a hit
+                hour_of_week, weather_class, has_event, decile = bucket
+                upcoming = ((hour_of_week + 1) % 168, weather_class, has_event, decile)
+                if upcoming not in self._table:
+                    self._queue(upcoming)
+
+            work = list(self._queued)
+            self._queued.clear()
+
+        for bucket in work:
+            if self._stop.is_set():
+                break
+            self.refresh_bucket(bucket)
+
+    def _queue(self, bucket: BucketKey):
+        """Mark a bucket for refresh (caller holds the lock)"""
+        self._queued[bucket] = None
+
+    # ============================================
+    # HELPERS
+    # ============================================
+
+    def _get_forecaster(self) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        if self._forecaster is None:
+            from services.gemini_service import gemini_service
+            self._forecaster = gemini_service.analyze_demand_forecast
+        return self._forecaster
+
+    @staticmethod
+    def _bucket_context(bucket: BucketKey) -> Dict[str, Any]:
+        """Representative, fully deterministic prompt context for a bucket"""
+        hour_of_week, weather_class, has_event, decile = bucket
+        day = DAYS[hour_of_week // 24]
+        hour = hour_of_week % 24
+
+        if decile is not None:
+            avg_occupancy = decile * 10 + 5
+        else:
+            from services.demand_model import demand_model
+            historical = demand_model.expected_occupancy(hour_of_week)
+            avg_occupancy = round(historical * 100) if historical is not None else 60
+
+        return {
+            'current_time': f"{day} {hour:02d}:00-{hour:02d}:59",
+            'day_of_week': day,
+            'weather': weather_class,
+            'events': 'Special event nearby' if has_event else 'None',
+            'avg_occupancy': avg_occupancy
+        }
+
+    @staticmethod
+    def describe_bucket(bucket: BucketKey) -> str:
+        hour_of_week, weather_class, has_event, decile = bucket
+        occupancy = f"{decile * 10}%" if decile is not None else 'unknown'
+        return (
+            f"{DAYS[hour_of_week // 24][:3]} {hour_of_week % 24:02d}h/{weather_class}/"
+            f"{'event' if has_event else 'no-event'}/occ {occupancy}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['stale_hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'buckets_cached': len(self._table),
+                'buckets_active': len(self._last_requested),
+                'refresh_queue': len(self._queued),
+                'hit_rate': round((self.stats['hits'] + self.stats['stale_hits']) / lookups, 3) if lookups else 0.0
+            }
+
+
+# Singleton instance
+demand_forecast_service = DemandForecastService(
+    stale_after=float(os.getenv('DEMAND_FORECAST_STALE_SECONDS', '1800')),
+    refresh_interval=float(os.getenv('DEMAND_FORECAST_REFRESH_SECONDS', '30'))
+)
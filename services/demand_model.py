@@ -0,0 +1,429 @@
+"""
+ParknGo - Demand Model Module
+Local demand model: historical occupancy from parking_spots, payment_sessions,
+bookings and sessions aggregated into hour-of-week NumPy arrays (stored as
+.npz), retrained incrementally every night, so pricing gets data-driven
+demand multipliers without a model call
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.demand_forecast import DAYS
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+HOURS_PER_WEEK = 168
+HOUR = 3600
+
+# Occupancy -> demand multiplier (piecewise linear, same 0.8-1.5 range as
+# the rule-based and Gemini demand)
+OCCUPANCY_POINTS = [0.0, 0.3, 0.6, 0.85, 1.0]
+MULTIPLIER_POINTS = [0.8, 0.9, 1.0, 1.3, 1.5]
+
+# (start epoch seconds, end epoch seconds) a spot was occupied
+Interval = Tuple[float, float]
+
+
+def hour_of_week(when: datetime) -> int:
+    return when.weekday() * 24 + when.hour
+
+
+def multiplier_for_occupancy(rate):
+    """Demand multiplier for an occupancy rate 0-1 (scalar or array)"""
+    return np.round(np.interp(rate, OCCUPANCY_POINTS, MULTIPLIER_POINTS), 2)
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds from an epoch number or ISO-8601 string (naive = local time)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        # Millisecond epochs from JS clients
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def occupancy_intervals(history: Dict[str, Any], now: Optional[float] = None) -> List[Interval]:
+    """
+    Occupied intervals from raw Firebase tables
+
+    Args:
+        history: {'payment_sessions': {...}, 'bookings': {...}, 'sessions': {...}}
+        now: End of still-active intervals (default now)
+    Returns:
+        [(start, end), ...] in epoch seconds
+    """
+    now = now or time.time()
+    intervals: List[Interval] = []
+
+    def add(start: Optional[float], end: Optional[float]):
+        if start is not None and end is not None and end > start:
+            intervals.append((start, min(end, now)))
+
+    payment_sessions = history.get('payment_sessions') or {}
+    for session in payment_sessions.values():
+        if not isinstance(session, dict):
+            continue
+        start = parse_timestamp(session.get('started_at'))
+        if session.get('status') == 'active':
+            end = now
+        else:
+            end = parse_timestamp(session.get('ended_at')) or parse_timestamp(session.get('last_charge_at'))
+        add(start, end)
+
+    # Bookings with a payment session are already counted through it
+    for booking in (history.get('bookings') or {}).values():
+        if not isinstance(booking, dict) or booking.get('session_id') in payment_sessions:
+            continue
+        start = parse_timestamp(booking.get('start_time')) or parse_timestamp(booking.get('created_at'))
+        end = parse_timestamp(booking.get('ended_at')) or parse_timestamp(booking.get('end_time'))
+        if end is None and start is not None:
+            end = now if booking.get('status') == 'active' else start + float(booking.get('duration_hours') or 1.0) * HOUR
+        add(start, end)
+
+    # Balance-paid sessions (book_parking_from_balance)
+    for session in (history.get('sessions') or {}).values():
+        if not isinstance(session, dict):
+            continue
+        start = parse_timestamp(session.get('start_time'))
+        end = parse_timestamp(session.get('end_time'))
+        if end is None and start is not None:
+            end = now if session.get('status') == 'active' else start + float(session.get('duration_hours') or 1.0) * HOUR
+        add(start, end)
+
+    return intervals
+
+
+def aggregate_hours(
+    intervals: Iterable[Interval],
+    since: float,
+    until: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Occupied spot-hours and observed hours per hour-of-week for [since, until)
+
+    Both bounds must be on the hour. Intervals are clipped to the window.
+
+    Returns:
+        (occupied_hours[168], observed_hours[168])
+    """
+    first_hour = int(since // HOUR)
+    hours = int(until // HOUR) - first_hour
+    if hours <= 0:
+        return np.zeros(HOURS_PER_WEEK), np.zeros(HOURS_PER_WEEK)
+
+    # Occupied seconds per absolute hour of the window
+    timeline = np.zeros(hours)
+    for start, end in intervals:
+        a = max(start, since) - since
+        b = min(end, until) - since
+        if b <= a:
+            continue
+        i, j = int(a // HOUR), int(b // HOUR)
+        if i == j:
+            timeline[i] += b - a
+            continue
+        timeline[i] += (i + 1) * HOUR - a
+        timeline[i + 1:j] += HOUR
+        if j < hours:
+            timeline[j] += b - j * HOUR
+
+    # Local hour-of-week of every absolute hour in the window
+    how = np.array([
+        hour_of_week(datetime.fromtimestamp((first_hour + offset) * HOUR))
+        for offset in range(hours)
+    ])
+
+    occupied = np.bincount(how, weights=timeline / HOUR, minlength=HOURS_PER_WEEK)
+    observed = np.bincount(how, minlength=HOURS_PER_WEEK).astype(float)
+    return occupied, observed
+
+
+class DemandModel:
+    """
+    Hour-of-week occupancy model
+
+    Keeps three 168-slot arrays: occupied spot-hours, capacity spot-hours
+    and observed hours. Retraining only aggregates the hours since the last
+    run (the watermark) and adds them to the arrays after decaying the
+    existing totals, so recent weeks count more and a nightly run touches
+    one day of history. Forecasts are a lookup into precomputed per-hour
+    occupancy and multiplier arrays.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        half_life_weeks: float = 8.0,
+        min_weeks: int = 2,
+        max_history_days: int = 365,
+        retrain_hour: int = 3
+    ):
+        """
+        Args:
+            path: .npz file for the arrays (None = memory only)
+            half_life_weeks: Age at which history counts half
+            min_weeks: Observations of an hour-of-week needed to forecast it
+            max_history_days: How far back the first training run looks
+            retrain_hour: Local hour of the nightly retrain
+        """
+        self.path = path
+        self.half_life_weeks = half_life_weeks
+        self.min_weeks = min_weeks
+        self.max_history_days = max_history_days
+        self.retrain_hour = retrain_hour
+
+        self.occupied_hours = np.zeros(HOURS_PER_WEEK)
+        self.capacity_hours = np.zeros(HOURS_PER_WEEK)
+        self.observed_hours = np.zeros(HOURS_PER_WEEK)
+        self.trained_until: Optional[float] = None
+
+        self._occupancy = np.zeros(HOURS_PER_WEEK)
+        self._multipliers = np.ones(HOURS_PER_WEEK)
+        self._ready = np.zeros(HOURS_PER_WEEK, dtype=bool)
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {'forecasts': 0, 'unknown_hours': 0, 'retrains': 0, 'retrain_errors': 0}
+
+        if path is not None and path.exists():
+            self.load(path)
+
+    # ============================================
+    # FORECAST
+    # ============================================
+
+    @property
+    def trained(self) -> bool:
+        return bool(self._ready.any())
+
+    def expected_occupancy(self, hour: int) -> Optional[float]:
+        """Historical occupancy 0-1 for an hour-of-week, or None if too few observations"""
+        if not self._ready[hour]:
+            return None
+        return float(self._occupancy[hour])
+
+    def forecast(self, when: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Demand for the hour containing `when`, from historical occupancy
+
+        Returns:
+            {'demand_score', 'demand_multiplier', 'reasoning', 'peak_expected',
+             'expected_occupancy'}, or None if the hour has too little history
+        """
+        how = hour_of_week(when or datetime.now())
+        self.stats['forecasts'] += 1
+
+        if not self._ready[how]:
+            self.stats['unknown_hours'] += 1
+            return None
+
+        rate = float(self._occupancy[how])
+        return {
+            'demand_score': int(round(rate * 100)),
+            'demand_multiplier': float(self._multipliers[how]),
+            'reasoning': f"Historical occupancy {rate:.0%} on {DAYS[how // 24][:3]} {how % 24:02d}h",
+            'peak_expected': rate >= 0.75,
+            'expected_occupancy': round(rate, 3)
+        }
+
+    def _recompute(self):
+        """Refresh the per-hour forecast arrays (caller holds the lock)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            occupancy = np.where(self.capacity_hours > 0, self.occupied_hours / self.capacity_hours, 0.0)
+        occupancy = np.clip(occupancy, 0.0, 1.0)
+
+        self._occupancy = occupancy
+        self._multipliers = multiplier_for_occupancy(occupancy)
+        self._ready = (self.observed_hours >= self.min_weeks) & (self.capacity_hours > 0)
+
+    # ============================================
+    # TRAINING
+    # ============================================
+
+    def retrain(self, history: Dict[str, Any], now: Optional[float] = None, full: bool = False) -> Dict[str, Any]:
+        """
+        Fold the hours since the last run into the model
+
+        Args:
+            history: Raw tables, see FirebaseService.get_occupancy_history()
+            now: Current epoch seconds (default now); the window ends on the
+                 last full hour before it
+            full: Discard the arrays and rebuild from all history
+        Returns:
+            Summary of the run
+        """
+        now = now or time.time()
+        until = (now // HOUR) * HOUR
+        capacity = len(history.get('parking_spots') or {})
+        intervals = occupancy_intervals(history, now=until)
+
+        with self._lock:
+            if full:
+                self._reset()
+
+            since = self.trained_until
+            if since is None:
+                earliest = min((start for start, _ in intervals), default=until)
+                since = max(earliest, until - self.max_history_days * 86400)
+                since = (since // HOUR) * HOUR
+
+            if until <= since or capacity == 0:
+                return {'hours': 0, 'intervals': len(intervals), 'capacity': capacity, 'trained_until': self.trained_until}
+
+            occupied, observed = aggregate_hours(intervals, since, until)
+
+            # Age the existing totals by the length of the new window
+            if self.trained_until is not None and self.half_life_weeks > 0:
+                decay = 0.5 ** ((until - since) / (self.half_life_weeks * 7 * 86400))
+                self.occupied_hours *= decay
+                self.capacity_hours *= decay
+
+            self.occupied_hours += occupied
+            self.capacity_hours += observed * capacity
+            self.observed_hours += observed
+            self.trained_until = until
+            self._recompute()
+
+            hours = int(observed.sum())
+            self.stats['retrains'] += 1
+
+        logger.info(
+            f"📈 Demand model trained on {hours}h of history "
+            f"({len(intervals)} sessions, {capacity} spots, {int(self._ready.sum())}/168 hours ready)"
+        )
+        return {'hours': hours, 'intervals': len(intervals), 'capacity': capacity, 'trained_until': until}
+
+    def _reset(self):
+        self.occupied_hours = np.zeros(HOURS_PER_WEEK)
+        self.capacity_hours = np.zeros(HOURS_PER_WEEK)
+        self.observed_hours = np.zeros(HOURS_PER_WEEK)
+        self.trained_until = None
+        self._recompute()
+
+    def retrain_from_firebase(self, firebase, full: bool = False) -> Dict[str, Any]:
+        """Pull history from Firebase, retrain and save"""
+        summary = self.retrain(firebase.get_occupancy_history(), full=full)
+        if self.path is not None:
+            self.save(self.path)
+        return summary
+
+    # ============================================
+    # NIGHTLY RETRAIN
+    # ============================================
+
+    def start(self, firebase):
+        """Start the nightly retrain thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._nightly_loop, args=(firebase,), name='demand-model', daemon=True)
+            self._thread.start()
+            logger.info(f"✅ Demand model retrains nightly at {self.retrain_hour:02d}:00")
+
+    def _nightly_loop(self, firebase):
+        # Catch up straight away if the last run is more than a day old
+        if self.trained_until is None or time.time() - self.trained_until > 86400:
+            self._safe_retrain(firebase)
+
+        while True:
+            time.sleep(self._seconds_until_next_run())
+            self._safe_retrain(firebase)
+
+    def _safe_retrain(self, firebase):
+        try:
+            self.retrain_from_firebase(firebase)
+        except Exception as e:
+            self.stats['retrain_errors'] += 1
+            logger.error(f"❌ Demand model retrain failed: {e}")
+
+    def _seconds_until_next_run(self) -> float:
+        now = datetime.now()
+        run = now.replace(hour=self.retrain_hour, minute=0, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        return (run - now).total_seconds()
+
+    # ============================================
+    # PERSISTENCE
+    # ============================================
+
+    def load(self, path: Path) -> bool:
+        try:
+            with np.load(path) as arrays:
+                occupied = arrays['occupied_hours']
+                capacity = arrays['capacity_hours']
+                observed = arrays['observed_hours']
+                trained_until = float(arrays['trained_until'])
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"⚠️ Demand model {path} unreadable, starting untrained: {e}")
+            return False
+
+        if occupied.shape != (HOURS_PER_WEEK,):
+            logger.warning(f"⚠️ Demand model {path} has the wrong shape, starting untrained")
+            return False
+
+        with self._lock:
+            self.occupied_hours = occupied.astype(float)
+            self.capacity_hours = capacity.astype(float)
+            self.observed_hours = observed.astype(float)
+            self.trained_until = trained_until if trained_until > 0 else None
+            self._recompute()
+
+        logger.info(f"✅ Demand model loaded from {path} ({int(self._ready.sum())}/168 hours ready)")
+        return True
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+
+        with self._lock:
+            with tmp.open('wb') as out:
+                np.savez_compressed(
+                    out,
+                    occupied_hours=self.occupied_hours,
+                    capacity_hours=self.capacity_hours,
+                    observed_hours=self.observed_hours,
+                    trained_until=np.array(self.trained_until or 0.0)
+                )
+        tmp.replace(path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'hours_ready': int(self._ready.sum()),
+            'trained_until': datetime.fromtimestamp(self.trained_until).isoformat() if self.trained_until else None,
+            'mean_occupancy': round(float(self._occupancy[self._ready].mean()), 3) if self.trained else None
+        }
+
+
+def _default_path() -> Optional[Path]:
+    value = os.getenv('DEMAND_MODEL_PATH', 'data/demand_model.npz')
+    if not value:
+        return None
+    path = Path(value)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+# Singleton instance
+demand_model = DemandModel(
+    path=_default_path(),
+    half_life_weeks=float(os.getenv('DEMAND_MODEL_HALF_LIFE_WEEKS', '8')),
+    retrain_hour=int(os.getenv('DEMAND_MODEL_RETRAIN_HOUR', '3'))
+)
@@ -0,0 +1,178 @@
+"""
+ParknGo - Directions Store Module
+Walking directions and route tips memoised per (entrance, spot) pair and
+persisted in SQLite, so each pair is generated once per lot layout rather
+than once per reservation
+"""
+
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class DirectionsStore:
+    """
+    Two-tier (memory + optional SQLite) store of generated directions
+
+    Entries are tagged with the layout version they were generated for.
+    Switching to a different layout version drops every entry; nothing
+    else expires, since the path from an entrance to a spot only changes
+    with the layout.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, layout_version: Optional[str] = None):
+        """
+        Args:
+            db_path: SQLite file for the persistent tier (None = memory only)
+            layout_version: Version of the lot layout the entries belong to
+                            (None = not known yet; set_layout_version() before use)
+        """
+        self.db_path = db_path
+        self.layout_version = layout_version
+
+        self._memory: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS route_directions ("
+                "entrance TEXT NOT NULL, spot_id TEXT NOT NULL, layout_version TEXT NOT NULL, "
+                "directions TEXT NOT NULL, tip TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (entrance, spot_id))"
+            )
+            self._db.commit()
+            if self.layout_version is not None:
+                self._drop_stale()
+            logger.info(f"✅ Directions store persisted to {db_path}")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Directions store disk tier disabled ({db_path}): {e}")
+            self._db = None
+
+    def _drop_stale(self) -> int:
+        """Delete disk entries from other layout versions"""
+        removed = self._db.execute(
+            "DELETE FROM route_directions WHERE layout_version != ?", (self.layout_version,)
+        ).rowcount
+        self._db.commit()
+        if removed:
+            logger.info(f"🗺️ Dropped {removed} directions from an old lot layout")
+        return removed
+
+    # ============================================
+    # LOOKUP / STORE
+    # ============================================
+
+    def get(self, entrance: str, spot_id: str) -> Optional[Dict[str, Any]]:
+        """{'directions': [...], 'tip': str} for a pair, or None"""
+        key = (entrance, spot_id)
+
+        with self._lock:
+            entry = self._memory.get(key)
+
+            if entry is None and self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT directions, tip FROM route_directions "
+                        "WHERE entrance = ? AND spot_id = ? AND layout_version = ?",
+                        (entrance, spot_id, self.layout_version)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Directions store disk read failed: {e}")
+                    row = None
+
+                if row:
+                    entry = {'directions': json.loads(row[0]), 'tip': row[1]}
+                    self._memory[key] = entry
+
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            self.stats['hits'] += 1
+            return {'directions': list(entry['directions']), 'tip': entry['tip']}
+
+    def put(self, entrance: str, spot_id: str, directions: List[str], tip: str):
+        """Store generated directions for a pair under the current layout version"""
+        with self._lock:
+            self._memory[(entrance, spot_id)] = {'directions': list(directions), 'tip': tip}
+            self.stats['stores'] += 1
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO route_directions "
+                        "(entrance, spot_id, layout_version, directions, tip, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (entrance, spot_id, self.layout_version, json.dumps(directions), tip, time.time())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Directions store disk write failed: {e}")
+
+    def set_layout_version(self, layout_version: str):
+        """Switch layouts; entries generated for any other layout are dropped"""
+        with self._lock:
+            previous = self.layout_version
+            if layout_version == previous:
+                return
+            self.layout_version = layout_version
+            self._memory.clear()
+            removed = 0
+            if self._db is not None:
+                try:
+                    removed = self._drop_stale()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Directions store disk invalidation failed: {e}")
+
+            if previous is not None or removed:
+                self.stats['invalidations'] += 1
+
+        if previous is not None:
+            logger.info(f"🗺️ Lot layout changed ({layout_version}), directions will be regenerated")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM route_directions")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'memory_entries': len(self._memory),
+                'persistent': self._db is not None,
+                'layout_version': self.layout_version,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0.0
+            }
+
+
+def _default_db_path() -> Optional[str]:
+    value = os.getenv('DIRECTIONS_DB', 'data/route_directions.db')
+    if not value:
+        return None
+    return value if value == ':memory:' or os.path.isabs(value) else str(PROJECT_ROOT / value)
+
+
+# Singleton instance (the route optimizer sets the layout version)
+directions_store = DirectionsStore(db_path=_default_db_path())
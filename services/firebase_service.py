@@ -4,7 +4,9 @@ Handles all Firebase Realtime Database operations with professional error handli
 """
 
 import os
+import time
 import logging
+import threading
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import firebase_admin
@@ -18,12 +20,18 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fields a booking claim writes onto a spot; cleared when the claim is
+# released, expires, or the sensor reports the spot empty
+CLAIM_FIELDS = ('current_user', 'current_session', 'claim_expires_at')
+
 
 class FirebaseService:
     """Professional Firebase Realtime Database service"""
     
     _instance = None
     _initialized = False
+    _claim_sweeper: Optional[threading.Thread] = None
+    _claim_sweeper_lock = threading.Lock()
     
     def __new__(cls):
         """Singleton pattern to ensure only one Firebase instance"""
@@ -175,6 +183,123 @@ class FirebaseService:
             logger.error(f"Error updating spot {spot_id}: {e}")
             return False
     
+    def claim_spot(self, spot_id: str, updates: Optional[Dict] = None, ttl_seconds: Optional[float] = None) -> bool:
+        """
+        Atomically mark a free spot occupied (Firebase transaction)
+        
+        A claim with a TTL lapses if the sensor has not confirmed the vehicle
+        by then: the spot counts as free again for later claims, and a
+        background sweep releases it so it is offered to other drivers.
+        
+        Args:
+            spot_id: Spot identifier
+            updates: Extra fields to write with the claim (e.g. current_user)
+            ttl_seconds: Seconds until an unconfirmed claim expires (None = never)
+        Returns:
+            True if this call claimed the spot, False if it was already
+            occupied, missing, or the transaction failed
+        """
+        claimed = False
+        
+        def claim(current):
+            # May run several times if another writer races us
+            nonlocal claimed
+            if not current or (current.get('occupied', False) and not _claim_expired(current)):
+                claimed = False
+                return current
+            claimed = True
+            spot = {key: value for key, value in current.items() if key not in CLAIM_FIELDS}
+            if ttl_seconds is not None:
+                spot['claim_expires_at'] = time.time() + ttl_seconds
+            return {
+                **spot,
+                **(updates or {}),
+                'occupied': True,
+                'last_updated': datetime.utcnow().isoformat() + 'Z'
+            }
+        
+        try:
+            db.reference(f'parking_spots/{spot_id}').transaction(claim)
+            
+            if claimed:
+                logger.info(f"Claimed {spot_id}")
+                if ttl_seconds is not None:
+                    self._ensure_claim_sweeper()
+            else:
+                logger.info(f"Spot {spot_id} already taken")
+            return claimed
+            
+        except Exception as e:
+            logger.error(f"Error claiming spot {spot_id}: {e}")
+            return False
+    
+    def release_claim(self, spot_id: str, session_id: Optional[str] = None) -> bool:
+        """
+        Undo a claim the sensor has not confirmed (Firebase transaction)
+        
+        Args:
+            spot_id: Spot identifier
+            session_id: Only release the claim made for this session
+                        (None = release only if the claim has expired)
+        Returns:
+            True if the claim was released
+        """
+        released = False
+        
+        def release(current):
+            nonlocal released
+            released = False
+            if not current or current.get('claim_expires_at') is None:
+                return current
+            if session_id is not None and current.get('current_session') != session_id:
+                return current
+            if session_id is None and not _claim_expired(current):
+                return current
+            released = True
+            return {
+                **{key: value for key, value in current.items() if key not in CLAIM_FIELDS},
+                'occupied': False,
+                'last_updated': datetime.utcnow().isoformat() + 'Z'
+            }
+        
+        try:
+            db.reference(f'parking_spots/{spot_id}').transaction(release)
+            
+            if released:
+                logger.info(f"Released claim on {spot_id}")
+            return released
+            
+        except Exception as e:
+            logger.error(f"Error releasing claim on {spot_id}: {e}")
+            return False
+    
+    def release_expired_claims(self) -> int:
+        """Release every claim whose vehicle never arrived; returns how many"""
+        expired = [
+            spot_id for spot_id, spot in self.get_all_parking_spots().items()
+            if isinstance(spot, dict) and _claim_expired(spot)
+        ]
+        return sum(self.release_claim(spot_id) for spot_id in expired)
+    
+    def _ensure_claim_sweeper(self):
+        with self._claim_sweeper_lock:
+            if FirebaseService._claim_sweeper is None:
+                FirebaseService._claim_sweeper = threading.Thread(
+                    target=self._sweep_claims, name='claim-sweeper', daemon=True
+                )
+                FirebaseService._claim_sweeper.start()
+    
+    def _sweep_claims(self):
+        interval = float(os.getenv('SPOT_CLAIM_SWEEP_SECONDS', '60'))
+        while True:
+            time.sleep(interval)
+            try:
+                released = self.release_expired_claims()
+                if released:
+                    logger.info(f"⏱️ Released {released} expired spot claims")
+            except Exception as e:
+                logger.error(f"Error sweeping spot claims: {e}")
+    
     # ============================================
     # RESERVATIONS OPERATIONS
     # ============================================
@@ -255,6 +380,21 @@ class FirebaseService:
             logger.error(f"Error fetching session {session_id}: {e}")
             return None
     
+    def get_occupancy_history(self) -> Dict[str, Dict]:
+        """
+        Raw tables the demand model learns occupancy from
+        Returns: {'parking_spots', 'payment_sessions', 'bookings', 'sessions'} -> records
+        """
+        history = {}
+        for table in ('parking_spots', 'payment_sessions', 'bookings', 'sessions'):
+            try:
+                history[table] = db.reference(table).get() or {}
+            except Exception as e:
+                logger.error(f"Error fetching {table} history: {e}")
+                history[table] = {}
+        
+        return history
+    
     def update_session(self, session_id: str, updates: Dict) -> bool:
         """Update session data"""
         try:
@@ -525,5 +665,10 @@ class FirebaseService:
             return False
 
 
+def _claim_expired(spot: Dict) -> bool:
+    expires_at = spot.get('claim_expires_at')
+    return expires_at is not None and expires_at <= time.time()
+
+
 # Singleton instance
 firebase_service = FirebaseService()
@@ -4,12 +4,32 @@ Professional Google Gemini AI integration for intelligent decision-making
 """
 
 import os
+import json
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
-import google.generativeai as genai
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Any
 from dotenv import load_dotenv
 import time
 
+from services.llm_backend import create_backend
+from services.llm_cache import create_llm_cache, make_cache_key
+from services.deadline import DeadlineExceeded, ensure_budget, remaining, submit_with_deadline
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN
+from services.llm_metrics import LLMMetrics, usage_from_response
+from services.structured_output import (
+    StructuredOutputError,
+    parse_model,
+    parse_model_list,
+    DemandForecast,
+    DynamicPrice,
+    FraudAssessment,
+    DisputeRuling,
+    AnomalyReport,
+    ReservationBrief
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -39,17 +59,12 @@ class GeminiService:
     def _initialize_gemini(self):
         """Initialize Gemini API"""
         try:
-            api_key = os.getenv('GEMINI_API_KEY')
             model_name = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
             
-            if not api_key:
-                raise ValueError("Missing GEMINI_API_KEY in .env file")
-            
-            # Configure Gemini
-            genai.configure(api_key=api_key)
-            
-            # Initialize model
-            self.model = genai.GenerativeModel(model_name)
+            # Real Gemini API, or the offline stub (LLM_BACKEND=stub) which
+            # needs no API key or network
+            self.backend = create_backend(model_name)
+            self.model_name = self.backend.model_name
             
             # Generation config for consistent, fast responses
             self.generation_config = {
@@ -59,35 +74,119 @@ class GeminiService:
                 'max_output_tokens': 1024,
             }
             
-            logger.info(f"✅ Gemini AI initialized: {model_name}")
+            # Native JSON output (response_mime_type) needs a newer SDK;
+            # structured calls fall back to tolerant extraction without it
+            self.json_mode = self.backend.supports_json_mode
+            
+            # Identical prompts (same hour/day/weather context, same route)
+            # are served from cache instead of the model
+            self.response_cache = create_llm_cache()
+            
+            # Worker pool for concurrent (non-blocking) model calls
+            self.executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('GEMINI_MAX_CONCURRENCY', '8')),
+                thread_name_prefix='gemini'
+            )
+            
+            # A call needs at least this much of the request budget left;
+            # otherwise callers go straight to their rule-based fallback
+            self.min_call_seconds = float(os.getenv('GEMINI_MIN_CALL_SECONDS', '1.0'))
+            
+            # Shared breaker: during an outage calls fail fast instead of
+            # every agent paying for retries and backoff
+            self.breaker = CircuitBreaker(
+                'gemini',
+                failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', '3')),
+                recovery_timeout=float(os.getenv('GEMINI_BREAKER_RECOVERY_SECONDS', '30'))
+            )
+            self.forced_degraded = os.getenv('AI_DEGRADED_MODE', 'false').lower() == 'true'
+            self.method_health: Dict[str, Dict[str, Any]] = {}
+            self._health_lock = threading.Lock()
+            
+            # Per-method tokens, latency, retries, cache hits and fallbacks
+            self.metrics = LLMMetrics()
+            
+            logger.info(f"✅ Gemini AI initialized: {self.model_name} ({self.backend.name} backend)")
             
         except Exception as e:
             logger.error(f"❌ Gemini initialization failed: {e}")
             raise
     
-    def _generate_with_retry(self, prompt: str, max_retries: int = 3) -> str:
+    def _generate_with_retry(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        cache_ttl: Optional[float] = None,
+        use_cache: bool = True,
+        purpose: str = 'generate',
+        json_mode: bool = False
+    ) -> str:
         """
         Generate response with automatic retry on failure
         
         Args:
             prompt: Input prompt for Gemini
             max_retries: Maximum retry attempts
+            cache_ttl: Seconds to cache the response (None = LLM_CACHE_TTL)
+            use_cache: Set False to always call the model
+            purpose: Calling method, for per-method health and metrics
+            json_mode: Ask for a JSON response (when the SDK supports it)
         Returns:
             Generated text response
+        Raises:
+            CircuitOpenError: Gemini is degraded; use the rule-based fallback
+            DeadlineExceeded: not enough request budget left for a call
         """
+        generation_config = self._generation_config(json_mode)
+        
+        cache_key = None
+        if use_cache:
+            cache_key = make_cache_key(prompt, generation_config, self.model_name)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.record_cache_hit(purpose, prompt, cached)
+                return cached
+        
         for attempt in range(max_retries):
+            ensure_budget(self.min_call_seconds, 'Gemini call')
+            self._admit(purpose)
+            
+            started = time.perf_counter()
             try:
-                response = self.model.generate_content(
+                # The HTTP call is capped at the request's remaining budget
+                response = self.backend.generate_content(
                     prompt,
-                    generation_config=self.generation_config
+                    generation_config=generation_config,
+                    timeout=remaining()
+                )
+                
+                text = response.text.strip()
+                self._record_outcome(purpose)
+                self.metrics.record_call(
+                    purpose,
+                    time.perf_counter() - started,
+                    usage_from_response(response, prompt, text)
                 )
                 
-                return response.text.strip()
+                if cache_key and text:
+                    self.response_cache.set(cache_key, text, cache_ttl)
+                
+                return text
                 
             except Exception as e:
+                self.metrics.record_call(purpose, time.perf_counter() - started, error=True)
+                self._raise_if_deadline(purpose, e)
+                self._record_outcome(purpose, e)
                 logger.warning(f"Gemini API error (attempt {attempt + 1}/{max_retries}): {e}")
                 
+                if self.breaker.state == OPEN:
+                    # This failure tripped the breaker: retrying can't help
+                    raise
+                
                 if attempt < max_retries - 1:
+                    # Don't sleep into a retry the request can't afford
+                    ensure_budget(2 ** attempt + self.min_call_seconds, 'Gemini retry')
+                    self.metrics.record_retry(purpose)
                     time.sleep(2 ** attempt)  # Exponential backoff
                 else:
                     logger.error(f"Gemini API failed after {max_retries} attempts")
@@ -95,6 +194,437 @@ class GeminiService:
         
         return ""
     
+    def generate_structured(self, prompt: str, model, purpose: str, **kwargs):
+        """
+        Generate and validate a typed response
+        
+        Uses JSON mode when available, extracts JSON tolerantly (code fences,
+        preamble) and validates it against `model` (a StructuredModel).
+        An invalid response is evicted from the cache so it isn't replayed.
+        
+        Raises:
+            StructuredOutputError: response didn't match the schema
+        """
+        response = self._generate_with_retry(prompt, purpose=purpose, json_mode=True, **kwargs)
+        
+        try:
+            return parse_model(response, model)
+        except StructuredOutputError:
+            self._evict(prompt, json_mode=True)
+            raise
+    
+    def generate_structured_list(self, prompt: str, model, purpose: str, wrapper_keys=(), **kwargs) -> list:
+        """generate_structured() for responses that are a JSON array of `model`"""
+        response = self._generate_with_retry(prompt, purpose=purpose, json_mode=True, **kwargs)
+        
+        try:
+            return parse_model_list(response, model, wrapper_keys)
+        except StructuredOutputError:
+            self._evict(prompt, json_mode=True)
+            raise
+    
+    def _generation_config(self, json_mode: bool = False) -> Dict[str, Any]:
+        if json_mode and self.json_mode:
+            return {**self.generation_config, 'response_mime_type': 'application/json'}
+        return self.generation_config
+    
+    def _evict(self, prompt: str, json_mode: bool = False):
+        self.response_cache.delete(make_cache_key(prompt, self._generation_config(json_mode), self.model_name))
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        max_retries: int = 3,
+        cache_ttl: Optional[float] = None,
+        use_cache: bool = True,
+        purpose: str = 'generate'
+    ) -> Iterator[str]:
+        """
+        Stream a response as text chunks while Gemini generates it
+        
+        Retries only happen before the first chunk is yielded; the full text
+        is cached afterwards, and a cached prompt is yielded in one chunk.
+        
+        Args:
+            prompt: Input prompt for Gemini
+            max_retries: Maximum attempts to open the stream
+            cache_ttl: Seconds to cache the full response (None = LLM_CACHE_TTL)
+            use_cache: Set False to always call the model
+            purpose: Calling method, for per-method health and metrics
+        Yields:
+            Text chunks in generation order
+        """
+        cache_key = None
+        if use_cache:
+            cache_key = make_cache_key(prompt, self.generation_config, self.model_name)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.metrics.record_cache_hit(purpose, prompt, cached)
+                yield cached
+                return
+        
+        for attempt in range(max_retries):
+            ensure_budget(self.min_call_seconds, 'Gemini stream')
+            self._admit(purpose)
+            
+            started = time.perf_counter()
+            chunks = []
+            try:
+                response = self.backend.generate_content(
+                    prompt,
+                    generation_config=self.generation_config,
+                    stream=True,
+                    timeout=remaining()
+                )
+                
+                for chunk in response:
+                    text = chunk.text
+                    if text:
+                        chunks.append(text)
+                        yield text
+                
+                self._record_outcome(purpose)
+                
+                full_text = ''.join(chunks).strip()
+                self.metrics.record_call(
+                    purpose,
+                    time.perf_counter() - started,
+                    usage_from_response(response, prompt, full_text),
+                    streamed=True
+                )
+                
+                if cache_key and full_text:
+                    self.response_cache.set(cache_key, full_text, cache_ttl)
+                return
+                
+            except GeneratorExit:
+                # Client disconnected mid-stream: Gemini itself was healthy
+                self._record_outcome(purpose)
+                self.metrics.record_call(
+                    purpose,
+                    time.perf_counter() - started,
+                    usage_from_response(None, prompt, ''.join(chunks)),
+                    streamed=True
+                )
+                raise
+                
+            except Exception as e:
+                self.metrics.record_call(purpose, time.perf_counter() - started, error=True, streamed=True)
+                if not chunks:
+                    self._raise_if_deadline(purpose, e)
+                self._record_outcome(purpose, e)
+                
+                # Text already sent to the client can't be retried
+                if chunks:
+                    logger.error(f"Gemini stream interrupted after {len(chunks)} chunks: {e}")
+                    raise
+                
+                logger.warning(f"Gemini stream error (attempt {attempt + 1}/{max_retries}): {e}")
+                
+                if self.breaker.state == OPEN:
+                    # This failure tripped the breaker: retrying can't help
+                    raise
+                
+                if attempt < max_retries - 1:
+                    # Don't sleep into a retry the request can't afford
+                    ensure_budget(2 ** attempt + self.min_call_seconds, 'Gemini retry')
+                    self.metrics.record_retry(purpose)
+                    time.sleep(2 ** attempt)  # Exponential backoff
+                else:
+                    logger.error(f"Gemini stream failed after {max_retries} attempts")
+                    raise
+    
+    # ============================================
+    # CIRCUIT BREAKER & HEALTH
+    # ============================================
+    
+    def is_degraded(self) -> bool:
+        """
+        Process-wide "AI degraded" flag
+        
+        True while the breaker is open (or AI_DEGRADED_MODE is forced):
+        agents should skip prompt building and use their fallbacks directly.
+        Half-open counts as available so probe calls can close the breaker.
+        """
+        return self.forced_degraded or self.breaker.state == OPEN
+    
+    def set_degraded(self, degraded: bool):
+        """Manually force (or clear) degraded mode, e.g. during an incident"""
+        self.forced_degraded = degraded
+        logger.warning(f"⚠️ AI degraded mode {'forced on' if degraded else 'cleared'}")
+    
+    def get_health(self) -> Dict[str, Any]:
+        """Breaker state plus per-method success/failure counters"""
+        with self._health_lock:
+            methods = {name: dict(health) for name, health in self.method_health.items()}
+        
+        return {
+            'backend': self.backend.name,
+            'degraded': self.is_degraded(),
+            'forced_degraded': self.forced_degraded,
+            'breaker': self.breaker.get_status(),
+            'methods': methods
+        }
+    
+    def _admit(self, purpose: str):
+        """Reject the call up front when Gemini is degraded"""
+        if self.forced_degraded or not self.breaker.allow_request():
+            with self._health_lock:
+                health = self._method_health(purpose)
+                health['short_circuited'] += 1
+            raise CircuitOpenError(f"Gemini degraded, skipping {purpose}")
+    
+    def _record_outcome(self, purpose: str, error: Optional[Exception] = None):
+        if error is None:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        
+        with self._health_lock:
+            health = self._method_health(purpose)
+            health['calls'] += 1
+            if error is None:
+                health['consecutive_failures'] = 0
+                health['last_success_at'] = time.time()
+            else:
+                health['failures'] += 1
+                health['consecutive_failures'] += 1
+                health['last_failure_at'] = time.time()
+                health['last_error'] = str(error)[:200]
+    
+    def _method_health(self, purpose: str) -> Dict[str, Any]:
+        """Health record for a calling method (caller holds _health_lock)"""
+        return self.method_health.setdefault(purpose, {
+            'calls': 0,
+            'failures': 0,
+            'consecutive_failures': 0,
+            'short_circuited': 0,
+            'deadline_timeouts': 0,
+            'last_success_at': None,
+            'last_failure_at': None,
+            'last_error': None
+        })
+    
+    @staticmethod
+    def _fallback_reason(error: Exception) -> str:
+        """Metrics label for why a caller fell back"""
+        if isinstance(error, CircuitOpenError):
+            return 'degraded'
+        if isinstance(error, DeadlineExceeded):
+            return 'deadline'
+        # Only parse failures: SDK/request errors are often ValueErrors too
+        if isinstance(error, (StructuredOutputError, json.JSONDecodeError)):
+            return 'invalid_output'
+        return 'error'
+    
+    def _raise_if_deadline(self, purpose: str, error: Exception):
+        """
+        A timeout while a request deadline is active is the caller's own
+        budget running out (the call's timeout *is* the remaining budget),
+        not a Gemini failure: release the breaker slot without counting it
+        and surface it as DeadlineExceeded so the caller falls back.
+        """
+        if remaining() is None or not self._is_timeout(error):
+            return
+        
+        self.breaker.record_abandoned()
+        with self._health_lock:
+            self._method_health(purpose)['deadline_timeouts'] += 1
+        raise DeadlineExceeded(f"Gemini {purpose} call hit the request deadline: {error}") from error
+    
+    @staticmethod
+    def _is_timeout(error: Exception) -> bool:
+        """TimeoutError, or an SDK/transport timeout (api_core DeadlineExceeded, ReadTimeout, ...)"""
+        name = type(error).__name__
+        return isinstance(error, TimeoutError) or name == 'DeadlineExceeded' or 'Timeout' in name
+    
+    # ============================================
+    # CONCURRENT EXECUTION
+    # ============================================
+    
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run an AI-bound callable on the Gemini worker pool
+        
+        Used by agents to start independent model calls (plus their parsing
+        and fallbacks) at the same time and join on the results. The
+        caller's request deadline carries over to the worker.
+        """
+        return submit_with_deadline(self.executor, fn, *args, **kwargs)
+    
+    def generate_async(self, prompt: str, **kwargs) -> Future:
+        """Non-blocking _generate_with_retry; returns a Future with the text"""
+        return self.submit(self._generate_with_retry, prompt, **kwargs)
+    
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Awaitable _generate_with_retry for asyncio callers"""
+        return await asyncio.wrap_future(self.generate_async(prompt, **kwargs))
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Response cache hit-rate metrics"""
+        return self.response_cache.get_stats()
+    
+    # ============================================
+    # USAGE METRICS
+    # ============================================
+    
+    def record_fallback(self, purpose: str, cause: Any = 'error'):
+        """
+        Count a fallback activation for a calling method
+        
+        Args:
+            purpose: Calling method (same names as _generate_with_retry)
+            cause: The exception that forced the fallback, or a reason
+                   (degraded | deadline | error | invalid_output | not_ready)
+        """
+        reason = self._fallback_reason(cause) if isinstance(cause, Exception) else cause
+        self.metrics.record_fallback(purpose, reason)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-method token, latency, retry, cache and fallback metrics"""
+        return {
+            'model': self.model_name,
+            **self.metrics.get_metrics(),
+            'cache': self.get_cache_stats()
+        }
+    
+    # ============================================
+    # COMPOSITE RESERVATION BRIEF
+    # ============================================
+    
+    def generate_reservation_brief(
+        self,
+        spots: List[Dict],
+        request_data: Dict,
+        pricing_by_spot: Dict[str, Dict],
+        include_directions: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Spot ranking, pricing explanation and walking directions for one
+        reservation in a single structured Gemini call
+        
+        Args:
+            spots: Candidate spots (spot_id, type, zone, features, distance_meters)
+            request_data: User request (vehicle_type, desired_features, duration_hours)
+            pricing_by_spot: calculate_price() result per candidate spot_id
+            include_directions: Ask for directions and a route tip (False when
+                                the lot graph routes the spot; they come back empty)
+        Returns:
+            Validated brief:
+            {
+                'top_spot_id': str,
+                'rankings': [{'spot_id', 'score', 'reasoning'}, ...],
+                'pricing_explanation': str,
+                'directions': [str, ...],   # [] unless include_directions
+                'route_tip': str            # '' unless include_directions
+            }
+            or None if the call or validation failed (callers fall back to
+            per-agent prompts)
+        """
+        candidates = []
+        for spot in spots:
+            pricing = pricing_by_spot.get(spot['spot_id'], {})
+            candidates.append(
+                f"- {spot['spot_id']}: {spot.get('type')} spot in Zone {spot.get('zone')}, "
+                f"{spot.get('distance_meters')}m away, "
+                f"features: {', '.join(spot.get('features') or []) or 'none'} | "
+                f"price {pricing.get('total_price')} ADA "
+                f"(time x{pricing.get('time_multiplier')}, demand x{pricing.get('demand_multiplier')}, "
+                f"features +{pricing.get('feature_premium')} ADA)"
+            )
+        
+        if include_directions:
+            route_tasks = """
+4. Give 3-5 walking directions from the entrance to the top spot.
+5. Give one practical tip for the walk."""
+            route_fields = (
+                ',\n  "directions": ["Step 1: ...", "Step 2: ..."],'
+                '\n  "route_tip": "<one sentence>"'
+            )
+        else:
+            route_tasks = route_fields = ''
+        
+        prompt = f"""
+You are the ParknGo parking assistant preparing a reservation.
+
+USER REQUEST:
+- Vehicle Type: {request_data.get('vehicle_type')}
+- Desired Features: {request_data.get('desired_features', [])}
+- Duration: {request_data.get('duration_hours')} hours
+- Location: {request_data.get('user_location')}
+
+CANDIDATE SPOTS (with computed prices):
+{chr(10).join(candidates)}
+
+Tasks:
+1. Score every candidate 0-100 (distance, feature match, spot type, price).
+2. Pick the best spot as top_spot_id.
+3. Explain the top spot's price to the user in one friendly sentence.{route_tasks}
+
+Respond in JSON only:
+{{
+  "top_spot_id": "<spot_id>",
+  "rankings": [{{"spot_id": "<spot_id>", "score": <0-100>, "reasoning": "<one sentence>"}}],
+  "pricing_explanation": "<one sentence>"{route_fields}
+}}
+"""
+        
+        try:
+            brief = self.generate_structured(prompt, ReservationBrief, purpose='reservation_brief')
+            brief = self._validate_reservation_brief(
+                brief, {spot['spot_id'] for spot in spots}, include_directions
+            )
+            
+            logger.info(f"Reservation brief: top spot {brief['top_spot_id']} ({len(brief['rankings'])} ranked)")
+            return brief
+            
+        except Exception as e:
+            logger.warning(f"Reservation brief unavailable, using per-agent prompts: {e}")
+            self.record_fallback('reservation_brief', e)
+            return None
+    
+    def _validate_reservation_brief(
+        self,
+        brief: ReservationBrief,
+        spot_ids: set,
+        include_directions: bool = True
+    ) -> Dict[str, Any]:
+        """Check a schema-valid brief against the candidate spots (raises ValueError)"""
+        rankings = [r.to_dict() for r in brief.rankings if r.spot_id in spot_ids]
+        
+        if not rankings:
+            raise ValueError("no rankings for candidate spots")
+        
+        if brief.top_spot_id not in {r['spot_id'] for r in rankings}:
+            raise ValueError(f"top_spot_id {brief.top_spot_id!r} is not a ranked candidate")
+        
+        if not brief.pricing_explanation:
+            raise ValueError("pricing_explanation must be a non-empty string")
+        
+        if not include_directions:
+            return {
+                'top_spot_id': brief.top_spot_id,
+                'rankings': rankings,
+                'pricing_explanation': brief.pricing_explanation.strip('"\''),
+                'directions': [],
+                'route_tip': ''
+            }
+        
+        directions = [d for d in brief.directions if d]
+        if not directions:
+            raise ValueError("directions must be a non-empty list of strings")
+        
+        if not brief.route_tip:
+            raise ValueError("route_tip must be a non-empty string")
+        
+        return {
+            'top_spot_id': brief.top_spot_id,
+            'rankings': rankings,
+            'pricing_explanation': brief.pricing_explanation.strip('"\''),
+            'directions': directions[:5],
+            'route_tip': brief.route_tip.strip('"\'')
+        }
+    
     # ============================================
     # PRICING INTELLIGENCE
     # ============================================
@@ -134,28 +664,25 @@ Consider:
 - Events within 500m = surge demand
 """
             
-            response = self._generate_with_retry(prompt)
+            result = self.generate_structured(prompt, DemandForecast, purpose='demand_forecast').to_dict()
             
-            # Parse JSON response
-            import json
-            result = json.loads(response)
-            
-            # Normalize field names for compatibility
-            if 'multiplier' in result and 'demand_multiplier' not in result:
-                result['demand_multiplier'] = result['multiplier']
+            # Both field names for compatibility
+            result['multiplier'] = result['demand_multiplier']
             
             logger.info(f"Demand forecast: {result['demand_score']}% (multiplier: {result.get('multiplier', result.get('demand_multiplier'))}x)")
             return result
             
         except Exception as e:
             logger.error(f"Demand forecast error: {e}")
+            self.record_fallback('demand_forecast', e)
             # Fallback to moderate demand
             return {
                 'demand_score': 50,
                 'multiplier': 1.0,
                 'demand_multiplier': 1.0,  # Add both formats
                 'reasoning': 'AI unavailable, using default multiplier',
-                'peak_expected': False
+                'peak_expected': False,
+                'fallback': True
             }
     
     def suggest_dynamic_price(self, base_price: float, spot_data: Dict, context: Dict) -> Dict[str, Any]:
@@ -200,16 +727,14 @@ Respond in JSON:
 }}
 """
             
-            response = self._generate_with_retry(prompt)
-            
-            import json
-            result = json.loads(response)
+            result = self.generate_structured(prompt, DynamicPrice, purpose='dynamic_price').to_dict()
             
             logger.info(f"Dynamic price: ${result['final_price']:.2f} (base: ${base_price})")
             return result
             
         except Exception as e:
             logger.error(f"Pricing calculation error: {e}")
+            self.record_fallback('dynamic_price', e)
             return {
                 'final_price': base_price,
                 'breakdown': {'base': base_price},
@@ -261,16 +786,14 @@ Respond in JSON:
 }}
 """
             
-            response = self._generate_with_retry(prompt)
-            
-            import json
-            result = json.loads(response)
+            result = self.generate_structured(prompt, FraudAssessment, purpose='fraud_detection').to_dict()
             
             logger.info(f"Fraud score: {result['fraud_score']}/100 ({result['risk_level']} risk)")
             return result
             
         except Exception as e:
             logger.error(f"Fraud detection error: {e}")
+            self.record_fallback('fraud_detection', e)
             return {
                 'fraud_score': 20,
                 'risk_level': 'low',
@@ -294,7 +817,21 @@ Respond in JSON:
             Dictionary with confidence (0-100), ruling, reasoning, evidence_analysis
         """
         try:
-            prompt = f"""
+            prompt = self.build_dispute_prompt(dispute_data, evidence)
+            
+            result = self.generate_structured(prompt, DisputeRuling, purpose='dispute_investigation').to_dict()
+            
+            logger.info(f"Dispute ruling: {result['ruling']} (confidence: {result['confidence']}%)")
+            return result
+            
+        except Exception as e:
+            logger.error(f"Dispute investigation error: {e}")
+            self.record_fallback('dispute_investigation', e)
+            return self.fallback_dispute_ruling()
+    
+    def build_dispute_prompt(self, dispute_data: Dict, evidence: Dict) -> str:
+        """Arbitration prompt shared by investigate_dispute and streamed rulings"""
+        return f"""
 You are an impartial AI dispute resolver for parking disputes.
 
 DISPUTE CLAIM:
@@ -334,27 +871,26 @@ Respond in JSON:
   }}
 }}
 """
-            
-            response = self._generate_with_retry(prompt)
-            
-            import json
-            result = json.loads(response)
-            
-            logger.info(f"Dispute ruling: {result['ruling']} (confidence: {result['confidence']}%)")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Dispute investigation error: {e}")
-            return {
-                'confidence': 50,
-                'ruling': 'split_decision',
-                'reasoning': 'AI unavailable, defaulting to split decision',
-                'evidence_summary': 'Unable to analyze',
-                'payout_distribution': {
-                    'customer_gets': '5 ADA (stake refund)',
-                    'operator_gets': '5 ADA (stake refund)'
-                }
+    
+    def parse_dispute_ruling(self, response: str) -> Dict[str, Any]:
+        """Parse a complete arbitration response into the ruling dict"""
+        result = parse_model(response, DisputeRuling).to_dict()
+        
+        logger.info(f"Dispute ruling: {result['ruling']} (confidence: {result['confidence']}%)")
+        return result
+    
+    def fallback_dispute_ruling(self) -> Dict[str, Any]:
+        """Neutral ruling used when the AI is unavailable"""
+        return {
+            'confidence': 50,
+            'ruling': 'split_decision',
+            'reasoning': 'AI unavailable, defaulting to split decision',
+            'evidence_summary': 'Unable to analyze',
+            'payout_distribution': {
+                'customer_gets': '5 ADA (stake refund)',
+                'operator_gets': '5 ADA (stake refund)'
             }
+        }
     
     # ============================================
     # ANOMALY DETECTION
@@ -399,16 +935,14 @@ Respond in JSON:
 }}
 """
             
-            response = self._generate_with_retry(prompt)
-            
-            import json
-            result = json.loads(response)
+            result = self.generate_structured(prompt, AnomalyReport, purpose='anomaly_detection').to_dict()
             
             logger.info(f"Anomaly detection: {result['anomaly_score']}/100 ({result['risk_assessment']} risk)")
             return result
             
         except Exception as e:
             logger.error(f"Anomaly detection error: {e}")
+            self.record_fallback('anomaly_detection', e)
             return {
                 'anomaly_score': 0,
                 'detected_issues': [],
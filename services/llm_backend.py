@@ -0,0 +1,363 @@
+"""
+ParknGo - LLM Backend Module
+Pluggable model backends behind GeminiService: the real Gemini API, or a
+local deterministic stub for offline benchmarks, load tests and profiling
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class StubBackendError(Exception):
+    """Failure injected by the stub backend"""
+
+
+class GeminiBackend:
+    """Google Gemini via google-generativeai"""
+
+    name = 'gemini'
+
+    def __init__(self, model_name: str):
+        import google.generativeai as genai
+
+        api_key = os.getenv('GEMINI_API_KEY')
+        if not api_key:
+            raise ValueError("Missing GEMINI_API_KEY in .env file")
+
+        genai.configure(api_key=api_key)
+
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+        # Native JSON output (response_mime_type) needs a newer SDK
+        config_type = getattr(getattr(genai, 'types', None), 'GenerationConfig', None)
+        self.supports_json_mode = 'response_mime_type' in getattr(config_type, '__annotations__', {})
+
+        # Per-call HTTP timeouts (request_options) also need a newer SDK: older
+        # ones pass unknown kwargs into the request proto, which rejects them.
+        # Without it the timeout is enforced client-side.
+        self.supports_request_options = 'request_options' in inspect.signature(self._model.generate_content).parameters
+        self._timeout_pool = None
+        if not self.supports_request_options:
+            self._timeout_pool = ThreadPoolExecutor(
+                max_workers=2 * int(os.getenv('GEMINI_MAX_CONCURRENCY', '8')),
+                thread_name_prefix='gemini-call'
+            )
+
+    def generate_content(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            timeout: Seconds before the call raises TimeoutError (None = SDK default);
+                     for streams it bounds opening the stream
+        """
+        def call(**options):
+            return self._model.generate_content(prompt, generation_config=generation_config, stream=stream, **options)
+
+        if timeout is None:
+            return call()
+
+        if self.supports_request_options:
+            return call(request_options={'timeout': timeout})
+
+        # The abandoned HTTP request finishes in the background
+        future = self._timeout_pool.submit(call)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Gemini call exceeded {timeout:.2f}s timeout")
+
+
+# ============================================
+# LOCAL STUB
+# ============================================
+
+class StubResponse:
+    """Minimal stand-in for a Gemini response (or a streamed chunk)"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+# (prompt family, marker phrase from the prompt's opening instruction).
+# Family names match GeminiService call purposes.
+PROMPT_FAMILIES = (
+    ('reservation_brief', 'preparing a reservation'),
+    ('spot_ranking', 'rank these parking spots'),
+    ('spot_explanation', 'why this parking spot was recommended'),
+    ('demand_forecast', 'demand forecasting'),
+    ('dynamic_price', 'parking pricing ai'),
+    ('fraud_detection', 'fraud detection'),
+    ('dispute_investigation', 'dispute resolver'),
+    ('anomaly_detection', 'anomalous parking'),
+    ('aggregation', 'sub-agent results'),
+    ('pricing_explanation', 'explain this parking pricing'),
+    ('route_directions', 'walking directions'),
+    ('route_tips', 'helpful tip'),
+)
+
+# Candidate lines in the ranking prompts: "- A-01: premium spot ..."
+_SPOT_LINE = re.compile(r'^\s*-\s+([A-Za-z0-9_-]+):\s+\S+ spot\b', re.MULTILINE)
+
+
+def classify_prompt(prompt: str) -> str:
+    """
+    Prompt family for a prompt ('generic' if none matches)
+
+    The earliest marker wins, so context echoed later in a prompt (e.g. a
+    demand forecast's reasoning inside a pricing explanation) can't
+    misclassify it.
+    """
+    text = prompt.lower()
+    positions = [(text.find(marker), family) for family, marker in PROMPT_FAMILIES if marker in text]
+    return min(positions)[1] if positions else 'generic'
+
+
+class StubBackend:
+    """
+    Deterministic offline backend
+
+    Recognises each ParknGo prompt family and returns a response that passes
+    its schema, with values derived from a hash of the prompt (same prompt,
+    same answer). Latency and failures are injected to exercise timeouts,
+    retries, the circuit breaker and the rule-based fallbacks.
+    """
+
+    name = 'stub'
+    supports_json_mode = True
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        fail_families: Sequence[str] = (),
+        seed: int = 0
+    ):
+        """
+        Args:
+            latency_ms: Simulated model latency per call
+            jitter_ms: Extra uniform random latency (0..jitter_ms)
+            failure_rate: Fraction of calls (0-1) that raise StubBackendError
+            fail_families: Prompt families that always fail
+            seed: Seed for responses, jitter and injected failures
+        """
+        self.model_name = f"stub-{seed}"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.fail_families = set(fail_families)
+        self.seed = seed
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def generate_content(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict] = None,
+        stream: bool = False,
+        timeout: Optional[float] = None
+    ):
+        family = classify_prompt(prompt)
+
+        with self._lock:
+            self.calls[family] = self.calls.get(family, 0) + 1
+            delay = (self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000
+            fail = self._rng.random() < self.failure_rate
+
+        # Honour the per-call timeout GeminiService derives from the request deadline
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"stub {family} call exceeded {timeout:.2f}s timeout")
+
+        time.sleep(delay)
+
+        if fail or family in self.fail_families:
+            raise StubBackendError(f"injected failure ({family})")
+
+        text = self.respond(prompt, family)
+        if stream:
+            return self._stream(text)
+        return StubResponse(text)
+
+    def respond(self, prompt: str, family: Optional[str] = None) -> str:
+        """Schema-valid response text for a prompt"""
+        family = family or classify_prompt(prompt)
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode('utf-8')).digest()
+        rng = random.Random(int.from_bytes(digest[:8], 'big'))
+
+        builder = getattr(self, f"_respond_{family}", None)
+        if builder is None:
+            return "ParknGo stub response."
+        return builder(prompt, rng)
+
+    @staticmethod
+    def _stream(text: str) -> Iterator[StubResponse]:
+        for chunk in re.findall(r'\S+\s*', text):
+            yield StubResponse(chunk)
+
+    # ============================================
+    # PROMPT FAMILIES
+    # ============================================
+
+    @staticmethod
+    def _spot_ids(prompt: str) -> List[str]:
+        return list(dict.fromkeys(_SPOT_LINE.findall(prompt)))
+
+    def _rankings(self, prompt: str, rng: random.Random) -> List[Dict[str, Any]]:
+        rankings = [
+            {'spot_id': spot_id, 'score': rng.randint(55, 98), 'reasoning': f"Good match for the request ({spot_id})"}
+            for spot_id in self._spot_ids(prompt)
+        ]
+        return sorted(rankings, key=lambda r: r['score'], reverse=True)
+
+    def _respond_reservation_brief(self, prompt: str, rng: random.Random) -> str:
+        rankings = self._rankings(prompt, rng) or [{'spot_id': 'A-01', 'score': 80, 'reasoning': 'Only candidate'}]
+        top = rankings[0]['spot_id']
+        brief = {
+            'top_spot_id': top,
+            'rankings': rankings,
+            'pricing_explanation': f"Spot {top} is priced for the current time and demand."
+        }
+        if '"directions"' in prompt:
+            brief['directions'] = [
+                "Step 1: Enter through the main entrance",
+                f"Step 2: Follow the signs to spot {top}",
+                "Step 3: Your spot is on the right"
+            ]
+            brief['route_tip'] = "Keep to the marked pedestrian walkway."
+        return json.dumps(brief)
+
+    def _respond_spot_ranking(self, prompt: str, rng: random.Random) -> str:
+        return json.dumps(self._rankings(prompt, rng))
+
+    def _respond_spot_explanation(self, prompt: str, rng: random.Random) -> str:
+        match = re.search(r'Spot (\S+):', prompt)
+        spot = match.group(1) if match else 'This spot'
+        return f"{spot} is the closest available spot that matches what you asked for."
+
+    def _respond_demand_forecast(self, prompt: str, rng: random.Random) -> str:
+        score = rng.randint(20, 95)
+        return json.dumps({
+            'demand_score': score,
+            'multiplier': round(0.8 + score / 100 * 1.2, 2),
+            'reasoning': f"Stub forecast: {score}% expected demand",
+            'peak_expected': score >= 75
+        })
+
+    def _respond_dynamic_price(self, prompt: str, rng: random.Random) -> str:
+        match = re.search(r'Base Price: \$?([\d.]+)', prompt)
+        base = float(match.group(1)) if match else 2.0
+        multiplier = round(rng.uniform(0.8, 1.5), 2)
+        return json.dumps({
+            'final_price': round(base * multiplier, 2),
+            'breakdown': {'base': base, 'time_multiplier': multiplier, 'weather_premium': 1.0,
+                          'event_premium': 1.0, 'feature_fees': 0},
+            'reasoning': f"Stub price: {multiplier}x base"
+        })
+
+    def _respond_fraud_detection(self, prompt: str, rng: random.Random) -> str:
+        score = rng.randint(0, 40)
+        return json.dumps({
+            'fraud_score': score,
+            'risk_level': 'low' if score < 25 else 'medium',
+            'flags': [],
+            'reasoning': "Stub assessment: normal payment pattern",
+            'recommend_action': 'approve' if score < 25 else 'review'
+        })
+
+    def _respond_dispute_investigation(self, prompt: str, rng: random.Random) -> str:
+        confidence = rng.randint(20, 90)
+        ruling = 'customer_wins' if confidence > 70 else 'operator_wins' if confidence < 30 else 'split_decision'
+        return json.dumps({
+            'confidence': confidence,
+            'ruling': ruling,
+            'reasoning': f"Stub ruling based on the submitted evidence ({confidence}% confidence)",
+            'evidence_summary': "Sensor and payment records reviewed",
+            'payout_distribution': {'customer_gets': '5 ADA', 'operator_gets': '5 ADA'}
+        })
+
+    def _respond_anomaly_detection(self, prompt: str, rng: random.Random) -> str:
+        score = rng.randint(0, 30)
+        return json.dumps({
+            'anomaly_score': score,
+            'detected_issues': [],
+            'risk_assessment': 'low',
+            'recommendation': 'monitor'
+        })
+
+    def _respond_aggregation(self, prompt: str, rng: random.Random) -> str:
+        return json.dumps({
+            'confidence': rng.randint(70, 98),
+            'reasoning': "Stub aggregation: spot, price and route are consistent"
+        })
+
+    def _respond_pricing_explanation(self, prompt: str, rng: random.Random) -> str:
+        match = re.search(r'TOTAL: ([\d.]+)', prompt)
+        total = match.group(1) if match else 'the quoted'
+        return f"Your total is {total} ADA, reflecting the current time of day and demand."
+
+    def _respond_route_directions(self, prompt: str, rng: random.Random) -> str:
+        match = re.search(r'Spot (\S+)', prompt)
+        spot = match.group(1) if match else 'your spot'
+        steps = [
+            "Step 1: Walk from the entrance towards the parking zones",
+            f"Step 2: Follow the signs to spot {spot}",
+            "Step 3: Your spot is on the left"
+        ]
+        if 'one per line' in prompt.lower():
+            return '\n'.join(steps)
+        return json.dumps(steps)
+
+    def _respond_route_tips(self, prompt: str, rng: random.Random) -> str:
+        return rng.choice([
+            "Use the marked pedestrian walkway.",
+            "Note your zone letter before you walk back.",
+            "The lift near the entrance saves a few minutes."
+        ])
+
+
+def create_backend(model_name: str):
+    """
+    Backend selected by LLM_BACKEND (gemini | stub)
+
+    Stub settings: LLM_STUB_LATENCY_MS, LLM_STUB_JITTER_MS,
+    LLM_STUB_FAILURE_RATE, LLM_STUB_FAIL_FAMILIES (comma-separated), LLM_STUB_SEED
+    """
+    backend = os.getenv('LLM_BACKEND', 'gemini').lower()
+
+    if backend == 'stub':
+        fail_families = [f.strip() for f in os.getenv('LLM_STUB_FAIL_FAMILIES', '').split(',') if f.strip()]
+        stub = StubBackend(
+            latency_ms=float(os.getenv('LLM_STUB_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('LLM_STUB_JITTER_MS', '0')),
+            failure_rate=float(os.getenv('LLM_STUB_FAILURE_RATE', '0')),
+            fail_families=fail_families,
+            seed=int(os.getenv('LLM_STUB_SEED', '0'))
+        )
+        logger.info(f"🧪 Using stub LLM backend (latency {stub.latency_ms}ms, failure rate {stub.failure_rate})")
+        return stub
+
+    if backend != 'gemini':
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r} (expected gemini or stub)")
+
+    return GeminiBackend(model_name)
@@ -0,0 +1,189 @@
+"""
+ParknGo - LLM Response Cache Module
+Prompt-level response cache for Gemini calls: normalised keys, TTLs, an
+in-memory LRU and an optional SQLite tier that survives restarts
+"""
+
+import os
+import json
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so indentation/blank-line differences share a key"""
+    return _WHITESPACE.sub(' ', prompt).strip()
+
+
+def make_cache_key(prompt: str, generation_config: Optional[Dict[str, Any]] = None, model: str = '') -> str:
+    """Stable key for a (model, normalised prompt, generation config) triple"""
+    payload = json.dumps(
+        {
+            'model': model,
+            'prompt': normalize_prompt(prompt),
+            'config': generation_config or {}
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of model completions
+
+    - Memory: OrderedDict LRU bounded by max_entries
+    - Disk (optional): SQLite table keyed by the same hash; hits are promoted
+      back into memory, so a restarted process warms up without model calls
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        default_ttl: float = 900.0,
+        db_path: Optional[str] = None
+    ):
+        """
+        Args:
+            max_entries: In-memory LRU bound
+            default_ttl: Seconds an entry stays valid when no TTL is given
+            db_path: SQLite file for the persistent tier (None = memory only)
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.db_path = db_path
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+            logger.info(f"✅ LLM response cache persisted to {db_path}")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ LLM cache disk tier disabled ({db_path}): {e}")
+            self._db = None
+
+    # ============================================
+    # LOOKUP / STORE
+    # ============================================
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached completion for key, or None on miss/expiry"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ LLM cache disk read failed: {e}")
+                    row = None
+
+                if row and row[1] > now:
+                    self._remember(key, row[0], row[1])
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Store a completion for ttl seconds (default_ttl when None)"""
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self.stats['stores'] += 1
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ LLM cache disk write failed: {e}")
+
+    def delete(self, key: str):
+        """Drop one entry (e.g. a response that failed validation)"""
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ LLM cache disk delete failed: {e}")
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        """Insert into the memory LRU (caller holds the lock)"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        """Drop every cached completion (both tiers)"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit rate"""
+        with self._lock:
+            hits = self.stats['memory_hits'] + self.stats['disk_hits']
+            lookups = hits + self.stats['misses']
+            return {
+                **self.stats,
+                'memory_entries': len(self._memory),
+                'persistent': self._db is not None,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def create_llm_cache() -> LLMResponseCache:
+    """Build the cache from LLM_CACHE_* environment variables"""
+    return LLMResponseCache(
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2048')),
+        default_ttl=float(os.getenv('LLM_CACHE_TTL', '900')),
+        db_path=os.getenv('LLM_CACHE_DB') or None
+    )
@@ -0,0 +1,182 @@
+"""
+ParknGo - LLM Metrics Module
+Per-method accounting of Gemini usage: calls, prompt/response tokens,
+latency histograms, retries, cache hits and fallback activations
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open-ended
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count (~4 characters per token) when the SDK reports none"""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def usage_from_response(response: Any, prompt: str, text: str) -> Dict[str, Any]:
+    """
+    Prompt/response token counts for a Gemini response
+
+    Uses the response's usage_metadata when the SDK provides it, otherwise
+    falls back to a character-based estimate (flagged as estimated).
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    response_tokens = getattr(usage, 'candidates_token_count', None)
+
+    if prompt_tokens is None or response_tokens is None:
+        return {
+            'prompt_tokens': estimate_tokens(prompt),
+            'response_tokens': estimate_tokens(text),
+            'estimated': True
+        }
+
+    return {'prompt_tokens': int(prompt_tokens), 'response_tokens': int(response_tokens), 'estimated': False}
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (not thread-safe; LLMMetrics locks)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = 0
+
+    def observe(self, latency_ms: float):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.counts[index] += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+        self.samples += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Bucket upper bound containing the given percentile (max for the overflow bucket)"""
+        if not self.samples:
+            return None
+
+        target = fraction * self.samples
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ['overflow']
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'samples': self.samples,
+            'avg_ms': round(self.total_ms / self.samples, 1) if self.samples else None,
+            'max_ms': round(self.max_ms, 1),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95)
+        }
+
+
+class LLMMetrics:
+    """Thread-safe per-purpose usage counters for model calls"""
+
+    def __init__(self):
+        self._methods: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _method(self, purpose: str) -> Dict[str, Any]:
+        """Counters for a calling method (caller holds the lock)"""
+        if purpose not in self._methods:
+            self._methods[purpose] = {
+                'calls': 0,
+                'errors': 0,
+                'retries': 0,
+                'streamed': 0,
+                'cache_hits': 0,
+                'fallbacks': 0,
+                'fallback_reasons': {},
+                'prompt_tokens': 0,
+                'response_tokens': 0,
+                'tokens_estimated': False,
+                'tokens_saved_by_cache': 0,
+                'latency': LatencyHistogram()
+            }
+        return self._methods[purpose]
+
+    def record_call(
+        self,
+        purpose: str,
+        latency_seconds: float,
+        usage: Optional[Dict[str, Any]] = None,
+        error: bool = False,
+        streamed: bool = False
+    ):
+        """One model attempt (successful or not)"""
+        with self._lock:
+            method = self._method(purpose)
+            method['calls'] += 1
+            method['latency'].observe(latency_seconds * 1000)
+
+            if error:
+                method['errors'] += 1
+            if streamed:
+                method['streamed'] += 1
+            if usage:
+                method['prompt_tokens'] += usage['prompt_tokens']
+                method['response_tokens'] += usage['response_tokens']
+                method['tokens_estimated'] = method['tokens_estimated'] or usage['estimated']
+
+    def record_retry(self, purpose: str):
+        with self._lock:
+            self._method(purpose)['retries'] += 1
+
+    def record_cache_hit(self, purpose: str, prompt: str, text: str):
+        """A response served from cache, with the (estimated) tokens it avoided"""
+        with self._lock:
+            method = self._method(purpose)
+            method['cache_hits'] += 1
+            method['tokens_saved_by_cache'] += estimate_tokens(prompt) + estimate_tokens(text)
+
+    def record_fallback(self, purpose: str, reason: str = 'error'):
+        """A caller used its rule-based result instead of the model's"""
+        with self._lock:
+            method = self._method(purpose)
+            method['fallbacks'] += 1
+            method['fallback_reasons'][reason] = method['fallback_reasons'].get(reason, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self.started_at = time.time()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-method counters plus totals across all methods"""
+        with self._lock:
+            methods = {}
+            for purpose, method in self._methods.items():
+                requests = method['calls'] - method['retries'] + method['cache_hits']
+                methods[purpose] = {
+                    **{k: v for k, v in method.items() if k not in ('latency', 'fallback_reasons')},
+                    'fallback_reasons': dict(method['fallback_reasons']),
+                    'total_tokens': method['prompt_tokens'] + method['response_tokens'],
+                    'cache_hit_rate': round(method['cache_hits'] / requests, 3) if requests > 0 else 0.0,
+                    'latency': method['latency'].snapshot()
+                }
+
+        totals = {
+            key: sum(m[key] for m in methods.values())
+            for key in ('calls', 'errors', 'retries', 'cache_hits', 'fallbacks',
+                        'prompt_tokens', 'response_tokens', 'total_tokens', 'tokens_saved_by_cache')
+        }
+
+        return {
+            'since': self.started_at,
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'totals': totals,
+            'methods': dict(sorted(methods.items(), key=lambda item: -item[1]['total_tokens']))
+        }
@@ -0,0 +1,377 @@
+"""
+ParknGo - Lot Layout Module
+Graph model of a parking garage (levels, ramps, elevators, aisles, bays)
+with cached Dijkstra shortest paths, for deterministic walking/driving
+directions and distances without a model call
+"""
+
+import os
+import re
+import json
+import heapq
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from services.spot_geometry import BAY_WIDTH_M
+
+logger = logging.getLogger(__name__)
+
+WALK = 'walk'
+DRIVE = 'drive'
+
+# Zone -> pedestrian entrance serving it (simulated lot)
+ENTRANCES = {
+    'A': {
+        'name': 'Main Entrance',
+        'description': 'Ground floor, near the security booth',
+        'coordinates': 'N1, Ground Level'
+    },
+    'B': {
+        'name': 'West Entrance',
+        'description': 'Second floor, elevator available',
+        'coordinates': 'W2, Level 2'
+    },
+    'C': {
+        'name': 'East Entrance',
+        'description': 'Third floor, stairs and elevator',
+        'coordinates': 'E3, Level 3'
+    }
+}
+
+# Generated layout: one level per zone, in this order (unknown zones stack above)
+ZONE_LEVELS = {'A': 0, 'B': 1, 'C': 2}
+
+# Generated layout dimensions (meters)
+RAMP_LENGTH_M = 60.0         # Driving ramp between adjacent levels
+ELEVATOR_COST_M = 25.0       # Walking-equivalent cost of one elevator hop (incl. waiting)
+GATE_TO_RAMP_M = 30.0        # Vehicle gate to the ground-level ramp foot
+RAMP_TO_AISLE_M = 20.0       # Ramp landing to the start of a level's aisle
+ENTRANCE_TO_CORE_M = 15.0    # Pedestrian entrance to the elevator core on its level
+CORE_TO_AISLE_M = 10.0       # Elevator core to the start of a level's aisle
+BAY_DEPTH_M = 3.0            # Aisle centre line to the middle of a bay
+
+_SPOT_ID = re.compile(r'^([A-Za-z]+)-?(\d+)$')
+
+
+def level_label(level: int) -> str:
+    return 'Ground Level' if level == 0 else f"Level {level + 1}"
+
+
+class LotLayout:
+    """
+    Undirected graph of a lot
+
+    Nodes carry a kind (gate, entrance, core, ramp, aisle, spot) and a
+    level; edges carry a length in meters, a kind (walkway, ramp,
+    elevator, aisle, bay) and the travel modes allowed on them.
+    """
+
+    def __init__(self, lot_id: str = 'default', version: Optional[str] = None):
+        self.lot_id = lot_id
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.adjacency: Dict[str, List[Tuple[str, float, str, Tuple[str, ...]]]] = {}
+        self.version = version
+
+    def add_node(self, node_id: str, kind: str, level: int = 0, **attrs):
+        self.nodes[node_id] = {'kind': kind, 'level': level, **attrs}
+        self.adjacency.setdefault(node_id, [])
+
+    def add_edge(self, a: str, b: str, length_m: float, kind: str, modes: Sequence[str] = (WALK, DRIVE)):
+        modes = tuple(modes)
+        self.adjacency[a].append((b, float(length_m), kind, modes))
+        self.adjacency[b].append((a, float(length_m), kind, modes))
+
+    def node_ids(self, kind: str) -> List[str]:
+        return [node_id for node_id, node in self.nodes.items() if node['kind'] == kind]
+
+    def has_spot(self, spot_id: str) -> bool:
+        return f"spot:{spot_id}" in self.nodes
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LotLayout':
+        """
+        Build from {'lot_id', 'nodes': {id: {kind, level, ...}},
+        'edges': [{a, b, length_m, kind, modes}]}; spot nodes are 'spot:<spot_id>'
+        """
+        canonical = json.dumps(data, sort_keys=True)
+        layout = cls(data.get('lot_id', 'default'), version=hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12])
+
+        for node_id, node in data['nodes'].items():
+            layout.add_node(node_id, **node)
+        for edge in data['edges']:
+            layout.add_edge(edge['a'], edge['b'], edge['length_m'], edge['kind'], edge.get('modes', (WALK, DRIVE)))
+        return layout
+
+
+class GeneratedLayout(LotLayout):
+    """
+    Default garage generated from zones and bay numbers
+
+    One level per zone, joined by driving ramps and a pedestrian elevator
+    core; each level has a single aisle with bays at BAY_WIDTH_M spacing.
+    Spots are added on first use; the path to a spot depends only on its
+    zone and bay number, so the layout version doesn't change as spots
+    are added.
+    """
+
+    def __init__(self, lot_id: str = 'default', entrances: Optional[Dict[str, Dict[str, str]]] = None):
+        self.entrances = entrances or ENTRANCES
+        version_source = json.dumps({
+            'entrances': self.entrances,
+            'levels': ZONE_LEVELS,
+            'dimensions': [RAMP_LENGTH_M, ELEVATOR_COST_M, GATE_TO_RAMP_M, RAMP_TO_AISLE_M,
+                           ENTRANCE_TO_CORE_M, CORE_TO_AISLE_M, BAY_DEPTH_M, BAY_WIDTH_M]
+        }, sort_keys=True)
+        super().__init__(lot_id, version='gen-' + hashlib.sha256(version_source.encode('utf-8')).hexdigest()[:12])
+
+        self.zone_levels = dict(ZONE_LEVELS)
+        self._aisle_length: Dict[str, int] = {}   # zone -> bays built
+
+        self.add_node('gate', 'gate', 0, name='Vehicle Gate')
+        for zone in self.entrances:
+            self._ensure_level(zone)
+
+    def _ensure_level(self, zone: str) -> int:
+        """Create a zone's level (ramps, core, entrance, aisle start) if missing"""
+        if zone not in self.zone_levels:
+            self.zone_levels[zone] = max(self.zone_levels.values(), default=-1) + 1
+        level = self.zone_levels[zone]
+
+        for below in range(level + 1):
+            ramp = f"ramp:{below}"
+            if ramp in self.nodes:
+                continue
+            self.add_node(ramp, 'ramp', below)
+            self.add_node(f"core:{below}", 'core', below)
+            if below == 0:
+                self.add_edge('gate', ramp, GATE_TO_RAMP_M, 'walkway', (DRIVE,))
+            else:
+                self.add_edge(f"ramp:{below - 1}", ramp, RAMP_LENGTH_M, 'ramp', (DRIVE,))
+                self.add_edge(f"core:{below - 1}", f"core:{below}", ELEVATOR_COST_M, 'elevator', (WALK,))
+
+        aisle = f"aisle:{zone}:0"
+        if aisle not in self.nodes:
+            self.add_node(aisle, 'aisle', level, zone=zone)
+            self.add_edge(f"ramp:{level}", aisle, RAMP_TO_AISLE_M, 'walkway', (DRIVE,))
+            self.add_edge(f"core:{level}", aisle, CORE_TO_AISLE_M, 'walkway', (WALK,))
+            self._aisle_length[zone] = 0
+
+            entrance = self.entrances.get(zone)
+            if entrance:
+                entrance_id = f"entrance:{zone}"
+                self.add_node(entrance_id, 'entrance', level, name=entrance['name'])
+                self.add_edge(entrance_id, f"core:{level}", ENTRANCE_TO_CORE_M, 'walkway', (WALK,))
+
+        return level
+
+    def add_spot(self, spot_id: str, zone: Optional[str] = None) -> bool:
+        """Add a spot (and the aisle up to it); False if its zone/bay can't be derived"""
+        if self.has_spot(spot_id):
+            return True
+
+        match = _SPOT_ID.match(spot_id or '')
+        if not match:
+            return False
+        zone = zone or match.group(1).upper()
+        bay = int(match.group(2))
+
+        level = self._ensure_level(zone)
+
+        for index in range(self._aisle_length[zone] + 1, bay + 1):
+            self.add_node(f"aisle:{zone}:{index}", 'aisle', level, zone=zone)
+            self.add_edge(f"aisle:{zone}:{index - 1}", f"aisle:{zone}:{index}", BAY_WIDTH_M, 'aisle')
+        self._aisle_length[zone] = max(self._aisle_length[zone], bay)
+
+        self.add_node(f"spot:{spot_id}", 'spot', level, zone=zone, spot_id=spot_id, side='left' if bay % 2 else 'right')
+        self.add_edge(f"aisle:{zone}:{bay}", f"spot:{spot_id}", BAY_DEPTH_M, 'bay')
+        return True
+
+
+class RoutingEngine:
+    """
+    Shortest paths over a lot layout
+
+    Each (source set, mode) gets one Dijkstra tree, cached until the graph
+    changes; with a handful of entrances and one gate that amounts to
+    all-pairs results for every spot in the lot.
+    """
+
+    def __init__(self, layout: LotLayout):
+        self.layout = layout
+        self._trees: Dict[Tuple[Tuple[str, ...], str], Tuple[Dict[str, float], Dict[str, Tuple[str, str]]]] = {}
+        self._lock = threading.RLock()
+        self.stats = {'routes': 0, 'trees_built': 0}
+
+    def invalidate(self):
+        with self._lock:
+            self._trees.clear()
+
+    def _tree(self, sources: Tuple[str, ...], mode: str):
+        """(distance, previous) for every node reachable from the nearest source"""
+        key = (sources, mode)
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is not None:
+                return tree
+
+            distance: Dict[str, float] = {source: 0.0 for source in sources}
+            previous: Dict[str, Tuple[str, str]] = {}
+            queue = [(0.0, source) for source in sources]
+            heapq.heapify(queue)
+
+            while queue:
+                cost, node = heapq.heappop(queue)
+                if cost > distance.get(node, float('inf')):
+                    continue
+                for neighbour, length, kind, modes in self.layout.adjacency[node]:
+                    if mode not in modes:
+                        continue
+                    candidate = cost + length
+                    if candidate < distance.get(neighbour, float('inf')):
+                        distance[neighbour] = candidate
+                        previous[neighbour] = (node, kind)
+                        heapq.heappush(queue, (candidate, neighbour))
+
+            tree = (distance, previous)
+            self._trees[key] = tree
+            self.stats['trees_built'] += 1
+            return tree
+
+    def route(self, sources: Sequence[str], target: str, mode: str) -> Optional[Dict[str, Any]]:
+        """
+        Shortest path from the nearest of `sources` to `target`
+
+        Returns:
+            {'path': [node ids], 'edges': [(from, to, kind, length_m)],
+             'distance_m': float} or None if unreachable
+        """
+        distance, previous = self._tree(tuple(sorted(sources)), mode)
+        if target not in distance:
+            return None
+
+        edges = []
+        node = target
+        while node in previous:
+            parent, kind = previous[node]
+            edges.append((parent, node, kind, distance[node] - distance[parent]))
+            node = parent
+        edges.reverse()
+
+        self.stats['routes'] += 1
+        return {
+            'path': [node] + [edge[1] for edge in edges],
+            'edges': edges,
+            'distance_m': round(distance[target], 1)
+        }
+
+    def describe(self, route: Dict[str, Any], mode: str) -> List[str]:
+        """Deterministic step-by-step directions for a route"""
+        nodes = self.layout.nodes
+        steps: List[str] = []
+
+        start = nodes[route['path'][0]]
+        if start['kind'] == 'entrance':
+            steps.append(f"Enter through the {start['name']} ({level_label(start['level'])})")
+        elif start['kind'] == 'gate':
+            steps.append(f"Drive in through the {start['name']}")
+
+        # Merge consecutive edges of the same kind into one instruction
+        groups: List[List[Any]] = []
+        for source, target, kind, length in route['edges']:
+            if groups and groups[-1][0] == kind:
+                groups[-1][1] = target
+                groups[-1][2] += length
+            else:
+                groups.append([kind, target, length])
+
+        for kind, target, length in groups:
+            node = nodes[target]
+            if kind == 'elevator':
+                steps.append(f"Take the elevator to {level_label(node['level'])}")
+            elif kind == 'ramp':
+                steps.append(f"Drive up the ramps to {level_label(node['level'])}")
+            elif kind == 'walkway' and node['kind'] == 'aisle':
+                verb = 'Turn into' if mode == DRIVE else 'Walk to'
+                steps.append(f"{verb} the Zone {node['zone']} aisle")
+            elif kind == 'aisle':
+                steps.append(f"Continue {round(length)} m along the aisle")
+            elif kind == 'bay':
+                steps.append(f"Spot {node['spot_id']} is on your {node['side']}")
+
+        return [f"Step {number}: {step}" for number, step in enumerate(steps, 1)]
+
+
+class LotRouter:
+    """Routing engines per lot (the generated default lot, or layouts loaded from JSON)"""
+
+    def __init__(self, layout_path: Optional[str] = None):
+        self._engines: Dict[str, RoutingEngine] = {}
+        self._lock = threading.Lock()
+
+        layout = GeneratedLayout()
+        if layout_path:
+            try:
+                with open(layout_path) as layout_file:
+                    layout = LotLayout.from_dict(json.load(layout_file))
+                logger.info(f"✅ Lot layout {layout.lot_id} loaded from {layout_path} ({len(layout.nodes)} nodes)")
+            except Exception as e:
+                logger.error(f"❌ Failed to load lot layout {layout_path}, using generated layout: {e}")
+                layout = GeneratedLayout()
+
+        self.default_lot = layout.lot_id
+        self._engines[layout.lot_id] = RoutingEngine(layout)
+
+    def add_layout(self, layout: LotLayout):
+        with self._lock:
+            self._engines[layout.lot_id] = RoutingEngine(layout)
+
+    def engine(self, lot_id: Optional[str] = None) -> RoutingEngine:
+        return self._engines[lot_id or self.default_lot]
+
+    def version(self, lot_id: Optional[str] = None) -> str:
+        return self.engine(lot_id).layout.version
+
+    def route_to_spot(self, spot_data: Dict[str, Any], lot_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Walking route from the nearest pedestrian entrance and driving route
+        from the vehicle gate to a spot
+
+        Returns:
+            {'entrance', 'walking': {...}, 'driving': {...} or None} or None
+            if the spot isn't in (and can't be added to) the layout
+        """
+        engine = self.engine(lot_id)
+        layout = engine.layout
+        spot_id = spot_data.get('spot_id')
+
+        with engine._lock:
+            if not layout.has_spot(spot_id):
+                if not isinstance(layout, GeneratedLayout) or not layout.add_spot(spot_id, spot_data.get('zone')):
+                    return None
+                # New nodes: cached trees don't reach them yet
+                engine.invalidate()
+
+        target = f"spot:{spot_id}"
+        walking = engine.route(layout.node_ids('entrance'), target, WALK)
+        if walking is None:
+            return None
+        driving = engine.route(layout.node_ids('gate'), target, DRIVE)
+
+        return {
+            'entrance': layout.nodes[walking['path'][0]].get('name'),
+            'level': level_label(layout.nodes[target]['level']),
+            'walking': {**walking, 'directions': engine.describe(walking, WALK)},
+            'driving': {**driving, 'directions': engine.describe(driving, DRIVE)} if driving else None
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            lot_id: {**engine.stats, 'nodes': len(engine.layout.nodes), 'version': engine.layout.version}
+            for lot_id, engine in self._engines.items()
+        }
+
+
+# Singleton instance
+lot_router = LotRouter(layout_path=os.getenv('LOT_LAYOUT_PATH') or None)
@@ -6,7 +6,7 @@ Handles distributing earnings to individual agent wallets on Cardano mainnet
 import os
 import logging
 from typing import Dict, Optional
-from services import firebase_service
+from services.firebase_service import firebase_service
 
 logger = logging.getLogger(__name__)
 
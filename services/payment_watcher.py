@@ -0,0 +1,374 @@
+"""
+ParknGo - Payment Watcher Service Module
+Incremental address-level payment detection: a cursor per watched address,
+paging only through new transactions and matching their outputs to pending
+payments by amount and datum
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from services.blockfrost_service import blockfrost_service
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentWatcher:
+    """
+    Watches payment addresses for incoming transactions
+
+    Every address keeps a cursor into its ascending transaction list, so each
+    poll costs one page request plus one UTxO lookup per *new* transaction,
+    regardless of how long the address history is. Pending payments are
+    indexed by address and amount, which keeps matching O(outputs) even with
+    thousands of open reservations.
+
+    A detected payment stays queryable (get_match / wait_for_payment) for
+    match_ttl seconds, then all of its state is dropped; cancelled payments
+    are dropped immediately.
+    """
+
+    def __init__(
+        self,
+        chain_data,
+        page_size: int = 100,
+        min_confirmations: int = 1,
+        clock_skew: float = 120.0,
+        match_ttl: float = 3600.0
+    ):
+        """
+        Args:
+            chain_data: BlockfrostService-compatible client
+            page_size: Transactions requested per page
+            min_confirmations: Depth at which a match counts as confirmed
+            clock_skew: Seconds a block may predate a payment's registration
+                and still match it (older transactions are never matched)
+            match_ttl: Seconds a detected payment stays queryable
+        """
+        self.chain_data = chain_data
+        self.page_size = page_size
+        self.min_confirmations = min_confirmations
+        self.clock_skew = clock_skew
+        self.match_ttl = match_ttl
+
+        # address -> {'page': int, 'offset': int}
+        self._cursors: Dict[str, Dict[str, int]] = {}
+        # address -> amount (None = any amount) -> FIFO of payment ids
+        self._pending: Dict[str, Dict[Optional[int], Deque[str]]] = {}
+        # payment_id -> expectation / match
+        self._expected: Dict[str, Dict[str, Any]] = {}
+        self._matches: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._callbacks: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        # payment_id -> detected_at, oldest first
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+        self._lock = threading.RLock()
+        self._address_locks: Dict[str, threading.Lock] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ============================================
+    # PENDING PAYMENTS
+    # ============================================
+
+    def expect_payment(
+        self,
+        payment_id: str,
+        address: str,
+        amount_lovelace: Optional[int] = None,
+        datum_hash: Optional[str] = None,
+        callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> bool:
+        """
+        Register a pending payment
+
+        Args:
+            payment_id: Reservation / Masumi payment id
+            address: Address the customer pays to
+            amount_lovelace: Exact amount to match (None = first unclaimed output)
+            datum_hash: Optional datum hash the output must carry
+            callback: Called with the match once the payment is detected
+        Returns:
+            False if the payment was already registered
+        """
+        with self._lock:
+            if payment_id in self._matches:
+                if callback:
+                    callback(dict(self._matches[payment_id]))
+                return False
+
+            if callback:
+                self._callbacks.setdefault(payment_id, []).append(callback)
+
+            if payment_id in self._expected:
+                return False
+
+            self._expected[payment_id] = {
+                'payment_id': payment_id,
+                'address': address,
+                'amount_lovelace': amount_lovelace,
+                'datum_hash': datum_hash,
+                'registered_at': time.time()
+            }
+            self._pending.setdefault(address, {}).setdefault(amount_lovelace, deque()).append(payment_id)
+            self._events.setdefault(payment_id, threading.Event())
+            self._cursors.setdefault(address, {'page': 1, 'offset': 0})
+            return True
+
+    def cancel(self, payment_id: str):
+        """Stop watching for a payment (e.g. reservation expired) and drop its state"""
+        with self._lock:
+            expected = self._expected.pop(payment_id, None)
+            self._callbacks.pop(payment_id, None)
+            self._matches.pop(payment_id, None)
+            self._finished.pop(payment_id, None)
+            event = self._events.pop(payment_id, None)
+
+            if expected:
+                self._unqueue(expected['address'], expected['amount_lovelace'], payment_id)
+
+        # Wake anyone still waiting; they get None
+        if event:
+            event.set()
+
+    def get_match(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        """Detected payment for payment_id, with up-to-date confirmations"""
+        with self._lock:
+            match = self._matches.get(payment_id)
+            if not match:
+                return None
+            match = dict(match)
+
+        match['confirmations'] = self._confirmations(match['block_height'])
+        match['confirmed'] = match['confirmations'] >= self.min_confirmations
+        return match
+
+    def wait_for_payment(self, payment_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the background watcher detects the payment (or timeout)"""
+        with self._lock:
+            event = self._events.get(payment_id)
+        if event is not None:
+            event.wait(timeout)
+        return self.get_match(payment_id)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(q) for by_amount in self._pending.values() for q in by_amount.values())
+
+    # ============================================
+    # POLLING
+    # ============================================
+
+    def poll_address(self, address: str) -> int:
+        """
+        Process transactions that arrived since the last poll of an address
+
+        Returns:
+            Number of pending payments matched in this poll
+        """
+        with self._lock:
+            address_lock = self._address_locks.setdefault(address, threading.Lock())
+            cursor = self._cursors.setdefault(address, {'page': 1, 'offset': 0})
+
+        matched = 0
+
+        # One poller per address at a time keeps the cursor consistent
+        with address_lock:
+            while True:
+                page = self.chain_data.get_address_transactions(
+                    address,
+                    page=cursor['page'],
+                    count=self.page_size,
+                    order='asc'
+                )
+
+                for tx in page[cursor['offset']:]:
+                    matched += self._process_transaction(address, tx)
+                    cursor['offset'] += 1
+
+                if len(page) < self.page_size:
+                    break
+
+                # Page is full and fully consumed: move to the next one
+                cursor['page'] += 1
+                cursor['offset'] = 0
+
+        return matched
+
+    def poll_all(self) -> Dict[str, Any]:
+        """Poll every address that still has pending payments"""
+        self._expire_finished()
+
+        with self._lock:
+            addresses = [
+                address for address, by_amount in self._pending.items()
+                if any(by_amount.values())
+            ]
+
+        matched = 0
+        errors = 0
+        for address in addresses:
+            try:
+                matched += self.poll_address(address)
+            except Exception as e:
+                errors += 1
+                logger.error(f"❌ Payment watcher poll failed for {address[:20]}...: {e}")
+
+        return {
+            'addresses_polled': len(addresses),
+            'payments_matched': matched,
+            'pending_payments': self.pending_count(),
+            'errors': errors
+        }
+
+    def start(self, interval: float = 20.0):
+        """Poll all watched addresses in a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.poll_all()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='payment-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Payment watcher started (every {interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    # ============================================
+    # MATCHING
+    # ============================================
+
+    def _process_transaction(self, address: str, tx: Dict[str, Any]) -> int:
+        """Match outputs of one new transaction against pending payments"""
+        block_time = tx.get('block_time') or time.time()
+
+        with self._lock:
+            pending_ids = [pid for q in self._pending.get(address, {}).values() for pid in q]
+            if not pending_ids:
+                return 0
+            oldest = min(self._expected[pid]['registered_at'] for pid in pending_ids)
+
+        # History from before any pending payment existed: skip without a UTxO lookup
+        if block_time < oldest - self.clock_skew:
+            return 0
+
+        tx_hash = tx.get('tx_hash')
+        utxos = self.chain_data.get_transaction_utxos(tx_hash) or {}
+        matched = 0
+
+        for output in utxos.get('outputs', []):
+            if output.get('address') != address:
+                continue
+
+            lovelace = next(
+                (int(a['quantity']) for a in output.get('amount', []) if a.get('unit') == 'lovelace'),
+                0
+            )
+            datum = output.get('data_hash') or output.get('inline_datum')
+
+            payment_id = self._claim(address, lovelace, datum, block_time)
+            if payment_id is None:
+                continue
+
+            self._record_match(payment_id, {
+                'payment_id': payment_id,
+                'address': address,
+                'tx_hash': tx_hash,
+                'output_index': output.get('output_index'),
+                'amount_lovelace': lovelace,
+                'datum_hash': datum,
+                'block_height': tx.get('block_height'),
+                'block_time': tx.get('block_time'),
+                'detected_at': time.time()
+            })
+            matched += 1
+
+        return matched
+
+    def _claim(self, address: str, lovelace: int, datum: Optional[str], block_time: float) -> Optional[str]:
+        """Pop the oldest pending payment this output satisfies"""
+        with self._lock:
+            by_amount = self._pending.get(address, {})
+
+            for amount_key in (lovelace, None):
+                queue = by_amount.get(amount_key)
+                if not queue:
+                    continue
+                for payment_id in queue:
+                    expected = self._expected[payment_id]
+                    if block_time < expected['registered_at'] - self.clock_skew:
+                        continue
+                    if expected['datum_hash'] is None or expected['datum_hash'] == datum:
+                        self._unqueue(address, amount_key, payment_id)
+                        return payment_id
+
+        return None
+
+    def _unqueue(self, address: str, amount_key: Optional[int], payment_id: str):
+        """Remove a payment from the pending index, dropping empty queues (caller holds the lock)"""
+        by_amount = self._pending.get(address, {})
+        queue = by_amount.get(amount_key)
+        if queue and payment_id in queue:
+            queue.remove(payment_id)
+        if queue is not None and not queue:
+            del by_amount[amount_key]
+
+        # Masumi hands out an address per payment: forget addresses with
+        # nothing left to match (an in-flight poll keeps its own cursor)
+        if not by_amount:
+            self._pending.pop(address, None)
+            self._cursors.pop(address, None)
+            self._address_locks.pop(address, None)
+
+    def _record_match(self, payment_id: str, match: Dict[str, Any]):
+        with self._lock:
+            self._matches[payment_id] = match
+            self._expected.pop(payment_id, None)
+            self._finished[payment_id] = match['detected_at']
+            callbacks = list(self._callbacks.pop(payment_id, []))
+            event = self._events.setdefault(payment_id, threading.Event())
+
+        logger.info(f"💰 Payment {payment_id} detected in tx {match['tx_hash'][:16]}...")
+        event.set()
+
+        for callback in callbacks:
+            try:
+                callback(dict(match))
+            except Exception as e:
+                logger.error(f"❌ Payment watcher callback failed for {payment_id}: {e}")
+
+    def _expire_finished(self):
+        """Drop detected payments older than match_ttl"""
+        cutoff = time.time() - self.match_ttl
+
+        with self._lock:
+            while self._finished:
+                payment_id, detected_at = next(iter(self._finished.items()))
+                if detected_at > cutoff:
+                    break
+                del self._finished[payment_id]
+                self._matches.pop(payment_id, None)
+                self._events.pop(payment_id, None)
+                self._callbacks.pop(payment_id, None)
+
+    def _confirmations(self, block_height: Optional[int]) -> int:
+        if block_height is None:
+            return 0
+        try:
+            tip = self.chain_data.get_latest_block() or {}
+            return max(int(tip.get('height', block_height)) - int(block_height) + 1, 1)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fetch chain tip: {e}")
+            return 1
+
+
+# Singleton instance
+payment_watcher = PaymentWatcher(blockfrost_service)
@@ -0,0 +1,398 @@
+"""
+ParknGo - Rate Cards Module
+Table-driven pricing: hourly rates per zone, spot type and feature set for
+every 15-minute slot, precomputed from the time rules, the demand forecast
+table, the historical demand model and zone occupancy, so a quote is a
+table lookup and a sum
+"""
+
+import os
+import math
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from services.demand_forecast import DemandForecastService, bucket_for, classify_weather, demand_forecast_service
+from services.demand_model import DemandModel, demand_model
+from services.spatial_index import spot_index
+
+logger = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 60 // SLOT_MINUTES
+SLOTS_PER_DAY = 24 * SLOTS_PER_HOUR
+
+# Base prices (ADA per hour)
+BASE_PRICES = {
+    'regular': 0.5,
+    'premium': 0.75,
+    'disabled': 0.5   # Same as regular
+}
+DEFAULT_BASE_PRICE = 0.5
+
+# Flat per-booking feature premiums (ADA)
+FEATURE_PRICES = {
+    'covered': 0.1,
+    'ev_charging': 0.2,
+    'disabled_access': 0.0,  # No premium for accessibility
+    'security_camera': 0.05,
+    'well_lit': 0.05
+}
+
+
+def time_multiplier(when: datetime) -> float:
+    """Peak/weekend/night pricing multiplier for a moment in time"""
+    hour = when.hour
+    is_weekend = when.weekday() >= 5
+
+    # Peak hours (8-10am, 5-7pm on weekdays)
+    if not is_weekend and ((8 <= hour <= 10) or (17 <= hour <= 19)):
+        return 1.3
+
+    # Weekend premium
+    if is_weekend and (10 <= hour <= 20):
+        return 1.2
+
+    # Night discount
+    if hour < 6 or hour > 22:
+        return 0.8
+
+    # Normal hours
+    return 1.0
+
+
+def fallback_demand(hour: int) -> Dict[str, Any]:
+    """Rule-based demand when no forecast is available for the hour"""
+
+    # Peak hours: 8-10am, 5-7pm
+    if (8 <= hour <= 10) or (17 <= hour <= 19):
+        return {
+            'demand_score': 80,
+            'demand_multiplier': 1.4,
+            'reasoning': 'Peak hours (high demand)',
+            'peak_expected': True
+        }
+    # Normal hours
+    elif 7 <= hour <= 21:
+        return {
+            'demand_score': 50,
+            'demand_multiplier': 1.0,
+            'reasoning': 'Normal demand',
+            'peak_expected': False
+        }
+    # Off-peak hours
+    else:
+        return {
+            'demand_score': 20,
+            'demand_multiplier': 0.8,
+            'reasoning': 'Off-peak hours (low demand)',
+            'peak_expected': False
+        }
+
+
+def feature_premium(features: Sequence[str]) -> float:
+    return sum(FEATURE_PRICES.get(feature, 0.0) for feature in features or [])
+
+
+def slot_start(when: datetime) -> datetime:
+    """Start of the 15-minute slot containing `when`"""
+    return when.replace(minute=when.minute - when.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+# (zone, spot type, sorted features, weather class, event nearby, occupancy decile)
+CardKey = Tuple[Optional[str], str, Tuple[str, ...], str, bool, Optional[int]]
+
+
+class RateCardEngine:
+    """
+    Precomputed rate cards
+
+    A card holds the hourly rate for every 15-minute slot from the current
+    slot to the horizon, for one pricing context. Cards are keyed by the
+    context, including the zone's occupancy decile, so an occupancy change
+    that moves a zone to another decile switches its quotes to a fresh
+    card. All cards are rebuilt when the current slot rolls over.
+
+    Demand comes from the demand forecast table (never the model): the
+    current hour marks its bucket in use so the refresher keeps it warm,
+    later hours are read if already computed. Hours without a forecast use
+    the historical demand model, then the rule-based demand.
+
+    Bookings longer than the horizon repeat the card's last day (each slot
+    past the horizon is charged the rate of the same time one day earlier),
+    or the whole card if the horizon is shorter than a day.
+    """
+
+    def __init__(
+        self,
+        forecasts: DemandForecastService,
+        history: Optional[DemandModel] = None,
+        horizon_hours: float = 24.0,
+        occupancy_source: Optional[Callable[[], Dict[str, float]]] = None,
+        clock: Callable[[], datetime] = datetime.now
+    ):
+        """
+        Args:
+            forecasts: Demand forecast table
+            history: Hour-of-week demand model for hours without a forecast
+            horizon_hours: Hours each card prices from demand data; longer
+                           bookings are extrapolated from the card
+            occupancy_source: () -> {zone: occupied fraction}; None = use the
+                              request's occupancy_rate only
+            clock: Current local time (injectable for replay/benchmarks)
+        """
+        self.forecasts = forecasts
+        self.history = history
+        self.horizon_slots = max(int(math.ceil(horizon_hours * SLOTS_PER_HOUR)), 1)
+        self.occupancy_source = occupancy_source
+        self.clock = clock
+
+        self._slot: Optional[datetime] = None
+        self._cards: Dict[CardKey, Dict[str, Any]] = {}
+        self._zone_occupancy: Dict[str, float] = {}
+        self._occupancy_dirty = True
+        self._lock = threading.Lock()
+
+        self.stats = {'quotes': 0, 'card_hits': 0, 'cards_built': 0, 'rollovers': 0, 'occupancy_refreshes': 0}
+
+    # ============================================
+    # OCCUPANCY
+    # ============================================
+
+    def occupancy_changed(self):
+        """Spot occupancy changed; zone occupancy is re-read on the next quote"""
+        self._occupancy_dirty = True
+
+    def _zone_decile(self, zone: Optional[str], occupancy_rate: Optional[float]) -> Optional[int]:
+        """Occupancy decile for a quote (caller holds the lock)"""
+        if self.occupancy_source is not None and self._occupancy_dirty:
+            self._occupancy_dirty = False
+            try:
+                self._zone_occupancy = self.occupancy_source() or {}
+                self.stats['occupancy_refreshes'] += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Zone occupancy unavailable: {e}")
+
+        rate = self._zone_occupancy.get(zone, occupancy_rate)
+        if rate is None:
+            return None
+        return min(int(max(rate, 0.0) * 10), 9)
+
+    # ============================================
+    # QUOTES
+    # ============================================
+
+    def quote(
+        self,
+        spot_data: Dict[str, Any],
+        duration_hours: float,
+        request_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Price a booking starting now from the spot's rate card
+
+        Returns:
+            {'base_price', 'duration_hours', 'time_multiplier',
+             'demand_multiplier', 'demand_reasoning', 'demand_score',
+             'feature_premium', 'total_price', 'rate_card': {...}}
+        """
+        card, key = self._card(spot_data, request_data or {})
+        current = card['current']
+        rates = card['hourly']
+        premium = card['feature_premium']
+
+        return {
+            'base_price': card['base_price'],
+            'duration_hours': duration_hours,
+            'time_multiplier': current['time_multiplier'],
+            'demand_multiplier': current['demand_multiplier'],
+            'demand_reasoning': current['reasoning'],
+            'demand_score': current['demand_score'],
+            'feature_premium': premium,
+            'total_price': self._price(card, duration_hours),
+            'rate_card': {
+                'slot': card['slot'].isoformat(),
+                'current_hourly_rate': round(rates[0], 4),
+                'occupancy_decile': key[5],
+                'demand_source': current['source']
+            }
+        }
+
+    def quote_matrix(
+        self,
+        spots: Sequence[Dict[str, Any]],
+        durations: Sequence[float],
+        request_data: Optional[Dict[str, Any]] = None
+    ) -> List[List[float]]:
+        """
+        Total prices for every spot x duration, starting now
+
+        Each spot's card is resolved once (spots sharing a pricing context
+        share a card) and every duration is a prefix-sum lookup on it.
+
+        Returns:
+            prices[i][j] = total price of spots[i] for durations[j]
+        """
+        request_data = request_data or {}
+        matrix = []
+        for spot_data in spots:
+            card, _ = self._card(spot_data, request_data)
+            matrix.append([self._price(card, duration) for duration in durations])
+        return matrix
+
+    def _price(self, card: Dict[str, Any], duration_hours: float) -> float:
+        """Total price of a booking from a card: slot rates over the duration plus features"""
+        duration = max(float(duration_hours), 0.0)
+        slots = duration * SLOTS_PER_HOUR
+        whole = int(slots)
+
+        # Each slot is a quarter hour at that slot's hourly rate; the last
+        # partial slot is charged pro rata
+        parking = self._cumulative(card, whole) / SLOTS_PER_HOUR
+        if slots > whole:
+            parking += self._slot_rate(card, whole) * (slots - whole) / SLOTS_PER_HOUR
+
+        return round(parking + card['feature_premium'], 2)
+
+    @staticmethod
+    def _cycle(card: Dict[str, Any]) -> Tuple[int, int]:
+        """(first slot, length) of the part of a card repeated past its horizon"""
+        length = min(len(card['hourly']), SLOTS_PER_DAY)
+        return len(card['hourly']) - length, length
+
+    def _slot_rate(self, card: Dict[str, Any], index: int) -> float:
+        """Hourly rate of slot `index` (past the horizon, the repeated cycle's rate)"""
+        rates = card['hourly']
+        if index < len(rates):
+            return rates[index]
+        first, length = self._cycle(card)
+        return rates[first + (index - len(rates)) % length]
+
+    def _cumulative(self, card: Dict[str, Any], slots: int) -> float:
+        """Sum of the first `slots` slot rates (whole cycles past the horizon in O(1))"""
+        cumulative = card['cumulative']
+        horizon = len(card['hourly'])
+        if slots <= horizon:
+            return cumulative[slots]
+        first, length = self._cycle(card)
+        cycles, remainder = divmod(slots - horizon, length)
+        cycle_total = cumulative[horizon] - cumulative[first]
+        return cumulative[horizon] + cycles * cycle_total + cumulative[first + remainder] - cumulative[first]
+
+    def card(self, spot_data: Dict[str, Any], request_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """The rate card a spot would be quoted from"""
+        return self._card(spot_data, request_data or {})[0]
+
+    def _card(self, spot_data: Dict[str, Any], request_data: Dict[str, Any]) -> Tuple[Dict[str, Any], CardKey]:
+        now = slot_start(self.clock())
+        weather = request_data.get('weather', 'sunny')  # In production, integrate weather API
+        has_event = bool(request_data.get('special_events'))  # In production, check events calendar
+
+        with self._lock:
+            if now != self._slot:
+                if self._slot is not None:
+                    self.stats['rollovers'] += 1
+                self._slot = now
+                self._cards.clear()
+
+            zone = spot_data.get('zone')
+            key: CardKey = (
+                zone,
+                spot_data.get('type', 'regular'),
+                tuple(sorted(set(spot_data.get('features') or []))),
+                classify_weather(weather),
+                has_event,
+                self._zone_decile(zone, request_data.get('occupancy_rate'))
+            )
+
+            self.stats['quotes'] += 1
+            card = self._cards.get(key)
+            if card is not None:
+                self.stats['card_hits'] += 1
+                return card, key
+
+            card = self._build(now, key, weather)
+            self._cards[key] = card
+            self.stats['cards_built'] += 1
+            return card, key
+
+    def _build(self, start: datetime, key: CardKey, weather: str) -> Dict[str, Any]:
+        """Hourly rate for every slot of the horizon (caller holds the lock)"""
+        _, spot_type, features, _, has_event, decile = key
+        base_price = BASE_PRICES.get(spot_type, DEFAULT_BASE_PRICE)
+        occupancy_rate = decile / 10 + 0.05 if decile is not None else None
+
+        demand_by_hour: Dict[datetime, Dict[str, Any]] = {}
+        hourly: List[float] = []
+
+        for index in range(self.horizon_slots):
+            when = start + timedelta(minutes=SLOT_MINUTES * index)
+            hour = when.replace(minute=0)
+
+            demand = demand_by_hour.get(hour)
+            if demand is None:
+                bucket = bucket_for(when, weather, has_event, occupancy_rate)
+                # Only the current hour keeps its forecast bucket warm
+                forecast = self.forecasts.get_forecast(bucket) if index == 0 else self.forecasts.peek(bucket)
+                historical = self.history.forecast(when) if not forecast and self.history is not None else None
+                if forecast:
+                    demand = {**forecast, 'source': 'forecast'}
+                elif historical:
+                    demand = {**historical, 'source': 'history'}
+                else:
+                    demand = {**fallback_demand(when.hour), 'source': 'rules'}
+                demand_by_hour[hour] = demand
+
+            multiplier = time_multiplier(when)
+            hourly.append(base_price * multiplier * demand['demand_multiplier'])
+
+            if index == 0:
+                current = {
+                    'time_multiplier': multiplier,
+                    'demand_multiplier': demand['demand_multiplier'],
+                    'reasoning': demand.get('reasoning'),
+                    'demand_score': demand.get('demand_score', 50),
+                    'source': demand['source']
+                }
+
+        # Prefix sums, so pricing any duration is O(1)
+        cumulative = [0.0]
+        for rate in hourly:
+            cumulative.append(cumulative[-1] + rate)
+
+        return {
+            'slot': start,
+            'base_price': base_price,
+            'feature_premium': round(feature_premium(features), 2),
+            'hourly': hourly,
+            'cumulative': cumulative,
+            'current': current
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'cards': len(self._cards),
+                'slot': self._slot.isoformat() if self._slot else None,
+                'horizon_slots': self.horizon_slots,
+                'card_hit_rate': round(self.stats['card_hits'] / self.stats['quotes'], 3) if self.stats['quotes'] else 0.0
+            }
+
+
+def _index_occupancy() -> Dict[str, float]:
+    """Zone occupancy from the spatial index, once it has synced"""
+    return spot_index.zone_occupancy() if spot_index.ready else {}
+
+
+# Singleton instance
+rate_card_engine = RateCardEngine(
+    demand_forecast_service,
+    history=demand_model,
+    horizon_hours=float(os.getenv('RATE_CARD_HORIZON_HOURS', '24')),
+    occupancy_source=_index_occupancy
+)
+
+# Occupancy changes arrive through the spatial index's Firebase listener
+spot_index.subscribe(rate_card_engine.occupancy_changed)
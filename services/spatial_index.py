@@ -0,0 +1,337 @@
+"""
+ParknGo - Spatial Index Module
+Grid index over available spots, kept current from spot-state changes, so
+nearest-available-spot queries only look at the user's neighbourhood
+instead of the whole parking_spots table
+"""
+
+import os
+import math
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from services.spot_geometry import SpotGeometryStore, spot_geometry_store
+
+logger = logging.getLogger(__name__)
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+CellKey = Tuple[int, int]
+
+
+class SpotSpatialIndex:
+    """
+    Fixed-size lat/lng grid of available spots
+
+    Positions and feature bitmasks live in the SpotGeometryStore; the index
+    only maps grid cells to the available spot ids inside them. Queries
+    search rings of cells outwards from the user and stop once no unseen
+    cell can hold a closer spot than the k-th found. Users far from the lot
+    would walk mostly empty rings, so once the ring walk would cost more
+    than visiting every occupied cell, the remaining cells are scanned
+    directly.
+    """
+
+    def __init__(self, store: SpotGeometryStore, cell_size_m: float = 100.0):
+        """
+        Args:
+            store: Geometry store holding positions and features
+            cell_size_m: Grid cell edge length in meters
+        """
+        self.store = store
+        self.cell_size_m = cell_size_m
+
+        # Cell width in degrees, fixed at the lot entrance's latitude
+        self._cell_lat = cell_size_m / METERS_PER_DEGREE_LAT
+        self._cell_lng = cell_size_m / (METERS_PER_DEGREE_LAT * math.cos(math.radians(store.entrance[0])))
+
+        self._cells: Dict[CellKey, Set[str]] = {}
+        self._cell_of: Dict[str, CellKey] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._bounds: Optional[List[int]] = None   # [min_x, max_x, min_y, max_y] of used cells
+
+        self.ready = False
+        self._listening = False
+        self._lock = threading.RLock()
+        self._subscribers: List[Callable[[], None]] = []
+
+        self.stats = {'queries': 0, 'cells_scanned': 0, 'updates': 0, 'full_syncs': 0}
+
+    # ============================================
+    # UPDATES
+    # ============================================
+
+    def sync_all(self, spots: Any):
+        """Replace the index contents with the full parking_spots table"""
+        items = spots.items() if isinstance(spots, dict) else ((s.get('spot_id'), s) for s in spots)
+
+        with self._lock:
+            for spot_id in list(self._records):
+                self.store.remove(spot_id)
+
+            self._cells.clear()
+            self._cell_of.clear()
+            self._records.clear()
+            self._bounds = None
+
+            for spot_id, record in items:
+                if spot_id and isinstance(record, dict):
+                    self._apply(spot_id, record)
+
+            self.ready = True
+            self.stats['full_syncs'] += 1
+
+        logger.info(f"✅ Spot index synced: {len(self._records)} spots, {len(self._cells)} cells")
+
+    def update_spot(self, spot_id: str, record: Optional[Dict[str, Any]]):
+        """Replace one spot's record (None = spot deleted)"""
+        with self._lock:
+            if record is None:
+                self._records.pop(spot_id, None)
+                self._unplace(spot_id)
+                self.store.remove(spot_id)
+            else:
+                self._apply(spot_id, record)
+            self.stats['updates'] += 1
+
+    def patch_spot(self, spot_id: str, fields: Dict[str, Any]):
+        """Merge changed fields (e.g. {'occupied': True}) into a spot's record"""
+        with self._lock:
+            self.update_spot(spot_id, {**self._records.get(spot_id, {}), **fields})
+
+    def set_occupied(self, spot_id: str, occupied: bool):
+        self.patch_spot(spot_id, {'occupied': occupied})
+
+    def apply_event(self, event: Any):
+        """
+        Apply a Firebase listener event on parking_spots
+
+        Handles put/patch at the root (full table or several spots), at a
+        spot, and at a single spot field such as /A-01/occupied.
+        """
+        parts = [part for part in (event.path or '/').split('/') if part]
+        data = event.data
+
+        try:
+            if not parts:
+                if event.event_type == 'put':
+                    self.sync_all(data or {})
+                else:
+                    for spot_id, fields in (data or {}).items():
+                        if fields is None:
+                            self.update_spot(spot_id, None)
+                        else:
+                            self.patch_spot(spot_id, fields)
+            elif len(parts) == 1:
+                if event.event_type == 'put':
+                    self.update_spot(parts[0], data)
+                else:
+                    self.patch_spot(parts[0], data or {})
+            elif len(parts) == 2:
+                # Single field change, e.g. /A-01/occupied. Changes inside a
+                # field (/A-01/features/0) arrive with the spot's next put.
+                self.patch_spot(parts[0], {parts[1]: data})
+        except Exception as e:
+            logger.error(f"❌ Spot index update failed for {event.path}: {e}")
+
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Spot index subscriber failed: {e}")
+
+    def subscribe(self, callback: Callable[[], None]):
+        """Call `callback()` after every applied listener event (e.g. to refresh occupancy-based state)"""
+        self._subscribers.append(callback)
+
+    def start(self, firebase) -> bool:
+        """
+        Follow parking_spots changes through a Firebase listener (idempotent)
+
+        The listener's first event is the full table, which marks the index
+        ready; until then callers should query the database directly.
+        """
+        with self._lock:
+            if self._listening:
+                return True
+            self._listening = True
+
+        try:
+            firebase.listen_to_spots(self.apply_event)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Spot index listener failed: {e}")
+            with self._lock:
+                self._listening = False
+            return False
+
+    def _apply(self, spot_id: str, record: Dict[str, Any]):
+        """Store a record and (re)place it in the grid (caller holds the lock)"""
+        record = {**record, 'spot_id': spot_id}
+        self._records[spot_id] = record
+        self.store.upsert(record)
+
+        if record.get('occupied', False):
+            self._unplace(spot_id)
+        else:
+            self._place(spot_id, self._cell(*self.store.position(spot_id)))
+
+    def _place(self, spot_id: str, cell: CellKey):
+        if self._cell_of.get(spot_id) == cell:
+            return
+        self._unplace(spot_id)
+        self._cells.setdefault(cell, set()).add(spot_id)
+        self._cell_of[spot_id] = cell
+
+        x, y = cell
+        if self._bounds is None:
+            self._bounds = [x, x, y, y]
+        else:
+            bounds = self._bounds
+            bounds[0], bounds[1] = min(bounds[0], x), max(bounds[1], x)
+            bounds[2], bounds[3] = min(bounds[2], y), max(bounds[3], y)
+
+    def _unplace(self, spot_id: str):
+        cell = self._cell_of.pop(spot_id, None)
+        if cell is None:
+            return
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(spot_id)
+            if not members:
+                del self._cells[cell]
+
+    def _cell(self, lat: float, lng: float) -> CellKey:
+        return math.floor(lat / self._cell_lat), math.floor(lng / self._cell_lng)
+
+    # ============================================
+    # QUERIES
+    # ============================================
+
+    def nearest(
+        self,
+        user_location: Optional[Dict[str, float]],
+        k: int = 10,
+        required_features: Sequence[str] = (),
+        max_distance_m: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        k nearest available spots that have every required feature
+
+        Args:
+            user_location: {'lat', 'lng'} (default: lot entrance)
+            k: Number of spots to return
+            required_features: Hard feature filter
+            max_distance_m: Ignore spots farther than this
+        Returns:
+            [(spot_id, distance_meters), ...] closest first
+        """
+        lat, lng = self.store.user_position(user_location)
+        cx, cy = self._cell(lat, lng)
+
+        # Smallest real cell edge at the user's latitude (cells narrow towards the poles)
+        lng_edge_m = self._cell_lng * METERS_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        min_edge_m = min(self.cell_size_m, lng_edge_m)
+
+        found: Dict[str, float] = {}
+        scanned = 0
+
+        with self._lock:
+            if self._bounds is None:
+                return []
+
+            min_x, max_x, min_y, max_y = self._bounds
+            max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+
+            for ring in range(max_ring + 1):
+                # Anything in this ring or beyond is at least this far away
+                ring_floor_m = max(ring - 1, 0) * min_edge_m
+                if max_distance_m is not None and ring_floor_m > max_distance_m:
+                    break
+                if len(found) >= k and sorted(found.values())[k - 1] <= ring_floor_m:
+                    break
+
+                candidates = []
+
+                if ring * ring > len(self._cells):
+                    # Cheaper to visit every remaining occupied cell than to
+                    # keep walking (mostly empty) rings
+                    for (x, y), members in self._cells.items():
+                        if max(abs(x - cx), abs(y - cy)) >= ring:
+                            scanned += 1
+                            candidates.extend(members)
+                    if candidates:
+                        found.update(self.store.nearest(user_location, candidates, k, required_features))
+                    break
+
+                for cell in self._ring(cx, cy, ring):
+                    members = self._cells.get(cell)
+                    if members:
+                        scanned += 1
+                        candidates.extend(members)
+
+                if candidates:
+                    found.update(self.store.nearest(user_location, candidates, k, required_features))
+
+            self.stats['queries'] += 1
+            self.stats['cells_scanned'] += scanned
+
+        results = sorted(found.items(), key=lambda item: item[1])
+        if max_distance_m is not None:
+            results = [item for item in results if item[1] <= max_distance_m]
+        return results[:k]
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int) -> Iterable[CellKey]:
+        """Cells at Chebyshev distance `ring` from (cx, cy)"""
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
+
+    def count_available(self, required_features: Sequence[str] = ()) -> int:
+        return self.store.count_available(required_features)
+
+    def zone_occupancy(self) -> Dict[str, float]:
+        """Occupied fraction (0-1) of each zone's spots"""
+        totals: Dict[str, List[int]] = {}
+        with self._lock:
+            for record in self._records.values():
+                counts = totals.setdefault(record.get('zone'), [0, 0])
+                counts[0] += bool(record.get('occupied', False))
+                counts[1] += 1
+        return {zone: occupied / total for zone, (occupied, total) in totals.items()}
+
+    def spot_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._records)
+
+    def get_record(self, spot_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(spot_id)
+            return dict(record) if record else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'ready': self.ready,
+                'listening': self._listening,
+                'spots': len(self._records),
+                'available': len(self._cell_of),
+                'cells': len(self._cells),
+                'cell_size_m': self.cell_size_m
+            }
+
+
+# Singleton instance
+spot_index = SpotSpatialIndex(
+    spot_geometry_store,
+    cell_size_m=float(os.getenv('SPOT_INDEX_CELL_METERS', '100'))
+)
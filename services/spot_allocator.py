@@ -0,0 +1,221 @@
+"""
+ParknGo - Spot Allocator Module
+Short-lived holds on recommended spots, so concurrent bookings are never
+handed the same spot between ranking and booking, plus batched
+assignment of many simultaneous requests during rush periods
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (spot_id, score) candidates for one request; higher scores are preferred
+Candidates = Sequence[Tuple[str, float]]
+
+
+class _PendingRequest:
+    """A request waiting for the next batch assignment"""
+
+    def __init__(self, holder: str, candidates: Candidates):
+        self.holder = holder
+        self.candidates = candidates
+        self.spot_id: Optional[str] = None
+        self.done = threading.Event()
+
+
+class SpotAllocator:
+    """
+    In-process hold table with TTLs
+
+    A hold reserves a spot for one holder (a booking attempt) until it is
+    released or expires. Holds only protect requests served by this
+    process; the final claim goes through a Firebase transaction
+    (FirebaseService.claim_spot), so a spot is never booked twice even
+    across processes.
+
+    With a batch window, requests arriving within the window are assigned
+    together: candidate (request, spot) pairs are matched greedily in
+    descending score order, so a popular spot goes to the request that
+    values it most and the others fall through to their next choices
+    instead of colliding and retrying.
+    """
+
+    def __init__(self, hold_seconds: float = 30.0, batch_window_ms: float = 0.0):
+        """
+        Args:
+            hold_seconds: Default hold lifetime
+            batch_window_ms: Collect concurrent requests for this long and
+                             assign them together (0 = assign immediately)
+        """
+        self.hold_seconds = hold_seconds
+        self.batch_window_ms = batch_window_ms
+
+        self._holds: Dict[str, Tuple[str, float]] = {}   # spot_id -> (holder, expires_at)
+        self._lock = threading.Lock()
+
+        self._pending: List[_PendingRequest] = []
+        self._collecting = False
+
+        self.stats = {'holds': 0, 'conflicts': 0, 'released': 0, 'expired': 0, 'batches': 0, 'unassigned': 0}
+
+    # ============================================
+    # HOLDS
+    # ============================================
+
+    def hold(self, spot_id: str, holder: str, ttl: Optional[float] = None) -> bool:
+        """Hold a spot (renews the holder's own hold); False if someone else holds it"""
+        with self._lock:
+            return self._hold(spot_id, holder, time.time(), ttl)
+
+    def release(self, spot_id: str, holder: str) -> bool:
+        """Drop a hold (only the holder can release it)"""
+        with self._lock:
+            current = self._holds.get(spot_id)
+            if current is None or current[0] != holder:
+                return False
+            del self._holds[spot_id]
+            self.stats['released'] += 1
+            return True
+
+    def held_spots(self, exclude_holder: Optional[str] = None) -> Set[str]:
+        """Spots currently held (optionally ignoring one holder's own holds)"""
+        with self._lock:
+            self._expire(time.time())
+            return {spot_id for spot_id, (holder, _) in self._holds.items() if holder != exclude_holder}
+
+    def is_held(self, spot_id: str, exclude_holder: Optional[str] = None) -> bool:
+        with self._lock:
+            current = self._holds.get(spot_id)
+            return current is not None and current[1] > time.time() and current[0] != exclude_holder
+
+    def _hold(self, spot_id: str, holder: str, now: float, ttl: Optional[float]) -> bool:
+        """Take or renew a hold (caller holds the lock)"""
+        current = self._holds.get(spot_id)
+
+        if current is not None and current[0] != holder and current[1] > now:
+            self.stats['conflicts'] += 1
+            return False
+
+        self._holds[spot_id] = (holder, now + (self.hold_seconds if ttl is None else ttl))
+        self.stats['holds'] += 1
+        return True
+
+    def _expire(self, now: float):
+        """Drop expired holds (caller holds the lock)"""
+        expired = [spot_id for spot_id, (_, expires_at) in self._holds.items() if expires_at <= now]
+        for spot_id in expired:
+            del self._holds[spot_id]
+        self.stats['expired'] += len(expired)
+
+    # ============================================
+    # ALLOCATION
+    # ============================================
+
+    def allocate(self, holder: str, candidates: Candidates) -> Optional[str]:
+        """
+        Hold the best free candidate for a request
+
+        Args:
+            holder: Booking attempt identifier
+            candidates: [(spot_id, score), ...] for this request
+        Returns:
+            The held spot_id, or None if every candidate is taken
+        """
+        if self.batch_window_ms <= 0:
+            with self._lock:
+                now = time.time()
+                for spot_id, _ in sorted(candidates, key=lambda c: -c[1]):
+                    if self._hold(spot_id, holder, now, None):
+                        return spot_id
+                self.stats['unassigned'] += 1
+                return None
+
+        request = _PendingRequest(holder, candidates)
+
+        with self._lock:
+            self._pending.append(request)
+            leader = not self._collecting
+            self._collecting = True
+
+        # The first request of a window waits it out, then assigns everyone
+        # that arrived meanwhile; the rest just wait for their result
+        if leader:
+            time.sleep(self.batch_window_ms / 1000)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._collecting = False
+                self._assign(batch)
+
+        request.done.wait()
+        return request.spot_id
+
+    def assign_batch(self, requests: Sequence[Tuple[str, Candidates]]) -> Dict[str, Optional[str]]:
+        """
+        Assign spots to many requests at once and hold them
+
+        Args:
+            requests: [(holder, [(spot_id, score), ...]), ...]
+        Returns:
+            {holder: spot_id or None}
+        """
+        batch = [_PendingRequest(holder, candidates) for holder, candidates in requests]
+        with self._lock:
+            self._assign(batch)
+        return {request.holder: request.spot_id for request in batch}
+
+    def _assign(self, batch: List[_PendingRequest]):
+        """
+        Greedy maximum-score matching of requests to spots (caller holds the lock)
+
+        Edges are taken in descending score order; each request gets at most
+        one spot and each spot at most one request. Every request is marked
+        done, assigned or not.
+        """
+        now = time.time()
+        self._expire(now)
+
+        edges = [
+            (score, index, spot_id)
+            for index, request in enumerate(batch)
+            for spot_id, score in request.candidates
+        ]
+        edges.sort(key=lambda edge: (-edge[0], edge[1]))
+
+        taken: Set[str] = set()
+        for _, index, spot_id in edges:
+            request = batch[index]
+            if request.spot_id is not None or spot_id in taken:
+                continue
+            if self._hold(spot_id, request.holder, now, None):
+                request.spot_id = spot_id
+                taken.add(spot_id)
+
+        for request in batch:
+            if request.spot_id is None:
+                self.stats['unassigned'] += 1
+            request.done.set()
+
+        self.stats['batches'] += 1
+        if len(batch) > 1:
+            logger.info(f"🅿️ Batch assigned {len(taken)}/{len(batch)} requests")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                **self.stats,
+                'active_holds': len(self._holds),
+                'hold_seconds': self.hold_seconds,
+                'batch_window_ms': self.batch_window_ms
+            }
+
+
+# Singleton instance
+spot_allocator = SpotAllocator(
+    hold_seconds=float(os.getenv('SPOT_HOLD_SECONDS', '30')),
+    batch_window_ms=float(os.getenv('SPOT_ALLOCATION_BATCH_MS', '0'))
+)
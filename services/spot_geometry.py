@@ -0,0 +1,371 @@
+"""
+ParknGo - Spot Geometry Module
+Column store of spot coordinates, types and features in NumPy arrays with a
+vectorised Haversine/feature-match scorer: every candidate spot is scored
+for a user in one pass, without an LLM call
+"""
+
+import os
+import re
+import math
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+# Spots without stored coordinates are placed this far (meters) from the lot
+# entrance, matching the distances SpotFinder used to simulate per zone
+ZONE_DISTANCE_M = {'A': 50.0, 'B': 120.0, 'C': 200.0}
+DEFAULT_ZONE_DISTANCE_M = 100.0
+BAY_WIDTH_M = 2.5
+
+# Rule-based score: 100 - distance/10, plus bonuses, minus a penalty for
+# missing desired features (reported clipped to 0-100, ranked unclipped)
+DISTANCE_PENALTY_PER_M = 0.1
+PREMIUM_BONUS = 10.0
+FEATURE_BONUS = {'covered': 5.0, 'ev_charging': 5.0}
+DESIRED_MISS_PENALTY = 20.0
+
+_BAY_NUMBER = re.compile(r'(\d+)$')
+
+
+def haversine_many(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Distances in meters from one point to many (all angles in degrees)"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    half_dphi = (phi2 - phi1) * 0.5
+    half_dlambda = np.radians(lngs - lng) * 0.5
+
+    a = np.sin(half_dphi) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def offset_position(lat: float, lng: float, north_m: float, east_m: float) -> Tuple[float, float]:
+    """Point `north_m`/`east_m` meters away (small-distance approximation)"""
+    dlat = north_m / EARTH_RADIUS_M
+    dlng = east_m / (EARTH_RADIUS_M * math.cos(math.radians(lat)))
+    return lat + math.degrees(dlat), lng + math.degrees(dlng)
+
+
+class SpotGeometryStore:
+    """
+    Spot positions and attributes as parallel NumPy arrays
+
+    Rows are addressed through an id -> row map; removed spots leave a
+    tombstone row that is reused by the next insert.
+    """
+
+    def __init__(self, entrance: Optional[Tuple[float, float]] = None, capacity: int = 256):
+        """
+        Args:
+            entrance: (lat, lng) of the lot entrance; default location for
+                      users and origin for spots without coordinates
+            capacity: Initial number of rows
+        """
+        self.entrance = entrance or (40.7128, -74.0060)
+
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._features: Dict[str, int] = {}   # feature name -> bit
+
+        self._lat = np.zeros(capacity)
+        self._lng = np.zeros(capacity)
+        self._premium = np.zeros(capacity, dtype=bool)
+        self._feature_bits = np.zeros(capacity, dtype=np.uint64)
+        self._available = np.zeros(capacity, dtype=bool)
+        self._active = np.zeros(capacity, dtype=bool)
+
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, spot_id: str) -> bool:
+        return spot_id in self._rows
+
+    # ============================================
+    # UPDATES
+    # ============================================
+
+    def upsert(self, spot: Dict[str, Any]) -> int:
+        """Insert or update one spot record (Firebase spot dict); returns its row"""
+        spot_id = spot.get('spot_id')
+        if not spot_id:
+            raise ValueError("spot record has no spot_id")
+
+        lat, lng = self._position(spot)
+
+        with self._lock:
+            row = self._rows.get(spot_id)
+            if row is None:
+                row = self._allocate(spot_id)
+
+            self._lat[row] = lat
+            self._lng[row] = lng
+            self._premium[row] = spot.get('type') == 'premium'
+            self._feature_bits[row] = self.feature_mask(spot.get('features') or [])
+            self._available[row] = not spot.get('occupied', False)
+            self._active[row] = True
+
+        return row
+
+    def upsert_many(self, spots: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for spot in spots:
+                self.upsert(spot)
+
+    def set_available(self, spot_id: str, available: bool) -> bool:
+        """Flip a spot's availability (sensor/occupancy change); False if unknown"""
+        with self._lock:
+            row = self._rows.get(spot_id)
+            if row is None:
+                return False
+            self._available[row] = available
+            return True
+
+    def remove(self, spot_id: str) -> bool:
+        with self._lock:
+            row = self._rows.pop(spot_id, None)
+            if row is None:
+                return False
+            self._ids[row] = None
+            self._active[row] = False
+            self._available[row] = False
+            self._free.append(row)
+            return True
+
+    def _allocate(self, spot_id: str) -> int:
+        """Row for a new spot (caller holds the lock)"""
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = spot_id
+        else:
+            row = len(self._ids)
+            if row >= len(self._lat):
+                self._grow(max(len(self._lat) * 2, 1))
+            self._ids.append(spot_id)
+
+        self._rows[spot_id] = row
+        return row
+
+    def _grow(self, capacity: int):
+        for name in ('_lat', '_lng', '_premium', '_feature_bits', '_available', '_active'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _position(self, spot: Dict[str, Any]) -> Tuple[float, float]:
+        """Stored coordinates, or a position derived from zone and bay number"""
+        location = spot.get('location') or {}
+        lat = spot.get('lat', location.get('lat'))
+        lng = spot.get('lng', location.get('lng'))
+        if lat is not None and lng is not None:
+            return float(lat), float(lng)
+
+        # Zone row straight ahead of the entrance, bays side by side
+        distance = ZONE_DISTANCE_M.get(spot.get('zone'), DEFAULT_ZONE_DISTANCE_M)
+        match = _BAY_NUMBER.search(str(spot.get('spot_id', '')))
+        bay = int(match.group(1)) - 1 if match else 0
+        return offset_position(*self.entrance, north_m=distance, east_m=bay * BAY_WIDTH_M)
+
+    def feature_mask(self, features: Sequence[str]) -> int:
+        """Bitmask for a set of feature names (new names get the next free bit)"""
+        mask = 0
+        for feature in features:
+            bit = self._features.get(feature)
+            if bit is None:
+                if len(self._features) >= 64:
+                    logger.warning(f"⚠️ Spot feature '{feature}' ignored: feature bitmask is full")
+                    continue
+                bit = self._features[feature] = len(self._features)
+            mask |= 1 << bit
+        return mask
+
+    # ============================================
+    # SCORING
+    # ============================================
+
+    def rank(
+        self,
+        user_location: Optional[Dict[str, float]] = None,
+        desired_features: Sequence[str] = (),
+        spot_ids: Optional[Sequence[str]] = None,
+        k: Optional[int] = None
+    ) -> List[Tuple[str, float, float]]:
+        """
+        Score candidate spots for a user and return the best first
+
+        Args:
+            user_location: {'lat', 'lng'} (default: lot entrance)
+            desired_features: Features the user asked for (soft match)
+            spot_ids: Candidates to score (default: every available spot)
+            k: Only return the top k
+        Returns:
+            [(spot_id, distance_meters, score 0-100), ...] best first
+        """
+        lat, lng = self.user_position(user_location)
+
+        with self._lock:
+            if spot_ids is None:
+                rows = np.flatnonzero(self._active & self._available)
+            else:
+                rows = np.fromiter(
+                    (self._rows[spot_id] for spot_id in spot_ids if spot_id in self._rows),
+                    dtype=np.intp
+                )
+
+            if rows.size == 0:
+                return []
+
+            distances, scores = self._score_rows(rows, lat, lng, desired_features)
+            order = self._top(scores, k)
+            ids = [self._ids[row] for row in rows[order].tolist()]
+            reported = np.clip(scores[order], 0.0, 100.0)
+            return list(zip(ids, distances[order].tolist(), reported.tolist()))
+
+    def nearest(
+        self,
+        user_location: Optional[Dict[str, float]],
+        spot_ids: Sequence[str],
+        k: Optional[int] = None,
+        required_features: Sequence[str] = ()
+    ) -> List[Tuple[str, float]]:
+        """
+        Closest available spots among `spot_ids` that have every required
+        feature
+
+        Returns:
+            [(spot_id, distance_meters), ...] closest first
+        """
+        lat, lng = self.user_position(user_location)
+
+        with self._lock:
+            required = self._required_mask(required_features)
+            if required is None:
+                return []
+
+            rows = np.fromiter(
+                (self._rows[spot_id] for spot_id in spot_ids if spot_id in self._rows),
+                dtype=np.intp
+            )
+            rows = rows[self._matching(rows, required)]
+            if rows.size == 0:
+                return []
+
+            meters = haversine_many(lat, lng, self._lat[rows], self._lng[rows])
+            order = self._top(-meters, k)
+            ids = [self._ids[row] for row in rows[order].tolist()]
+            return list(zip(ids, meters[order].tolist()))
+
+    def count_available(self, required_features: Sequence[str] = ()) -> int:
+        """Available spots that have every required feature"""
+        with self._lock:
+            required = self._required_mask(required_features)
+            if required is None:
+                return 0
+            rows = np.flatnonzero(self._active)
+            return int(np.count_nonzero(self._matching(rows, required)))
+
+    def position(self, spot_id: str) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            row = self._rows.get(spot_id)
+            if row is None:
+                return None
+            return float(self._lat[row]), float(self._lng[row])
+
+    def _required_mask(self, features: Sequence[str]) -> Optional[np.uint64]:
+        """Mask of required features; None if one is unknown (nothing can match)"""
+        mask = 0
+        for feature in features:
+            bit = self._features.get(feature)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return np.uint64(mask)
+
+    def _matching(self, rows: np.ndarray, required: np.uint64) -> np.ndarray:
+        """Boolean mask of rows that are available and have the required bits"""
+        return self._available[rows] & ((self._feature_bits[rows] & required) == required)
+
+    def distances(self, user_location: Optional[Dict[str, float]], spot_ids: Sequence[str]) -> Dict[str, float]:
+        """Distance in meters from the user to each known spot"""
+        lat, lng = self.user_position(user_location)
+
+        with self._lock:
+            known = [spot_id for spot_id in spot_ids if spot_id in self._rows]
+            rows = np.fromiter((self._rows[spot_id] for spot_id in known), dtype=np.intp, count=len(known))
+            meters = haversine_many(lat, lng, self._lat[rows], self._lng[rows])
+
+        return dict(zip(known, meters.tolist()))
+
+    def _score_rows(
+        self,
+        rows: np.ndarray,
+        lat: float,
+        lng: float,
+        desired_features: Sequence[str]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorised distances and unclipped rule-based scores for a set of rows (caller holds the lock)"""
+        distances = haversine_many(lat, lng, self._lat[rows], self._lng[rows])
+        bits = self._feature_bits[rows]
+
+        scores = 100.0 - distances * DISTANCE_PENALTY_PER_M
+        scores += self._premium[rows] * PREMIUM_BONUS
+
+        for feature, bonus in FEATURE_BONUS.items():
+            bit = self._features.get(feature)
+            if bit is not None:
+                scores += ((bits >> np.uint64(bit)) & np.uint64(1)) * bonus
+
+        desired = set(desired_features)
+        if desired:
+            matched = np.zeros(rows.size)
+            for feature in desired & self._features.keys():
+                matched += (bits >> np.uint64(self._features[feature])) & np.uint64(1)
+            scores -= DESIRED_MISS_PENALTY * (1.0 - matched / len(desired))
+
+        return distances, scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+        """Indices of the k best scores, best first (ties keep input order)"""
+        if k is not None and 0 < k < scores.size:
+            top = np.argpartition(-scores, k - 1)[:k]
+            return top[np.argsort(-scores[top], kind='stable')]
+        return np.argsort(-scores, kind='stable')
+
+    def user_position(self, user_location: Optional[Dict[str, float]]) -> Tuple[float, float]:
+        user_location = user_location or {}
+        lat = user_location.get('lat')
+        lng = user_location.get('lng')
+        if lat is None or lng is None:
+            return self.entrance
+        return float(lat), float(lng)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'spots': len(self._rows),
+                'available': int(np.count_nonzero(self._active & self._available)),
+                'capacity': len(self._lat),
+                'features': sorted(self._features, key=self._features.get)
+            }
+
+
+def _entrance_from_env() -> Optional[Tuple[float, float]]:
+    lat = os.getenv('PARKING_LOT_LAT')
+    lng = os.getenv('PARKING_LOT_LNG')
+    if lat is None or lng is None:
+        return None
+    return float(lat), float(lng)
+
+
+# Singleton instance
+spot_geometry_store = SpotGeometryStore(entrance=_entrance_from_env())
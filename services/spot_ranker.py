@@ -0,0 +1,318 @@
+"""
+ParknGo - Spot Ranker Module
+Learned spot ranking: a logistic-regression model over spot/request
+features, trained offline from booking outcomes and scored locally, so
+ranking costs no model call however many spots a lot has
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+FEATURE_NAMES = (
+    'distance_100m',      # Walking distance in units of 100 m
+    'premium',
+    'covered',
+    'ev_charging',
+    'disabled_access',
+    'desired_match',      # Fraction of the user's desired features present (1 if none asked)
+)
+
+# Untrained starting point: the rule-based score (100 - distance/10, +10
+# premium, +5 covered/EV, -20 for missing desired features) divided by 10
+DEFAULT_WEIGHTS = {
+    'distance_100m': -1.0,
+    'premium': 1.0,
+    'covered': 0.5,
+    'ev_charging': 0.5,
+    'disabled_access': 0.0,
+    'desired_match': 2.0,
+}
+DEFAULT_BIAS = 1.0
+
+# Background event writer: bounded queue (events beyond it are dropped) and
+# the most events appended per file write
+EVENT_QUEUE_SIZE = int(os.getenv('SPOT_RANKER_EVENT_QUEUE', '10000'))
+EVENT_BATCH_SIZE = 200
+
+
+def spot_feature_vector(spot: Dict[str, Any], desired_features: Sequence[str]) -> List[float]:
+    """Model features for one spot (see FEATURE_NAMES)"""
+    features = set(spot.get('features') or [])
+    desired = set(desired_features or [])
+
+    return [
+        float(spot.get('distance_meters', 100)) / 100.0,
+        1.0 if spot.get('type') == 'premium' else 0.0,
+        1.0 if 'covered' in features else 0.0,
+        1.0 if 'ev_charging' in features else 0.0,
+        1.0 if 'disabled_access' in features else 0.0,
+        len(desired & features) / len(desired) if desired else 1.0,
+    ]
+
+
+def feature_matrix(spots: Sequence[Dict[str, Any]], desired_features: Sequence[str]) -> np.ndarray:
+    return np.array([spot_feature_vector(spot, desired_features) for spot in spots], dtype=float).reshape(-1, len(FEATURE_NAMES))
+
+
+def train_logistic_regression(
+    X: np.ndarray,
+    y: np.ndarray,
+    l2: float = 0.01,
+    learning_rate: float = 0.1,
+    epochs: int = 500
+) -> Tuple[np.ndarray, float, float]:
+    """
+    Fit logistic regression with L2 regularisation by batch gradient descent
+
+    Returns:
+        (weights, bias, final log loss)
+    """
+    samples, width = X.shape
+    weights = np.zeros(width)
+    bias = 0.0
+
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(X @ weights + bias)))
+        error = p - y
+        weights -= learning_rate * (X.T @ error / samples + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+
+    p = np.clip(1.0 / (1.0 + np.exp(-(X @ weights + bias))), 1e-9, 1 - 1e-9)
+    loss = float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+    return weights, bias, loss
+
+
+class SpotRanker:
+    """
+    Scores candidate spots with a linear model and logs what was shown and
+    what was booked, so the model can be retrained offline
+    (scripts/train_spot_ranker.py)
+    """
+
+    def __init__(self, model_path: Optional[str] = None, events_path: Optional[str] = None):
+        """
+        Args:
+            model_path: JSON model written by the training script (default
+                        weights are used until one exists)
+            events_path: JSONL file for impression/booking events (None = off)
+        """
+        self.model_path = Path(model_path) if model_path else None
+        self.events_path = Path(events_path) if events_path else None
+
+        self.weights = np.array([DEFAULT_WEIGHTS[name] for name in FEATURE_NAMES])
+        self.bias = DEFAULT_BIAS
+        self.model_info: Dict[str, Any] = {'source': 'default'}
+
+        # Events are written by a background thread so logging never blocks a request
+        self._events: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._events_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._dropped_events = 0
+
+        if self.model_path and self.model_path.exists():
+            self.load(self.model_path)
+
+    # ============================================
+    # SCORING
+    # ============================================
+
+    def score(self, spots: Sequence[Dict[str, Any]], desired_features: Sequence[str] = ()) -> np.ndarray:
+        """Booking probability (0-1) for each spot"""
+        if not spots:
+            return np.zeros(0)
+        logits = feature_matrix(spots, desired_features) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def rank(
+        self,
+        spots: Sequence[Dict[str, Any]],
+        desired_features: Sequence[str] = (),
+        k: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """[(spot, probability), ...] best first"""
+        probabilities = self.score(spots, desired_features)
+        order = np.argsort(-probabilities, kind='stable')
+        if k is not None:
+            order = order[:k]
+        return [(spots[i], float(probabilities[i])) for i in order.tolist()]
+
+    @staticmethod
+    def describe(spot: Dict[str, Any], desired_features: Sequence[str] = ()) -> str:
+        """One-line, model-free reason for a spot's rank"""
+        features = set(spot.get('features') or [])
+        parts = [f"{round(spot.get('distance_meters', 0))}m away"]
+        if spot.get('type') == 'premium':
+            parts.append('premium')
+        parts.extend(feature.replace('_', ' ') for feature in sorted(features))
+
+        missing = set(desired_features or []) - features
+        if missing:
+            parts.append(f"missing {', '.join(sorted(missing))}")
+        return ', '.join(parts)
+
+    # ============================================
+    # MODEL FILE
+    # ============================================
+
+    def load(self, path: Path):
+        try:
+            model = json.loads(Path(path).read_text())
+            weights = model['weights']
+            self.weights = np.array([float(weights.get(name, 0.0)) for name in FEATURE_NAMES])
+            self.bias = float(model.get('bias', 0.0))
+            self.model_info = {k: v for k, v in model.items() if k not in ('weights', 'bias')}
+            self.model_info['source'] = str(path)
+            logger.info(f"✅ Spot ranker loaded from {path} ({model.get('samples', '?')} samples)")
+        except Exception as e:
+            logger.error(f"❌ Failed to load spot ranker model {path}: {e}")
+
+    def save(self, path: Path, **info):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        model = {
+            'feature_names': list(FEATURE_NAMES),
+            'weights': dict(zip(FEATURE_NAMES, self.weights.round(6).tolist())),
+            'bias': round(self.bias, 6),
+            'trained_at': time.time(),
+            **info
+        }
+        path.write_text(json.dumps(model, indent=2))
+
+    # ============================================
+    # TRAINING EVENTS
+    # ============================================
+
+    def log_impression(self, request_data: Dict[str, Any], ranked_spots: Sequence[Dict[str, Any]]):
+        """Record the candidates a user was shown (for offline training)"""
+        user_id = request_data.get('user_id')
+        if not user_id or not ranked_spots:
+            return
+
+        desired = request_data.get('desired_features', []) or []
+        self._append_event({
+            'event': 'impression',
+            'user_id': user_id,
+            'timestamp': time.time(),
+            'desired_features': desired,
+            'candidates': [
+                {'spot_id': spot.get('spot_id'), 'features': spot_feature_vector(spot, desired)}
+                for spot in ranked_spots
+            ]
+        })
+
+    def log_booking(self, user_id: Optional[str], spot_id: Optional[str]):
+        """Record which spot a user actually booked"""
+        if user_id and spot_id:
+            self._append_event({'event': 'booking', 'user_id': user_id, 'spot_id': spot_id, 'timestamp': time.time()})
+
+    def _append_event(self, event: Dict[str, Any]):
+        """Queue an event for the background writer (never blocks the caller)"""
+        if not self.events_path:
+            return
+        self._ensure_writer()
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            self._dropped_events += 1
+            if self._dropped_events % 100 == 1:
+                logger.warning(f"⚠️ Spot ranking event queue full, dropped {self._dropped_events} events")
+
+    def _ensure_writer(self):
+        with self._events_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_events, name='spot-ranker-events', daemon=True)
+                self._writer.start()
+
+    def _write_events(self):
+        while True:
+            batch = [self._events.get()]
+            while len(batch) < EVENT_BATCH_SIZE:
+                try:
+                    batch.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.events_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.events_path.open('a') as events:
+                    events.write(''.join(json.dumps(event) + '\n' for event in batch))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not record {len(batch)} spot ranking events: {e}")
+            finally:
+                for _ in batch:
+                    self._events.task_done()
+
+    def flush(self):
+        """Block until every queued event has been written (used by scripts and shutdown)"""
+        if self._writer is not None:
+            self._events.join()
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            **self.model_info,
+            'weights': dict(zip(FEATURE_NAMES, self.weights.round(4).tolist())),
+            'bias': round(self.bias, 4)
+        }
+
+
+def build_training_set(events: Sequence[Dict[str, Any]], window_seconds: float = 1800.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Join bookings to the latest impression shown to the same user
+
+    A booking within `window_seconds` of an impression that contained the
+    booked spot labels that spot 1 and every other shown candidate 0.
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    rows: List[List[float]] = []
+    labels: List[float] = []
+
+    for event in sorted(events, key=lambda e: e.get('timestamp', 0)):
+        user_id = event.get('user_id')
+
+        if event.get('event') == 'impression':
+            latest[user_id] = event
+            continue
+
+        impression = latest.get(user_id)
+        if event.get('event') != 'booking' or impression is None:
+            continue
+        if event['timestamp'] - impression['timestamp'] > window_seconds:
+            continue
+
+        candidates = impression['candidates']
+        if not any(c['spot_id'] == event['spot_id'] for c in candidates):
+            continue
+
+        for candidate in candidates:
+            rows.append(candidate['features'])
+            labels.append(1.0 if candidate['spot_id'] == event['spot_id'] else 0.0)
+
+        # One booking per impression
+        del latest[user_id]
+
+    return np.array(rows, dtype=float).reshape(-1, len(FEATURE_NAMES)), np.array(labels)
+
+
+def _project_path(value: str) -> str:
+    return value if os.path.isabs(value) else str(PROJECT_ROOT / value)
+
+
+# Singleton instance
+spot_ranker = SpotRanker(
+    model_path=_project_path(os.getenv('SPOT_RANKER_MODEL', 'data/spot_ranker.json')),
+    events_path=_project_path(os.getenv('SPOT_RANKER_EVENTS', 'data/spot_ranking_events.jsonl'))
+    if os.getenv('SPOT_RANKER_LOG_EVENTS', 'true').lower() == 'true' else None
+)
+atexit.register(spot_ranker.flush)
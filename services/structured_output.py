@@ -0,0 +1,264 @@
+"""
+ParknGo - Structured Output Module
+Tolerant JSON extraction from model text plus typed, validated response
+models for every Gemini prompt family
+"""
+
+import json
+import re
+from dataclasses import MISSING, asdict, dataclass, field, fields
+from typing import Any, Dict, List, Optional, Sequence, Type, TypeVar
+
+T = TypeVar('T', bound='StructuredModel')
+
+_CODE_FENCE = re.compile(r'```(?:json|JSON)?\s*(.*?)```', re.DOTALL)
+
+
+class StructuredOutputError(ValueError):
+    """Model output could not be extracted or did not match its schema"""
+
+
+# ============================================
+# EXTRACTION
+# ============================================
+
+def extract_json(text: str) -> Any:
+    """
+    Pull the first JSON value out of model text
+
+    Handles plain JSON, ```json fences, and preamble/epilogue prose around
+    an object or array.
+
+    Raises:
+        StructuredOutputError: no decodable JSON value found
+    """
+    if not text or not text.strip():
+        raise StructuredOutputError("empty model response")
+
+    candidates = [text.strip()]
+    candidates.extend(match.strip() for match in _CODE_FENCE.findall(text))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+
+    # Scan for the first position where a complete object/array decodes
+    decoder = json.JSONDecoder()
+    for index, char in enumerate(text):
+        if char in '{[':
+            try:
+                value, _ = decoder.raw_decode(text, index)
+                return value
+            except ValueError:
+                continue
+
+    raise StructuredOutputError(f"no JSON found in response: {text[:80]!r}")
+
+
+# ============================================
+# TYPED MODELS
+# ============================================
+
+def spec(
+    default: Any = MISSING,
+    minimum: Optional[float] = None,
+    maximum: Optional[float] = None,
+    choices: Optional[Sequence[str]] = None,
+    aliases: Sequence[str] = (),
+    items: Optional[type] = None
+):
+    """
+    Dataclass field with validation metadata
+
+    Args:
+        default: Value when the key is absent (required if omitted)
+        minimum/maximum: Numeric range; out-of-range values are clamped
+        choices: Allowed string values (case-insensitive)
+        aliases: Alternative keys the model may use
+        items: Element type for list fields (str or a StructuredModel)
+    """
+    metadata = {
+        'minimum': minimum,
+        'maximum': maximum,
+        'choices': tuple(choices) if choices else None,
+        'aliases': tuple(aliases),
+        'items': items
+    }
+    if default is MISSING:
+        return field(metadata=metadata)
+    if isinstance(default, (list, dict)):
+        return field(default_factory=lambda: type(default)(default), metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+@dataclass
+class StructuredModel:
+    """Base for validated model responses"""
+
+    @classmethod
+    def from_dict(cls: Type[T], data: Any) -> T:
+        if not isinstance(data, dict):
+            raise StructuredOutputError(f"{cls.__name__}: expected an object, got {type(data).__name__}")
+
+        values = {}
+        for f in fields(cls):
+            meta = f.metadata
+            key = next((k for k in (f.name, *meta.get('aliases', ())) if k in data), None)
+
+            if key is None or data[key] is None:
+                if f.default is not MISSING or f.default_factory is not MISSING:
+                    continue
+                raise StructuredOutputError(f"{cls.__name__}: missing field '{f.name}'")
+
+            values[f.name] = _coerce(cls.__name__, f.name, f.type, data[key], meta)
+
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _coerce(model: str, name: str, kind: Any, value: Any, meta: Dict[str, Any]) -> Any:
+    where = f"{model}.{name}"
+
+    if kind in (int, float):
+        if isinstance(value, bool):
+            raise StructuredOutputError(f"{where}: expected a number, got {value!r}")
+        try:
+            number = float(str(value).strip().rstrip('%')) if isinstance(value, str) else float(value)
+        except (TypeError, ValueError):
+            raise StructuredOutputError(f"{where}: expected a number, got {value!r}")
+        if meta.get('minimum') is not None:
+            number = max(number, meta['minimum'])
+        if meta.get('maximum') is not None:
+            number = min(number, meta['maximum'])
+        return int(round(number)) if kind is int else float(number)
+
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in ('true', 'yes', '1'):
+            return True
+        if str(value).strip().lower() in ('false', 'no', '0'):
+            return False
+        raise StructuredOutputError(f"{where}: expected a boolean, got {value!r}")
+
+    if kind is str:
+        if isinstance(value, (dict, list)):
+            raise StructuredOutputError(f"{where}: expected text, got {type(value).__name__}")
+        text = str(value).strip()
+        choices = meta.get('choices')
+        if choices:
+            normalized = text.lower().replace(' ', '_')
+            if normalized not in choices:
+                raise StructuredOutputError(f"{where}: {text!r} not in {list(choices)}")
+            return normalized
+        return text
+
+    if kind is list:
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{where}: expected a list, got {type(value).__name__}")
+        items = meta.get('items')
+        if items is str:
+            return [str(item).strip() for item in value if not isinstance(item, (dict, list))]
+        if isinstance(items, type) and issubclass(items, StructuredModel):
+            return [items.from_dict(item) for item in value]
+        return value
+
+    if kind is dict:
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{where}: expected an object, got {type(value).__name__}")
+        return value
+
+    return value
+
+
+def parse_model(text: str, model: Type[T]) -> T:
+    """Extract JSON from model text and validate it as `model`"""
+    return model.from_dict(extract_json(text))
+
+
+def parse_model_list(text: str, model: Type[T], wrapper_keys: Sequence[str] = ()) -> List[T]:
+    """
+    Extract a JSON array of `model` items; also accepts an object that
+    wraps the array under one of wrapper_keys (e.g. {"rankings": [...]})
+    """
+    data = extract_json(text)
+
+    if isinstance(data, dict):
+        data = next((data[k] for k in wrapper_keys if isinstance(data.get(k), list)), None)
+
+    if not isinstance(data, list):
+        raise StructuredOutputError(f"expected a list of {model.__name__}")
+
+    return [model.from_dict(item) for item in data]
+
+
+# ============================================
+# RESPONSE SCHEMAS
+# ============================================
+
+@dataclass
+class DemandForecast(StructuredModel):
+    demand_score: float = spec(minimum=0, maximum=100)
+    demand_multiplier: float = spec(minimum=0.5, maximum=3.0, aliases=('multiplier',))
+    reasoning: str = spec(default='')
+    peak_expected: bool = spec(default=False)
+
+
+@dataclass
+class DynamicPrice(StructuredModel):
+    final_price: float = spec(minimum=0)
+    breakdown: dict = spec(default={})
+    reasoning: str = spec(default='')
+
+
+@dataclass
+class FraudAssessment(StructuredModel):
+    fraud_score: float = spec(minimum=0, maximum=100)
+    risk_level: str = spec(choices=('low', 'medium', 'high', 'critical'))
+    flags: list = spec(default=[], items=str)
+    reasoning: str = spec(default='')
+    recommend_action: str = spec(default='review', choices=('approve', 'review', 'decline'))
+
+
+@dataclass
+class DisputeRuling(StructuredModel):
+    confidence: float = spec(minimum=0, maximum=100)
+    ruling: str = spec(choices=('customer_wins', 'operator_wins', 'split_decision'))
+    reasoning: str = spec(default='')
+    evidence_summary: str = spec(default='')
+    payout_distribution: dict = spec(default={})
+
+
+@dataclass
+class AnomalyReport(StructuredModel):
+    anomaly_score: float = spec(minimum=0, maximum=100)
+    detected_issues: list = spec(default=[], items=str)
+    risk_assessment: str = spec(default='low', choices=('low', 'medium', 'high'))
+    recommendation: str = spec(default='monitor', choices=('monitor', 'alert', 'investigate'))
+
+
+@dataclass
+class SpotRanking(StructuredModel):
+    spot_id: str = spec()
+    score: float = spec(minimum=0, maximum=100)
+    reasoning: str = spec(default='AI analysis')
+
+
+@dataclass
+class AggregationResult(StructuredModel):
+    confidence: float = spec(minimum=0, maximum=100)
+    reasoning: str = spec(default='High quality match')
+
+
+@dataclass
+class ReservationBrief(StructuredModel):
+    top_spot_id: str = spec()
+    rankings: list = spec(items=SpotRanking)
+    pricing_explanation: str = spec()
+    # Only requested when directions come from the model (not the lot graph)
+    directions: list = spec(default=[], items=str)
+    route_tip: str = spec(default='')
@@ -0,0 +1,286 @@
+"""
+ParknGo - Transaction Tracker Service Module
+Background submission queue and confirmation watcher for Cardano transactions
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Transaction lifecycle states
+TX_QUEUED = 'queued'        # Waiting for the submission worker
+TX_PENDING = 'pending'      # Submitted, waiting for block inclusion
+TX_CONFIRMED = 'confirmed'  # Seen on-chain
+TX_FAILED = 'failed'        # Build/submit error or confirmation timeout
+
+
+class TransactionTracker:
+    """
+    Decouples callers from transaction submission and tracks finality.
+
+    - Submission queue: a single worker builds, signs and submits queued
+      transactions in order, so API threads return immediately with a ticket.
+    - Confirmation watcher: polls pending tx hashes in bounded batches with
+      per-transaction exponential backoff until they are seen on-chain or
+      time out.
+    - Events: subscribers are called on every state change.
+    - Retention: confirmed and failed records stay queryable for a
+      retention window, then are dropped, so memory and watcher cost track
+      in-flight transactions rather than total payout history.
+    """
+
+    def __init__(
+        self,
+        fetch_confirmation: Callable[[str], Optional[Dict[str, Any]]],
+        poll_interval: float = 5.0,
+        batch_size: int = 10,
+        max_backoff: float = 60.0,
+        confirm_timeout: float = 900.0,
+        retention_seconds: float = 3600.0
+    ):
+        """
+        Args:
+            fetch_confirmation: Returns on-chain details for a tx hash, or None
+                while the transaction is not yet in a block
+            poll_interval: Seconds between watcher cycles
+            batch_size: Maximum transactions checked per watcher cycle
+            max_backoff: Upper bound for the per-transaction poll delay
+            confirm_timeout: Seconds after submission before giving up
+            retention_seconds: How long finished records stay queryable
+        """
+        self._fetch_confirmation = fetch_confirmation
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.confirm_timeout = confirm_timeout
+        self.retention_seconds = retention_seconds
+
+        self._records: Dict[str, Dict[str, Any]] = {}   # ticket_id -> record
+        self._by_hash: Dict[str, str] = {}              # tx_hash -> ticket_id
+        self._pending: Dict[str, None] = {}             # ticket_ids awaiting confirmation
+        self._finished: "OrderedDict[str, float]" = OrderedDict()  # ticket_id -> finished_at
+        self._lock = threading.Lock()
+        self._submit_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+
+        self._stop = threading.Event()
+        self._wake_watcher = threading.Event()
+        self._threads_started = False
+
+    # ============================================
+    # PUBLIC API
+    # ============================================
+
+    def enqueue(self, submit: Callable[[], str], metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Queue a transaction for background submission
+
+        Args:
+            submit: Callable that builds, signs and submits the transaction
+                and returns its tx hash
+            metadata: Extra fields stored on the record (agent, amount, ...)
+        Returns:
+            Snapshot of the new record (status 'queued')
+        """
+        record = self._new_record(TX_QUEUED, metadata)
+        self._submit_queue.put((record['ticket_id'], submit))
+        self._ensure_workers()
+        return dict(record)
+
+    def track(self, tx_hash: str, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """Start confirmation tracking for a transaction submitted elsewhere"""
+        with self._lock:
+            existing = self._by_hash.get(tx_hash)
+            if existing:
+                return dict(self._records[existing])
+
+        record = self._new_record(TX_PENDING, metadata)
+        self._mark_submitted(record['ticket_id'], tx_hash)
+        self._ensure_workers()
+        return self.get_status(record['ticket_id'])
+
+    def get_status(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Look up a record by ticket id or tx hash"""
+        with self._lock:
+            ticket_id = ref if ref in self._records else self._by_hash.get(ref)
+            if not ticket_id:
+                return None
+            return dict(self._records[ticket_id])
+
+    def list_transactions(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List tracked transactions, optionally filtered by status"""
+        with self._lock:
+            return [
+                dict(r) for r in self._records.values()
+                if status is None or r['status'] == status
+            ]
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked with an event dict on every state change"""
+        self._subscribers.append(callback)
+
+    def stop(self):
+        """Stop background workers (used on shutdown)"""
+        self._stop.set()
+        self._wake_watcher.set()
+
+    # ============================================
+    # WORKERS
+    # ============================================
+
+    def _ensure_workers(self):
+        if self._threads_started:
+            return
+        with self._lock:
+            if self._threads_started:
+                return
+            threading.Thread(target=self._submission_loop, name='tx-submitter', daemon=True).start()
+            threading.Thread(target=self._watcher_loop, name='tx-watcher', daemon=True).start()
+            self._threads_started = True
+            logger.info("✅ Transaction tracker workers started")
+
+    def _submission_loop(self):
+        """Submit queued transactions one at a time (keeps UTxO usage ordered)"""
+        while not self._stop.is_set():
+            try:
+                ticket_id, submit = self._submit_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            try:
+                tx_hash = submit()
+                self._mark_submitted(ticket_id, str(tx_hash))
+            except Exception as e:
+                logger.error(f"❌ Queued transaction {ticket_id} failed to submit: {e}")
+                self._transition(ticket_id, TX_FAILED, error=str(e))
+            finally:
+                self._submit_queue.task_done()
+
+    def _watcher_loop(self):
+        """Poll pending transactions in batches until confirmed or timed out"""
+        while not self._stop.is_set():
+            self._wake_watcher.wait(timeout=self.poll_interval)
+            self._wake_watcher.clear()
+
+            try:
+                self._check_pending_batch()
+                self._expire_finished()
+            except Exception as e:
+                logger.error(f"❌ Confirmation watcher cycle failed: {e}")
+
+    def _check_pending_batch(self):
+        now = time.time()
+
+        with self._lock:
+            due = [
+                record for record in map(self._records.get, self._pending)
+                if record['next_check_at'] <= now
+            ]
+            # Least recently checked first so no transaction starves
+            due.sort(key=lambda r: r['next_check_at'])
+            batch = [(r['ticket_id'], r['tx_hash']) for r in due[:self.batch_size]]
+
+        for ticket_id, tx_hash in batch:
+            try:
+                confirmation = self._fetch_confirmation(tx_hash)
+            except Exception as e:
+                logger.warning(f"⚠️ Confirmation lookup failed for {tx_hash[:16]}...: {e}")
+                confirmation = None
+
+            if confirmation:
+                self._transition(ticket_id, TX_CONFIRMED, confirmation=confirmation)
+                continue
+
+            with self._lock:
+                record = self._records[ticket_id]
+                record['poll_attempts'] += 1
+                age = time.time() - record['submitted_at']
+                timed_out = age > self.confirm_timeout
+                if not timed_out:
+                    delay = min(self.poll_interval * (2 ** record['poll_attempts']), self.max_backoff)
+                    record['next_check_at'] = time.time() + delay
+
+            if timed_out:
+                self._transition(
+                    ticket_id,
+                    TX_FAILED,
+                    error=f'Not confirmed within {int(self.confirm_timeout)}s'
+                )
+
+    def _expire_finished(self):
+        """Drop confirmed/failed records older than the retention window"""
+        cutoff = time.time() - self.retention_seconds
+
+        with self._lock:
+            while self._finished:
+                ticket_id, finished_at = next(iter(self._finished.items()))
+                if finished_at > cutoff:
+                    break
+                del self._finished[ticket_id]
+                record = self._records.pop(ticket_id, None)
+                if record and record['tx_hash']:
+                    self._by_hash.pop(record['tx_hash'], None)
+
+    # ============================================
+    # STATE HELPERS
+    # ============================================
+
+    def _new_record(self, status: str, metadata: Optional[Dict]) -> Dict[str, Any]:
+        record = {
+            'ticket_id': f"txq_{uuid.uuid4().hex[:12]}",
+            'status': status,
+            'tx_hash': None,
+            'metadata': metadata or {},
+            'created_at': time.time(),
+            'submitted_at': None,
+            'confirmed_at': None,
+            'next_check_at': 0.0,
+            'poll_attempts': 0,
+            'confirmation': None,
+            'error': None
+        }
+        with self._lock:
+            self._records[record['ticket_id']] = record
+        return record
+
+    def _mark_submitted(self, ticket_id: str, tx_hash: str):
+        with self._lock:
+            record = self._records[ticket_id]
+            record['tx_hash'] = tx_hash
+            record['submitted_at'] = time.time()
+            record['next_check_at'] = record['submitted_at'] + self.poll_interval
+            self._by_hash[tx_hash] = ticket_id
+            self._pending[ticket_id] = None
+        self._transition(ticket_id, TX_PENDING)
+
+    def _transition(self, ticket_id: str, status: str, **fields):
+        with self._lock:
+            record = self._records[ticket_id]
+            record['status'] = status
+            record.update(fields)
+            if status == TX_CONFIRMED:
+                record['confirmed_at'] = time.time()
+            if status in (TX_CONFIRMED, TX_FAILED):
+                self._pending.pop(ticket_id, None)
+                self._finished[ticket_id] = time.time()
+            event = {'event': f"tx_{status}", **record}
+
+        if status == TX_CONFIRMED:
+            logger.info(f"✅ Transaction confirmed: {record['tx_hash']}")
+        elif status == TX_FAILED:
+            logger.warning(f"⚠️ Transaction {ticket_id} failed: {fields.get('error')}")
+
+        self._emit(event)
+
+    def _emit(self, event: Dict[str, Any]):
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"❌ Transaction event subscriber failed: {e}")